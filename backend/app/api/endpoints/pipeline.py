@@ -1,16 +1,70 @@
-from fastapi import APIRouter, HTTPException
-from app.utils.erp import pull_dataset
+from typing import Any, Dict
+from fastapi import APIRouter, Body, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from app.schemas.models import RunPipeline
-from app.services.storage.mongodb_service import store_to_mongodb
+from app.warehouse.task_manager import get_task_manager
+from app.warehouse.pipelines import PIPELINE_REGISTRY
+from services.cloud_functions.backends import QueueFullError
+from services.cloud_functions.executor import get_task_status
 
 run_router = APIRouter()
 
+# Queue the ERP pull as a background job and return its id straight away
+# Progress is polled through /run/{job_id}
 @run_router.post("/run")
-async def run_pipeline(request: RunPipeline):
-    dataset = pull_dataset(request.dataset_id) 
-    dataset_json = dataset.to_dict(orient="records")
-    result = store_to_mongodb(request.dataset_id, dataset_json) 
+async def run_pipeline(request: RunPipeline, incremental: bool = Query(False), snapshot: bool = Query(False)):
+    # Snapshots are written for full pulls only
+    if incremental and snapshot:
+        raise HTTPException(status_code = 400, detail = "snapshot can't be combined with incremental")
+    try:
+        job_id = await get_task_manager().execute_task(
+            task_name = "erp_pipeline",
+            params = [request.dataset_id, incremental, snapshot]
+        )
+    except QueueFullError as qe:
+        raise HTTPException(status_code = 503, detail = str(qe))
     return {
-        "status": "success",
-        "result": result 
-    }
\ No newline at end of file
+        "status": "queued",
+        "job_id": job_id
+    }
+
+@run_router.get("/run/{job_id}")
+async def get_pipeline_status(job_id: str):
+    status = await run_in_threadpool(get_task_status, job_id)
+    if status["status"] == "not found":
+        raise HTTPException(status_code = 404, detail = "Pipeline job not found")
+    return status
+
+# List the registered task pipelines and their nodes
+@run_router.get("/pipelines")
+async def list_pipelines():
+    return {
+        name: {
+            "description": definition.description,
+            "nodes": {
+                node_name: {"task": node.task_name, "depends_on": node.depends_on}
+                for node_name, node in definition.nodes.items()
+            }
+        }
+        for name, definition in PIPELINE_REGISTRY.items()
+    }
+
+# Queue a run of a registered pipeline with its named arguments
+# Per-node status and timings are reported in the progress of /run/{job_id}
+@run_router.post("/pipelines/{pipeline_name}/run")
+async def run_registered_pipeline(pipeline_name: str, args: Dict[str, Any] = Body(default_factory = dict)):
+    if pipeline_name not in PIPELINE_REGISTRY:
+        raise HTTPException(status_code = 404, detail = "Pipeline not found")
+    try:
+        job_id = await get_task_manager().execute_task(
+            task_name = pipeline_name,
+            params = [pipeline_name, args]
+        )
+    except ValueError as ve:
+        raise HTTPException(status_code = 400, detail = str(ve))
+    except QueueFullError as qe:
+        raise HTTPException(status_code = 503, detail = str(qe))
+    return {
+        "status": "queued",
+        "job_id": job_id
+    }
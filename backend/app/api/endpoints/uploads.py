@@ -0,0 +1,82 @@
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from minio.error import S3Error
+from pydantic import BaseModel, Field, conint
+from app.services.storage.minio_service import MAX_PARTS, get_minio_service
+
+upload_router = APIRouter()
+
+# Presigned URLs are signed in batches so a multi-GB file doesn't need one request per part
+MAX_PARTS_PER_REQUEST = 1000
+
+
+class StartMultipartUpload(BaseModel):
+    filename: str
+    size: int = Field(ge = 0)
+    part_size: Optional[int] = None
+    content_type: str = "application/octet-stream"
+
+
+class SignParts(BaseModel):
+    object_name: str
+    part_numbers: List[conint(ge = 1, le = MAX_PARTS)] = Field(min_length = 1, max_length = MAX_PARTS_PER_REQUEST)
+
+
+class UploadedPart(BaseModel):
+    part_number: int = Field(ge = 1)
+    etag: str
+
+
+class CompleteMultipartUpload(BaseModel):
+    object_name: str
+    parts: List[UploadedPart] = Field(min_length = 1)
+
+
+async def _call_minio(func, *args):
+    try:
+        return await run_in_threadpool(func, *args)
+    except S3Error as e:
+        if e.code == "NoSuchUpload":
+            raise HTTPException(status_code = 404, detail = "Multipart upload not found")
+        if e.code in ("InvalidPart", "InvalidPartOrder", "EntityTooSmall"):
+            raise HTTPException(status_code = 400, detail = e.message or e.code)
+        raise HTTPException(status_code = 502, detail = f"Object storage error: {e.code}")
+
+
+# Start a multipart upload, the client uploads the parts itself through presigned URLs
+@upload_router.post("/uploads/multipart")
+async def start_multipart_upload(request: StartMultipartUpload):
+    try:
+        return await _call_minio(
+            get_minio_service().create_multipart_upload,
+            request.filename, request.size, request.part_size, request.content_type
+        )
+    except ValueError as e:
+        raise HTTPException(status_code = 400, detail = str(e))
+
+# Presigned PUT URLs for a batch of parts, the response header ETag of each PUT completes the upload
+@upload_router.post("/uploads/multipart/{upload_id}/parts")
+async def sign_multipart_parts(upload_id: str, request: SignParts):
+    urls = await _call_minio(
+        get_minio_service().presigned_part_urls, request.object_name, upload_id, request.part_numbers
+    )
+    return {"upload_id": upload_id, "urls": urls}
+
+# Parts MinIO already has, so an interrupted upload can resume where it stopped
+@upload_router.get("/uploads/multipart/{upload_id}/parts")
+async def list_multipart_parts(upload_id: str, object_name: str = Query(...)):
+    parts = await _call_minio(get_minio_service().list_uploaded_parts, object_name, upload_id)
+    return {"upload_id": upload_id, "parts": parts}
+
+@upload_router.post("/uploads/multipart/{upload_id}/complete")
+async def complete_multipart_upload(upload_id: str, request: CompleteMultipartUpload):
+    return await _call_minio(
+        get_minio_service().complete_multipart_upload,
+        request.object_name, upload_id, [part.model_dump() for part in request.parts]
+    )
+
+@upload_router.delete("/uploads/multipart/{upload_id}")
+async def abort_multipart_upload(upload_id: str, object_name: str = Query(...)):
+    await _call_minio(get_minio_service().abort_multipart_upload, object_name, upload_id)
+    return {"upload_id": upload_id, "status": "aborted"}
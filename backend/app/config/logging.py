@@ -1,12 +1,213 @@
+import atexit
 import logging
 import logging.config
 import os
+import queue
+import random
+import sys
+import threading
+import time
 from datetime import datetime
-from typing import Dict, Any
-from app.config.settings import get_settings
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Any, List, Optional, Sequence
+from app.config.settings import get_logging_settings, get_settings
+from services.metrics import register_gauge
 
-def setup_logging() -> None:
+# Interval between the warnings that report dropped records
+DROP_REPORT_INTERVAL_SECONDS = 10
+
+
+class _DebugSampler(logging.Filter):
+    """Keeps a fraction of the DEBUG records of the given loggers and their children."""
+
+    def __init__(self, logger_names: Sequence[str], rate: float):
+        super().__init__()
+        self.logger_names = tuple(logger_names)
+        self.prefixes = tuple(f"{name}." for name in logger_names)
+        self.rate = rate
+        self.sampled_out = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or not (
+            record.name in self.logger_names or record.name.startswith(self.prefixes)
+        ):
+            return True
+        if random.random() < self.rate:
+            return True
+        self.sampled_out += 1
+        return False
+
+
+class _LogPipeline:
+    """
+    A bounded queue shared by every configured logger and the listener thread that runs
+    their real handlers. Each record carries the handlers of the logger it came from.
+    """
+
+    def __init__(self, size: int, policy: str, block_seconds: float, sampler: Optional[_DebugSampler]):
+        if policy not in ("drop", "block"):
+            raise ValueError(f"Unknown log queue policy '{policy}'.")
+        self.queue: queue.Queue = queue.Queue(maxsize = size)
+        self.block_seconds = block_seconds if policy == "block" else 0
+        self.sampler = sampler
+        self.dropped = 0
+        self._unreported = 0
+        self._reported_at = 0.0
+        self.routes: List[tuple] = []
+        self._lock = threading.Lock()
+        self.listener = _RoutingListener(self)
+
+    def put(self, record: logging.LogRecord) -> None:
+        try:
+            if self.block_seconds:
+                self.queue.put(record, timeout = self.block_seconds)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                self._unreported += 1
+
+    def take_drop_report(self, final: bool = False) -> int:
+        # Number of records dropped since the last report, once every DROP_REPORT_INTERVAL_SECONDS
+        # or whatever is left when `final`
+        if not self._unreported:
+            return 0
+        if not final and time.monotonic() - self._reported_at < DROP_REPORT_INTERVAL_SECONDS:
+            return 0
+        with self._lock:
+            dropped, self._unreported = self._unreported, 0
+            self._reported_at = time.monotonic()
+        return dropped
+
+    def route(self, handlers: List[logging.Handler]) -> "_QueueRoute":
+        route = _QueueRoute(self, handlers)
+        if self.sampler is not None:
+            route.addFilter(self.sampler)
+        return route
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queue_size": self.queue.maxsize,
+            "dropped": self.dropped,
+            "sampled_out": self.sampler.sampled_out if self.sampler is not None else 0,
+        }
+
+
+class _QueueRoute(QueueHandler):
+    """Takes the place of a logger's handlers and sends its records to the pipeline."""
+
+    def __init__(self, pipeline: _LogPipeline, handlers: List[logging.Handler]):
+        super().__init__(pipeline.queue)
+        self.pipeline = pipeline
+        self.targets = tuple(handlers)
+        # Records none of the handlers would emit are discarded before they are queued
+        self.setLevel(min(handler.level for handler in handlers))
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = super().prepare(record)
+        record.log_targets = self.targets
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        self.pipeline.put(record)
+
+
+class _RoutingListener(QueueListener):
+    def __init__(self, pipeline: _LogPipeline):
+        super().__init__(pipeline.queue, respect_handler_level = True)
+        self.pipeline = pipeline
+
+    def enqueue_sentinel(self) -> None:
+        # The listener is still draining the queue, so this waits for room instead of failing
+        self.queue.put(self._sentinel)
+
+    def handle(self, record: logging.LogRecord) -> None:
+        self.handlers = record.log_targets
+        dropped = self.pipeline.take_drop_report()
+        if dropped:
+            super().handle(logging.LogRecord(
+                __name__, logging.WARNING, __file__, 0,
+                f"Dropped {dropped} log records, the logging queue was full", None, None, func = "handle"
+            ))
+        super().handle(record)
+
+
+_pipeline: Optional[_LogPipeline] = None
+
+
+def _install_pipeline(logger_names: List[str]) -> None:
+    # Move the handlers of the configured loggers behind one queue and listener thread
+    global _pipeline
+    settings = get_logging_settings()
+    sampler = None
+    if settings.log_sampled_loggers and settings.log_debug_sample_rate < 1:
+        sampler = _DebugSampler(settings.log_sampled_loggers, settings.log_debug_sample_rate)
+    _pipeline = _LogPipeline(
+        settings.log_queue_size, settings.log_queue_policy, settings.log_queue_block_seconds, sampler
+    )
+    for name in logger_names:
+        logger = logging.getLogger(name or None)
+        handlers = list(logger.handlers)
+        if not handlers:
+            continue
+        for handler in handlers:
+            logger.removeHandler(handler)
+        route = _pipeline.route(handlers)
+        logger.addHandler(route)
+        _pipeline.routes.append((logger, route))
+    _pipeline.listener.start()
+
+
+def stop_logging_queue() -> None:
+    """Write out the queued records, stop the listener thread and log synchronously again"""
+    global _pipeline
+    if _pipeline is not None:
+        _pipeline.listener.stop()
+        for logger, route in _pipeline.routes:
+            logger.removeHandler(route)
+            for handler in route.targets:
+                logger.addHandler(handler)
+        # Drops since the last report would otherwise go unreported
+        dropped = _pipeline.take_drop_report(final = True)
+        _pipeline = None
+        if dropped:
+            logging.getLogger(__name__).warning(f"Dropped {dropped} log records, the logging queue was full")
+
+
+def get_logging_stats() -> Dict[str, Any]:
+    if _pipeline is None:
+        return {"queued": False}
+    return {"queued": True, **_pipeline.stats()}
+
+
+atexit.register(stop_logging_queue)
+
+
+def _pipeline_gauge(key: str):
+    return lambda: [({}, _pipeline.stats()[key])] if _pipeline is not None else []
+
+
+register_gauge("logging_queue_depth", "Log records waiting for the listener thread", (), _pipeline_gauge("queue_depth"))
+register_gauge(
+    "logging_records_dropped", "Log records dropped because the logging queue was full", (), _pipeline_gauge("dropped")
+)
+register_gauge(
+    "logging_records_sampled_out", "DEBUG records discarded by sampling", (), _pipeline_gauge("sampled_out")
+)
+
+
+def setup_logging(queued: Optional[bool] = None) -> None:
+    """
+    Configure logging. With `queued` (log_queue_enabled by default) the file and console
+    handlers run on a listener thread, so a log call only costs putting a record on a queue.
+    """
     settings = get_settings()
+    if queued is None:
+        queued = get_logging_settings().log_queue_enabled
+    # Records still queued go to the handlers that dictConfig is about to close
+    stop_logging_queue()
 
     # Ensure logs directory exists
     os.makedirs(settings.logs_directory, exist_ok=True)
@@ -140,6 +341,22 @@ def setup_logging() -> None:
         }
 
     logging.config.dictConfig(logging_config)
+    if queued:
+        _install_pipeline(list(logging_config["loggers"]))
+
+def setup_task_process_logging() -> None:
+    """
+    Configure logging in an isolated task process: every record goes to stderr, which the
+    runner points at the task's log. The app log files stay with the API process, several
+    processes rotating the same files would lose records.
+    """
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(name)s - %(message)s"))
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(logging.DEBUG if get_settings().debug else logging.INFO)
 
 def get_logger(name: str) -> logging.Logger:
     return logging.getLogger(f"app.{name}")
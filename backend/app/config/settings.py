@@ -1,7 +1,9 @@
 # settings.py
+import os
 from pydantic import MongoDsn, SecretStr, Field
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import List
 
 class Settings(BaseSettings):
     app_name: str = "Warehouse"
@@ -17,6 +19,7 @@ class DatabaseSettings(BaseSettings):
     mongodb_uri: MongoDsn
     mongodb_database: str = "uploads"
     minio_presigned_url_expiry: int = Field(default=3600)
+    mongodb_insert_batch_size: int = 1000
 
     class Config:
         env_file = ".env"
@@ -39,6 +42,123 @@ class MinIOSettings(BaseSettings):
     MINIO_SECRET_KEY: SecretStr = Field(..., env="MINIO_SECRET_KEY")
     MINIO_BUCKET_NAME: str = Field(default="datasets", env="MINIO_BUCKET_NAME")
     MINIO_PRESIGNED_URL_EXPIRY: int = 3600 
+    # Signed URLs are reused until this long before they expire (at most half their lifetime)
+    MINIO_PRESIGNED_URL_REFRESH_MARGIN: int = 300
+    MINIO_PRESIGNED_URL_CACHE_SIZE: int = 10000
+    MINIO_MULTIPART_PART_SIZE: int = 16 * 1024 * 1024
+    MINIO_SECURE: bool = False
+    MINIO_SNAPSHOT_PREFIX: str = "snapshots"
+    PARQUET_COMPRESSION: str = "zstd"
+    PARQUET_ROW_GROUP_SIZE: int = 100_000
+
+    class Config:
+        env_file = ".env"
+        extra = "ignore"
+
+class ERPSettings(BaseSettings):
+    erp_page_size: int = 500
+    erp_max_concurrency: int = 4
+    erp_session_pool_size: int = 4
+    erp_session_acquire_timeout: float = 30.0
+
+    class Config:
+        env_file = ".env"
+        extra = "ignore"
+
+# Capacity of this node for the task scheduler
+# CPU units follow the Fargate convention of 1024 units per vCPU
+class SchedulerSettings(BaseSettings):
+    scheduler_cpu_units: int = (os.cpu_count() or 1) * 1024
+    scheduler_memory_mb: int = 4096
+    scheduler_max_queued: int = 1000
+
+    class Config:
+        env_file = ".env"
+        extra = "ignore"
+
+# Runner for heavy tasks, "local" runs each task in its own limited process
+class RunnerSettings(BaseSettings):
+    heavy_task_runner: str = "local"
+    runner_memory_headroom_mb: int = 256
+
+    class Config:
+        env_file = ".env"
+        extra = "ignore"
+
+# Logging pipeline: with log_queue_enabled the handlers run on a background thread behind a
+# bounded queue. While the queue is full the "drop" policy discards records and "block"
+# waits up to log_queue_block_seconds before discarding them.
+# DEBUG records of log_sampled_loggers and their children are kept at log_debug_sample_rate.
+class LoggingSettings(BaseSettings):
+    log_queue_enabled: bool = True
+    log_queue_size: int = 10000
+    log_queue_policy: str = "drop"
+    log_queue_block_seconds: float = 0.05
+    log_sampled_loggers: List[str] = []
+    log_debug_sample_rate: float = 0.1
+
+    class Config:
+        env_file = ".env"
+        extra = "ignore"
+
+# Worker pools of the task executor, each behind a submission queue of executor_queue_size
+class ExecutorSettings(BaseSettings):
+    executor_thread_workers: int = min(32, (os.cpu_count() or 1) + 4)
+    executor_process_workers: int = os.cpu_count() or 1
+    executor_queue_size: int = 1000
+
+    class Config:
+        env_file = ".env"
+        extra = "ignore"
+
+# Task state store of the executor, "memory" (a single API worker) or "mongo" (shared)
+class TaskStoreSettings(BaseSettings):
+    task_store_backend: str = "memory"
+    task_store_ttl_seconds: int = 24 * 60 * 60
+    task_store_max_entries: int = 10000
+    task_store_collection: str = "task_states"
+
+    class Config:
+        env_file = ".env"
+        extra = "ignore"
+
+# Rows per chunk when streaming CSV files into MongoDB, this bounds the memory used by an ingest
+class IngestSettings(BaseSettings):
+    csv_chunk_rows: int = 10000
+
+    class Config:
+        env_file = ".env"
+        extra = "ignore"
+
+# Result cache of cacheable tasks, "memory" or "mongo" (a local LRU in front of a shared collection)
+# The local LRU is bounded by the pickled size of its entries
+class ResultCacheSettings(BaseSettings):
+    result_cache_backend: str = "memory"
+    result_cache_max_bytes: int = 64 * 1024 * 1024
+    result_cache_collection: str = "task_results"
+
+    class Config:
+        env_file = ".env"
+        extra = "ignore"
+
+# Shared-memory buffers of large task inputs and results
+# Segments nobody claims are freed after shared_buffer_ttl_seconds, and Arrow results of
+# process-pool workers of at least shared_buffer_min_result_bytes come back through shared memory
+class SharedBufferSettings(BaseSettings):
+    shared_buffer_ttl_seconds: int = 15 * 60
+    shared_buffer_min_result_bytes: int = 1024 * 1024
+
+    class Config:
+        env_file = ".env"
+        extra = "ignore"
+
+# Per-task output capture: a ring of the last task_output_buffer_bytes of each task's output,
+# kept on the task state when it stays under task_output_inline_bytes and otherwise appended
+# to the task's log file every task_output_flush_seconds
+class TaskOutputSettings(BaseSettings):
+    task_output_buffer_bytes: int = 256 * 1024
+    task_output_inline_bytes: int = 64 * 1024
+    task_output_flush_seconds: float = 1.0
 
     class Config:
         env_file = ".env"
@@ -58,4 +178,44 @@ def get_database_settings() -> DatabaseSettings:
 
 @lru_cache()
 def get_minio_settings() -> MinIOSettings:
-    return MinIOSettings()
\ No newline at end of file
+    return MinIOSettings()
+
+@lru_cache()
+def get_erp_settings() -> ERPSettings:
+    return ERPSettings()
+
+@lru_cache()
+def get_scheduler_settings() -> SchedulerSettings:
+    return SchedulerSettings()
+
+@lru_cache()
+def get_runner_settings() -> RunnerSettings:
+    return RunnerSettings()
+
+@lru_cache()
+def get_logging_settings() -> LoggingSettings:
+    return LoggingSettings()
+
+@lru_cache()
+def get_executor_settings() -> ExecutorSettings:
+    return ExecutorSettings()
+
+@lru_cache()
+def get_task_store_settings() -> TaskStoreSettings:
+    return TaskStoreSettings()
+
+@lru_cache()
+def get_ingest_settings() -> IngestSettings:
+    return IngestSettings()
+
+@lru_cache()
+def get_result_cache_settings() -> ResultCacheSettings:
+    return ResultCacheSettings()
+
+@lru_cache()
+def get_shared_buffer_settings() -> SharedBufferSettings:
+    return SharedBufferSettings()
+
+@lru_cache()
+def get_task_output_settings() -> TaskOutputSettings:
+    return TaskOutputSettings()
\ No newline at end of file
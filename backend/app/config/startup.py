@@ -0,0 +1,153 @@
+# Startup timing
+# track_imports() times every module imported after it is called, and step() times the
+# steps of the application's startup hook, so a slow worker cold start can be traced back
+# to the module or backend responsible. The report is logged once startup has finished
+# and served by GET /startup/report.
+#
+# Only the standard library is imported here so the modules it times are not loaded first.
+
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class _TimedLoader:
+    """Wraps a module's loader for the duration of its import to time exec_module."""
+
+    def __init__(self, loader, timer: "StartupTimer"):
+        self._loader = loader
+        self._timer = timer
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        try:
+            self._timer._time_import(module.__name__, self._loader.exec_module, module)
+        finally:
+            # Leave the module with its real loader once it is imported
+            module.__loader__ = self._loader
+            if module.__spec__ is not None:
+                module.__spec__.loader = self._loader
+
+
+class _ImportTimingFinder:
+    """Meta path finder that defers to the other finders and wraps the loader they return."""
+
+    def __init__(self, timer: "StartupTimer"):
+        self._timer = timer
+
+    def find_spec(self, fullname, path, target = None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        # Built-in and frozen modules are loaded by classes, not loader instances, and are fast anyway
+        if spec.loader is not None and not isinstance(spec.loader, type) and hasattr(spec.loader, "exec_module"):
+            spec.loader = _TimedLoader(spec.loader, self._timer)
+        return spec
+
+
+class StartupTimer:
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.finished_at: Optional[float] = None
+        self.imports: Dict[str, Dict[str, float]] = {}
+        self.steps: List[Dict[str, Any]] = []
+        self._finder: Optional[_ImportTimingFinder] = None
+        # Time spent in nested imports, per thread, to split cumulative from self time
+        self._nested = threading.local()
+        self._lock = threading.Lock()
+
+    def track_imports(self) -> None:
+        if self._finder is None:
+            self._finder = _ImportTimingFinder(self)
+            sys.meta_path.insert(0, self._finder)
+
+    def stop_tracking_imports(self) -> None:
+        if self._finder is not None:
+            sys.meta_path.remove(self._finder)
+            self._finder = None
+
+    def _time_import(self, name, exec_module, module) -> None:
+        stack = self._nested.__dict__.setdefault("stack", [])
+        stack.append(0.0)
+        started_at = time.perf_counter()
+        try:
+            exec_module(module)
+        finally:
+            elapsed = time.perf_counter() - started_at
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            with self._lock:
+                self.imports[name] = {
+                    "cumulative_ms": round(elapsed * 1e3, 3),
+                    "self_ms": round((elapsed - nested) * 1e3, 3),
+                }
+
+    @contextmanager
+    def step(self, name: str, required: bool = True) -> Iterator[None]:
+        """
+        Time one startup step. A step that is not required only records its error, so an
+        unreachable backend doesn't stop the worker from starting.
+        """
+        started_at = time.perf_counter()
+        entry = {"step": name, "status": "ok"}
+        try:
+            yield
+        except Exception as e:
+            entry.update(status = "error", error = f"{type(e).__name__}: {e}")
+            if required:
+                raise
+        finally:
+            entry["duration_ms"] = round((time.perf_counter() - started_at) * 1e3, 3)
+            with self._lock:
+                self.steps.append(entry)
+
+    def finish(self) -> None:
+        self.stop_tracking_imports()
+        self.finished_at = time.perf_counter()
+
+    def report(self, top: int = 25) -> Dict[str, Any]:
+        """Startup timings, with the `top` modules that took longest to import including their own imports"""
+        with self._lock:
+            imports = dict(self.imports)
+            steps = list(self.steps)
+        finished_at = self.finished_at or time.perf_counter()
+        modules = sorted(imports.items(), key = lambda item: item[1]["cumulative_ms"], reverse = True)
+        return {
+            "finished": self.finished_at is not None,
+            "total_ms": round((finished_at - self.started_at) * 1e3, 3),
+            "steps": steps,
+            "modules_imported": len(imports),
+            "slowest_modules": [{"module": name, **timings} for name, timings in modules[:top]],
+        }
+
+    def summary(self, top: int = 10) -> str:
+        report = self.report(top)
+        lines = [f"Startup finished in {report['total_ms']:.0f} ms, {report['modules_imported']} modules imported"]
+        for step in report["steps"]:
+            error = f" ({step['error']})" if "error" in step else ""
+            lines.append(f"  step {step['step']}: {step['duration_ms']:.1f} ms {step['status']}{error}")
+        for module in report["slowest_modules"]:
+            lines.append(
+                f"  import {module['module']}: {module['cumulative_ms']:.1f} ms "
+                f"(self {module['self_ms']:.1f} ms)"
+            )
+        return "\n".join(lines)
+
+
+@lru_cache()
+def get_startup_timer() -> StartupTimer:
+    return StartupTimer()
@@ -2,15 +2,70 @@ import io
 import os
 import requests
 import pandas as pd
+from functools import lru_cache
 from pymongo import MongoClient
+from pymongo.database import Database
+from motor.motor_asyncio import AsyncIOMotorClient
 from ..config.settings import get_database_settings 
 
-settings = get_database_settings() 
-
 # ------------------ MongoDB Setup ------------------
-MONGO_URI = str(settings.mongodb_uri)
-client = MongoClient(MONGO_URI)
-db = client["fastapi_db"]
+# Clients are created on first use rather than at import, so importing the app neither
+# needs the settings nor opens connections. Code that imports a collection gets a
+# LazyCollection that resolves the real one the first time it is used.
+DATABASE_NAME = "fastapi_db"
+
+@lru_cache()
+def get_client() -> MongoClient:
+    return MongoClient(str(get_database_settings().mongodb_uri))
+
+def get_db() -> Database:
+    return get_client()[DATABASE_NAME]
+
+# Used by the request handlers so database calls don't block the event loop
+@lru_cache()
+def get_async_client() -> AsyncIOMotorClient:
+    return AsyncIOMotorClient(str(get_database_settings().mongodb_uri))
+
+def get_async_db():
+    return get_async_client()[DATABASE_NAME]
+
+class LazyCollection:
+    """Stands in for a collection of the database returned by `get_database` until it is used."""
+
+    def __init__(self, get_database, name: str):
+        self._get_database = get_database
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(self._get_database()[self.name], attr)
+
+    def __repr__(self) -> str:
+        return f"LazyCollection({self.name!r})"
+
+users_collection = LazyCollection(get_db, "users")
+datasets_collection = LazyCollection(get_db, "datasets") 
+
+# Row-level storage for ingested datasets, the `datasets` document acts as the manifest
+dataset_rows_collection = LazyCollection(get_db, "dataset_rows")
+
+# Incremental ERP sync: one document per ERP record, plus the last synced watermark per dataset
+dataset_records_collection = LazyCollection(get_db, "dataset_records")
+sync_state_collection = LazyCollection(get_db, "sync_state")
+
+# ------------------ Async MongoDB Setup ------------------
+async_users_collection = LazyCollection(get_async_db, "users")
+async_datasets_collection = LazyCollection(get_async_db, "datasets")
 
-users_collection = db["users"]
-datasets_collection = db["datasets"] 
\ No newline at end of file
+# The clients and databases used to be module attributes, keep them importable
+def __getattr__(name):
+    if name == "client":
+        return get_client()
+    if name == "db":
+        return get_db()
+    if name == "async_client":
+        return get_async_client()
+    if name == "async_db":
+        return get_async_db()
+    if name == "MONGO_URI":
+        return str(get_database_settings().mongodb_uri)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -1,7 +1,19 @@
+# Time every import below, the startup hook completes the report
+from app.config.startup import get_startup_timer
+get_startup_timer().track_imports()
+
+import json
+import time
+from contextlib import asynccontextmanager
 from uuid import UUID
+from typing import List, Optional
 from io import BytesIO
 from base64 import b64decode
-from fastapi import FastAPI, HTTPException, Query, UploadFile, File, Form
+from fastapi import Body, FastAPI, HTTPException, Query, Request, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
+from dotenv import load_dotenv
+from app.config.logging import get_logger, setup_logging
 from app.schemas.models import User, Dataset, ApiResponse, CloudFunctionRequest, DatasetResponse
 from app.db.crud import (
     create_user, get_user, update_user, delete_user,
@@ -9,46 +21,97 @@ from app.db.crud import (
 )
 from app.utils.file_utils import * 
 from app.services.storage.minio_service import get_minio_service
+from services.minio_service import bootstrap_bucket
 from services.cloud_functions.server import introspection, custprocess
-from services.cloud_functions.executor import submit_task, get_task_status
-from app.warehouse.task_manager import TaskManager 
+from services.cloud_functions.executor import (
+    submit_task, get_task_status, get_batch_status, read_task_log, follow_task_log, get_result_cache_stats,
+    MAX_BATCH_SIZE, MAX_LOG_READ_BYTES, DEFAULT_LOG_READ_BYTES
+)
+from services.cloud_functions.backends import QueueFullError
+from services.metrics import HTTP_REQUEST_DURATION, render_metrics
+from app.warehouse.task_manager import get_task_manager 
 from app.services.cloud_functions.ETL_function import clean_csv 
 from app.services.storage.minio_service import MinioStorageService
 from app.api.endpoints.pipeline import run_router
+from app.api.endpoints.uploads import upload_router
 
 # Register the tasks 
 import app.warehouse.register_tasks 
 
-app = FastAPI()
+logger = get_logger("api.startup")
+
+# Startup hook
+# Configuration and backend bootstrap run here instead of at import. Clients connect on
+# first use, so the bucket check is not required: a worker whose MinIO is briefly
+# unreachable still starts, and the failure shows up in the startup report.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    timer = get_startup_timer()
+    with timer.step("load_dotenv"):
+        load_dotenv()
+    with timer.step("setup_logging"):
+        setup_logging()
+    with timer.step("minio_bucket", required = False):
+        await run_in_threadpool(get_minio_service().ensure_bucket)
+    # The uploads bucket of the presigned URL client, with its public read policy
+    with timer.step("minio_uploads_bucket", required = False):
+        await run_in_threadpool(bootstrap_bucket)
+    timer.finish()
+    logger.info(timer.summary())
+    yield
+
+app = FastAPI(lifespan = lifespan)
 app.include_router(run_router) 
+app.include_router(upload_router)
 
 # Initialize the Task Manager
-task_manager = TaskManager()
+task_manager = get_task_manager()
+
+# Record the latency of every request, labelled with the route template rather than the raw path
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started_at = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_REQUEST_DURATION.labels(
+            request.method, getattr(route, "path", "unmatched"), str(status)
+        ).observe(time.perf_counter() - started_at)
+
+# Prometheus metrics of the API, the executor and ingestion
+@app.get("/metrics", include_in_schema = False)
+def metrics_endpoint():
+    body, content_type = render_metrics()
+    return Response(content = body, media_type = content_type)
 
 # User Routes
 
 @app.post("/users/", response_model=ApiResponse)
-def create_user_endpoint(user: User):
-    create_user(user)
+async def create_user_endpoint(user: User):
+    await create_user(user)
     return ApiResponse(code=201, type="success", message="User created")
 
 @app.get("/users/{user_id}")
-def get_user_endpoint(user_id: UUID):
-    user = get_user(user_id)
+async def get_user_endpoint(user_id: UUID):
+    user = await get_user(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
 @app.put("/users/{user_id}", response_model=ApiResponse)
-def update_user_endpoint(user_id: UUID, user: User):
-    modified = update_user(user_id, user.model_dump(exclude={"id"}))
+async def update_user_endpoint(user_id: UUID, user: User):
+    modified = await update_user(user_id, user.model_dump(exclude={"id"}))
     if modified == 0:
         raise HTTPException(status_code=404, detail="User not found or unchanged")
     return ApiResponse(code=200, type="success", message="User updated")
 
 @app.delete("/users/{user_id}", response_model=ApiResponse)
-def delete_user_endpoint(user_id: UUID):
-    deleted = delete_user(user_id)
+async def delete_user_endpoint(user_id: UUID):
+    deleted = await delete_user(user_id)
     if deleted == 0:
         raise HTTPException(status_code=404, detail="User not found")
     return ApiResponse(code=200, type="success", message="User deleted")
@@ -57,20 +120,20 @@ def delete_user_endpoint(user_id: UUID):
 # Dataset Routes
 
 @app.post("/datasets/", response_model=ApiResponse)
-def create_dataset_endpoint(dataset: Dataset):
-    create_dataset(dataset)
+async def create_dataset_endpoint(dataset: Dataset):
+    await create_dataset(dataset)
     return ApiResponse(code=201, type="success", message="Dataset created")
 
 @app.get("/datasets/{dataset_id}")
-def get_dataset_endpoint(dataset_id: int):
-    ds = get_dataset(dataset_id)
+async def get_dataset_endpoint(dataset_id: int):
+    ds = await get_dataset(dataset_id)
     if not ds:
         raise HTTPException(status_code=404, detail="Dataset not found")
     return ds
 
 @app.delete("/datasets/{dataset_id}", response_model=ApiResponse)
-def delete_dataset_endpoint(dataset_id: int):
-    deleted = delete_dataset(dataset_id)
+async def delete_dataset_endpoint(dataset_id: int):
+    deleted = await delete_dataset(dataset_id)
     if deleted == 0:
         raise HTTPException(status_code=404, detail="Dataset not found")
     return ApiResponse(code=200, type="success", message="Dataset deleted")
@@ -81,11 +144,19 @@ def get_presigned_url(filename: str = Query(...)):
     url = minio_service.generate_presigned_url(filename)
     return {"upload_url": url} 
 
-# Test Endpoint that don't run on a thread
+# Sign upload URLs for many files in one call, e.g. all files of a new dataset
+@app.post("/generatePresignedURLs")
+def get_presigned_urls(filenames: List[str] = Body(..., embed = True, min_length = 1, max_length = 1000)):
+    urls = get_minio_service().generate_presigned_urls(filenames)
+    return {"upload_urls": urls}
+
+# Test Endpoint that don't run on the task executor
+# The function still runs on a worker thread so user code never blocks the event loop
 @app.post("/invoke-function")
 async def invoke_function(request: CloudFunctionRequest):
     try:
-        result = introspection.introspect_run_with_args(
+        result = await run_in_threadpool(
+            introspection.introspect_run_with_args,
             module = custprocess,
             func_name = request.func_name,
             param_values = request.param_values,
@@ -108,7 +179,33 @@ async def submit_task_endpoint(request: CloudFunctionRequest):
         return {"status": "running", "exec_id": exec_id} 
     except ValueError as ve:
         raise HTTPException(status_code = 400, detail = str(ve)) 
+    except QueueFullError as qe:
+        raise HTTPException(status_code = 503, detail = str(qe))
     
+# Submit many tasks in one request, each item is a regular task submission
+@app.post("/submit-batch")
+async def submit_batch_endpoint(requests: List[CloudFunctionRequest]):
+    if not requests:
+        raise HTTPException(status_code = 400, detail = "The batch is empty")
+    if len(requests) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code = 413, detail = f"A batch holds at most {MAX_BATCH_SIZE} tasks")
+    try:
+        batch = await task_manager.execute_batch(
+            [(request.func_name, request.param_values) for request in requests]
+        )
+        return {"status": "running", **batch}
+    except ValueError as ve:
+        raise HTTPException(status_code = 400, detail = str(ve))
+    except QueueFullError as qe:
+        raise HTTPException(status_code = 503, detail = str(qe))
+
+@app.get("/batch-status/{batch_id}")
+def get_batch_status_endpoint(batch_id: str):
+    status = get_batch_status(batch_id)
+    if status["status"] == "not found":
+        raise HTTPException(status_code = 404, detail = "Batch not found")
+    return status
+
 @app.get("/task-status/{exec_id}") 
 def get_task_status_endpoint(exec_id: str):
     try:
@@ -117,4 +214,47 @@ def get_task_status_endpoint(exec_id: str):
             raise HTTPException(status_code = 404, detail = "Task not found")
         return status
     except Exception as e:
-        raise HTTPException(status_code = 500, detail = str(e))
\ No newline at end of file
+        raise HTTPException(status_code = 500, detail = str(e))
+
+# Hit, miss and eviction counters of the result cache for cacheable tasks
+@app.get("/task-cache/stats")
+def get_task_cache_stats_endpoint():
+    return get_result_cache_stats()
+
+# Queue depth, wait times and resource usage of the task scheduler
+@app.get("/scheduler/stats")
+def get_scheduler_stats_endpoint():
+    return task_manager.scheduler.stats()
+
+# Import and startup step timings of this worker
+@app.get("/startup/report")
+def get_startup_report_endpoint(top: int = Query(25, ge = 1, le = 500)):
+    return get_startup_timer().report(top = top)
+
+# Read a byte range of a task's log, or its last lines when `tail` is given
+@app.get("/task-logs/{exec_id}")
+def get_task_logs_endpoint(
+    exec_id: str,
+    offset: int = Query(0, ge = 0),
+    length: int = Query(DEFAULT_LOG_READ_BYTES, gt = 0, le = MAX_LOG_READ_BYTES),
+    tail: Optional[int] = Query(None, gt = 0)
+):
+    chunk = read_task_log(exec_id, offset = offset, length = length, tail_lines = tail)
+    if chunk is None:
+        raise HTTPException(status_code = 404, detail = "Task not found")
+    return chunk
+
+# Follow a task's log as Server-Sent Events until the task has finished
+@app.get("/task-logs/{exec_id}/stream")
+async def stream_task_logs_endpoint(exec_id: str, offset: int = Query(0, ge = 0)):
+    status = await run_in_threadpool(get_task_status, exec_id)
+    if status["status"] == "not found":
+        raise HTTPException(status_code = 404, detail = "Task not found")
+
+    async def events():
+        async for chunk in follow_task_log(exec_id, offset = offset):
+            yield f"data: {json.dumps(chunk)}\n\n"
+        status = await run_in_threadpool(get_task_status, exec_id)
+        yield f"event: end\ndata: {json.dumps(status)}\n\n"
+
+    return StreamingResponse(events(), media_type = "text/event-stream")
\ No newline at end of file
@@ -0,0 +1,178 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from functools import lru_cache
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple
+
+from minio import Minio
+from minio.datatypes import Part
+
+from app.config.logging import get_logger
+from app.config.settings import MinIOSettings, get_minio_settings
+
+logger = get_logger("services.storage.minio")
+
+# S3 multipart limits: every part but the last is at least 5 MiB, at most 10000 parts
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PART_SIZE = 5 * 1024 * 1024 * 1024
+MAX_PARTS = 10000
+
+
+def multipart_part_size(size: int, part_size: int) -> int:
+    """Part size to use for an object of `size` bytes, raised if needed to stay within MAX_PARTS"""
+    if part_size < MIN_PART_SIZE or part_size > MAX_PART_SIZE:
+        raise ValueError(f"Part size must be between {MIN_PART_SIZE} and {MAX_PART_SIZE} bytes.")
+    part_size = max(part_size, math.ceil(size / MAX_PARTS))
+    if part_size > MAX_PART_SIZE:
+        raise ValueError(f"Objects larger than {MAX_PART_SIZE * MAX_PARTS} bytes can't be uploaded.")
+    return part_size
+
+
+class MinioStorageService:
+    """Object storage operations on the configured MinIO bucket."""
+
+    def __init__(self, settings: MinIOSettings):
+        self.settings = settings
+        self.bucket_name = settings.MINIO_BUCKET_NAME
+        self.client = Minio(
+            settings.MINIO_ENDPOINT,
+            access_key=settings.MINIO_ACCESS_KEY.get_secret_value(),
+            secret_key=settings.MINIO_SECRET_KEY.get_secret_value(),
+            secure=settings.MINIO_SECURE,
+        )
+        # Signed upload URLs by (object name, expiry), with the time until which they are handed out again
+        self._presigned_urls: "OrderedDict[Tuple[str, int], Tuple[str, float]]" = OrderedDict()
+        self._presigned_urls_lock = threading.Lock()
+
+    def ensure_bucket(self) -> None:
+        if not self.client.bucket_exists(self.bucket_name):
+            logger.info(f"Creating bucket {self.bucket_name}")
+            self.client.make_bucket(self.bucket_name)
+
+    def generate_presigned_url(self, filename: str, expiry_seconds: Optional[int] = None) -> str:
+        """
+        Presigned PUT URL for an object. A URL signed earlier for the same object is returned
+        again until MINIO_PRESIGNED_URL_REFRESH_MARGIN before it expires.
+        """
+        expiry_seconds = expiry_seconds or self.settings.MINIO_PRESIGNED_URL_EXPIRY
+        key = (filename, expiry_seconds)
+        now = time.monotonic()
+        with self._presigned_urls_lock:
+            cached = self._presigned_urls.get(key)
+            if cached is not None and cached[1] > now:
+                self._presigned_urls.move_to_end(key)
+                return cached[0]
+
+        url = self.client.presigned_put_object(
+            self.bucket_name,
+            filename,
+            expires=timedelta(seconds=expiry_seconds)
+        )
+        margin = min(self.settings.MINIO_PRESIGNED_URL_REFRESH_MARGIN, expiry_seconds // 2)
+        with self._presigned_urls_lock:
+            self._presigned_urls[key] = (url, now + expiry_seconds - margin)
+            self._presigned_urls.move_to_end(key)
+            while len(self._presigned_urls) > self.settings.MINIO_PRESIGNED_URL_CACHE_SIZE:
+                self._presigned_urls.popitem(last=False)
+        return url
+
+    def generate_presigned_urls(self, filenames: Iterable[str], expiry_seconds: Optional[int] = None) -> Dict[str, str]:
+        return {
+            filename: self.generate_presigned_url(filename, expiry_seconds)
+            for filename in dict.fromkeys(filenames)
+        }
+
+    def object_url(self, object_name: str) -> str:
+        scheme = "https" if self.settings.MINIO_SECURE else "http"
+        return f"{scheme}://{self.settings.MINIO_ENDPOINT}/{self.bucket_name}/{object_name}"
+
+    # Multipart uploads
+    # Clients send the parts straight to MinIO through presigned URLs, in parallel and in any order,
+    # and the object is assembled once the upload is completed with the ETags of all parts.
+    def create_multipart_upload(self, object_name: str, size: int, part_size: Optional[int] = None,
+                                content_type: str = "application/octet-stream") -> dict:
+        part_size = multipart_part_size(size, part_size or self.settings.MINIO_MULTIPART_PART_SIZE)
+        upload_id = self.client._create_multipart_upload(
+            self.bucket_name, object_name, {"Content-Type": content_type}
+        )
+        logger.info(f"Started multipart upload {upload_id} of {object_name} ({size} bytes)")
+        return {
+            "upload_id": upload_id,
+            "object_name": object_name,
+            "part_size": part_size,
+            "part_count": max(1, math.ceil(size / part_size)),
+        }
+
+    def presigned_part_urls(self, object_name: str, upload_id: str, part_numbers: List[int],
+                            expiry_seconds: Optional[int] = None) -> Dict[int, str]:
+        expires = timedelta(seconds=expiry_seconds or self.settings.MINIO_PRESIGNED_URL_EXPIRY)
+        return {
+            part_number: self.client.get_presigned_url(
+                "PUT",
+                self.bucket_name,
+                object_name,
+                expires=expires,
+                extra_query_params={"partNumber": str(part_number), "uploadId": upload_id},
+            )
+            for part_number in part_numbers
+        }
+
+    def list_uploaded_parts(self, object_name: str, upload_id: str) -> List[dict]:
+        parts = []
+        marker = None
+        while True:
+            result = self.client._list_parts(
+                self.bucket_name, object_name, upload_id, max_parts=1000, part_number_marker=marker
+            )
+            parts.extend(
+                {"part_number": part.part_number, "etag": part.etag.strip('"'), "size": part.size}
+                for part in result.parts
+            )
+            if not result.is_truncated:
+                return parts
+            marker = result.next_part_number_marker
+
+    def complete_multipart_upload(self, object_name: str, upload_id: str, parts: List[dict]) -> dict:
+        result = self.client._complete_multipart_upload(
+            self.bucket_name,
+            object_name,
+            upload_id,
+            [
+                Part(part["part_number"], part["etag"].strip('"'))
+                for part in sorted(parts, key=lambda part: part["part_number"])
+            ],
+        )
+        logger.info(f"Completed multipart upload {upload_id} of {object_name} with {len(parts)} parts")
+        return {
+            "bucket": self.bucket_name,
+            "object_name": object_name,
+            "etag": result.etag,
+            "url": self.object_url(object_name),
+        }
+
+    def abort_multipart_upload(self, object_name: str, upload_id: str) -> None:
+        self.client._abort_multipart_upload(self.bucket_name, object_name, upload_id)
+        logger.info(f"Aborted multipart upload {upload_id} of {object_name}")
+
+    def upload_stream(self, object_name: str, data: BinaryIO, length: int,
+                      content_type: str = "application/octet-stream") -> dict:
+        result = self.client.put_object(
+            self.bucket_name,
+            object_name,
+            data,
+            length,
+            content_type=content_type
+        )
+        return {
+            "bucket": self.bucket_name,
+            "object_name": object_name,
+            "etag": result.etag,
+            "size_bytes": length,
+        }
+
+
+@lru_cache()
+def get_minio_service() -> MinioStorageService:
+    return MinioStorageService(get_minio_settings())
@@ -1,22 +1,143 @@
+import time
 from datetime import datetime, timezone
 import pandas as pd
-from typing import List
-from app.db.database import datasets_collection
+from typing import Callable, List, Optional
+from bson import ObjectId
+from pymongo import ASCENDING, UpdateOne
+from app.config.settings import get_database_settings
+from services.metrics import MONGO_DOCUMENTS_WRITTEN, MONGO_WRITE_DURATION
+from app.db.database import (
+    datasets_collection, dataset_rows_collection, dataset_records_collection, sync_state_collection
+)
 
-def store_to_mongodb(dataset_id: str, dataset_df: List[dict]) -> dict:
+def store_to_mongodb(dataset_id: str, dataset_df: List[dict], batch_size: Optional[int] = None,
+                     progress_callback: Optional[Callable[[int], None]] = None,
+                     manifest_id: Optional[str] = None) -> dict:
+    """
+    Store a dataset as a manifest document in `datasets` plus one document per row
+    in `dataset_rows`, written in unordered `insert_many` batches of `batch_size`.
+    `progress_callback` is called with the number of rows written after each batch.
+    Pass `manifest_id` to use an ID chosen in advance for the manifest.
+    """
+    batch_size = batch_size or get_database_settings().mongodb_insert_batch_size
 
-    wrapper_doc = {
+    manifest = {
         "dataset_id": dataset_id,
         "ingested_at": datetime.now(timezone.utc).isoformat(),
         "record_count": len(dataset_df),
-        "data": dataset_df
+        "layout": "rows",
+        "rows_collection": dataset_rows_collection.name,
+        "status": "writing"
     }
+    if manifest_id is not None:
+        manifest["_id"] = ObjectId(manifest_id)
+    result = datasets_collection.insert_one(manifest)
+    manifest_id = result.inserted_id
 
-    result = datasets_collection.insert_one(wrapper_doc)
+    # A failed batch must not leave a "writing" manifest with part of the rows behind
+    try:
+        dataset_rows_collection.create_index([("manifest_id", ASCENDING), ("seq", ASCENDING)])
+
+        started_at = time.perf_counter()
+        batches = 0
+        for start in range(0, len(dataset_df), batch_size):
+            rows = [
+                {"manifest_id": manifest_id, "dataset_id": dataset_id, "seq": seq, "data": record}
+                for seq, record in enumerate(dataset_df[start:start + batch_size], start)
+            ]
+            batch_started_at = time.perf_counter()
+            dataset_rows_collection.insert_many(rows, ordered=False)
+            MONGO_WRITE_DURATION.labels(dataset_rows_collection.name).observe(time.perf_counter() - batch_started_at)
+            MONGO_DOCUMENTS_WRITTEN.labels(dataset_rows_collection.name).inc(len(rows))
+            batches += 1
+            if progress_callback is not None:
+                progress_callback(start + len(rows))
+        write_seconds = time.perf_counter() - started_at
+
+        write_stats = {
+            "batches": batches,
+            "batch_size": batch_size,
+            "write_seconds": round(write_seconds, 3),
+            "rows_per_second": round(len(dataset_df) / write_seconds) if write_seconds > 0 else None
+        }
+        datasets_collection.update_one(
+            {"_id": manifest_id},
+            {"$set": {"status": "complete", "write_stats": write_stats}}
+        )
+    except Exception:
+        dataset_rows_collection.delete_many({"manifest_id": manifest_id})
+        datasets_collection.delete_one({"_id": manifest_id})
+        raise
 
     return {
-        "inserted_id": str(result.inserted_id),
+        "inserted_id": str(manifest_id),
         "record_count": len(dataset_df),
         "dataset_id": dataset_id,
-        "ingested_at": wrapper_doc["ingested_at"]
+        "ingested_at": manifest["ingested_at"],
+        "write_stats": write_stats
+    }
+
+def set_manifest_snapshot(manifest_id: str, snapshot: dict) -> None:
+    """Record where the columnar snapshot of a stored dataset lives"""
+    datasets_collection.update_one({"_id": ObjectId(manifest_id)}, {"$set": {"snapshot": snapshot}})
+
+def read_dataset_rows(manifest_id: str, skip: int = 0, limit: int = 1000) -> List[dict]:
+    """Read a slice of a stored dataset's rows without loading the rest"""
+    cursor = dataset_rows_collection.find(
+        {"manifest_id": ObjectId(manifest_id), "seq": {"$gte": skip}},
+        {"_id": 0, "data": 1}
+    ).sort("seq", ASCENDING).limit(limit)
+    return [row["data"] for row in cursor]
+
+def get_sync_watermark(dataset_id: str) -> Optional[str]:
+    state = sync_state_collection.find_one({"_id": dataset_id})
+    return state.get("last_modified") if state else None
+
+def set_sync_watermark(dataset_id: str, last_modified: str) -> None:
+    sync_state_collection.update_one(
+        {"_id": dataset_id},
+        {"$set": {
+            "last_modified": last_modified,
+            "synced_at": datetime.now(timezone.utc).isoformat()
+        }},
+        upsert=True
+    )
+
+def upsert_records_to_mongodb(dataset_id: str, records: List[dict], key: str = "name") -> dict:
+    """
+    Insert or update records one document per ERP record, matched on the ERP `name`,
+    so re-syncing a changed record replaces it instead of storing another copy.
+    """
+    dataset_records_collection.create_index(
+        [("dataset_id", ASCENDING), (key, ASCENDING)], unique=True
+    )
+
+    synced_at = datetime.now(timezone.utc).isoformat()
+    operations = [
+        UpdateOne(
+            {"dataset_id": dataset_id, key: record[key]},
+            {"$set": {
+                "modified": record.get("modified"),
+                "data": record,
+                "synced_at": synced_at
+            }},
+            upsert=True
+        )
+        for record in records
+    ]
+
+    inserted, updated = 0, 0
+    if operations:
+        started_at = time.perf_counter()
+        result = dataset_records_collection.bulk_write(operations, ordered=False)
+        MONGO_WRITE_DURATION.labels(dataset_records_collection.name).observe(time.perf_counter() - started_at)
+        MONGO_DOCUMENTS_WRITTEN.labels(dataset_records_collection.name).inc(len(operations))
+        inserted, updated = result.upserted_count, result.modified_count
+
+    return {
+        "dataset_id": dataset_id,
+        "record_count": len(records),
+        "inserted_count": inserted,
+        "updated_count": updated,
+        "synced_at": synced_at
     }
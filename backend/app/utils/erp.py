@@ -1,14 +1,17 @@
 import os
 import json 
+import time
 import pandas as pd
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
 
-from app.config.logging import get_logger, setup_logging
+from app.config.logging import get_logger
+from app.config.settings import get_erp_settings
+from app.utils.erp_sessions import get_session_pool
 from erp_client.erp_next_client import ERPNextClient
+from services.metrics import ERP_FETCH_DURATION, ERP_PAGE_DURATION, ERP_ROWS_FETCHED
 
-setup_logging()
 logger = get_logger("services.erp")
-load_dotenv()
 
 fields = ["naming_series","subject","customer","raised_by","status","priority","issue_type",
           "issue_split_from","description","service_level_agreement","response_by","response_by_variance",
@@ -18,25 +21,115 @@ fields = ["naming_series","subject","customer","raised_by","status","priority","
           "user_resolution_time","lead","contact","email_account","customer_name","project","company",
           "via_customer_portal","attachment","content_type"]
 
-def get_dataset_with_fields(client: ERPNextClient, dataset_id: str, fields: list = None, limit_page_length: int = 10) -> pd.DataFrame:
-    if fields is None:
-        fields = ["*"]
-        
-    endpoint = f"{client.base_url}/api/resource/{dataset_id}"
-    fields_json = str(fields).replace("'", '"')
+def get_dataset_count(client: ERPNextClient, dataset_id: str, filters: list = None) -> int:
+    endpoint = f"{client.base_url}/api/method/frappe.client.get_count"
+    params = {"doctype": dataset_id}
+    if filters:
+        params["filters"] = json.dumps(filters)
 
+    response = client.session.get(endpoint, params=params)
+    response.raise_for_status()
+    return int(response.json()["message"])
+
+def _fetch_page(client: ERPNextClient, dataset_id: str, fields: list, filters: Optional[list],
+                limit_start: int, page_size: int) -> List[dict]:
+    endpoint = f"{client.base_url}/api/resource/{dataset_id}"
     params = {
-        'limit_page_length': limit_page_length,
         'fields': json.dumps(fields),
+        'limit_start': limit_start,
+        'limit_page_length': page_size,
+        # A stable order keeps concurrently fetched pages from overlapping
+        'order_by': 'name asc',
     }
+    if filters:
+        params['filters'] = json.dumps(filters)
 
+    started_at = time.perf_counter()
     response = client.session.get(endpoint, params=params)
     response.raise_for_status()
+    page = response.json().get("data", [])
+    ERP_PAGE_DURATION.observe(time.perf_counter() - started_at)
+    return page
+
+def get_dataset_with_fields(client: ERPNextClient, dataset_id: str, fields: list = None, filters: list = None,
+                            page_size: Optional[int] = None, max_concurrency: Optional[int] = None,
+                            progress_callback: Optional[Callable[[int], None]] = None) -> pd.DataFrame:
+    """
+    Fetch every record of a doctype matching `filters`, `page_size` rows per request
+    with up to `max_concurrency` requests in flight. Fetch statistics are attached
+    to the returned DataFrame as `attrs["erp_fetch"]`, and `progress_callback` is
+    called with the number of rows fetched so far as pages arrive.
+    """
+    if fields is None:
+        fields = ["*"]
 
-    records = response.json().get("data", [])
-    return pd.DataFrame(records)
+    erp_settings = get_erp_settings()
+    page_size = page_size or erp_settings.erp_page_size
+    max_concurrency = max_concurrency or erp_settings.erp_max_concurrency
+    started_at = time.perf_counter()
 
-def pull_dataset(dataset_name: str) -> pd.DataFrame:
+    try:
+        total = get_dataset_count(client, dataset_id, filters)
+    except Exception:
+        logger.warning(f"Could not count records of {dataset_id}, paging sequentially")
+        total = None
+
+    pages: List[List[dict]] = []
+    rows_fetched = 0
+
+    def add_page(page: List[dict]) -> None:
+        nonlocal rows_fetched
+        pages.append(page)
+        rows_fetched += len(page)
+        if progress_callback is not None:
+            progress_callback(rows_fetched)
+
+    if total:
+        # The record count is known, fetch every page concurrently
+        offsets = range(0, total, page_size)
+        with ThreadPoolExecutor(max_workers=min(max_concurrency, len(offsets))) as pool:
+            for page in pool.map(
+                lambda limit_start: _fetch_page(client, dataset_id, fields, filters, limit_start, page_size),
+                offsets
+            ):
+                add_page(page)
+
+    # Keep paging sequentially while pages come back full, this covers an unknown
+    # count as well as records created after the count was taken
+    limit_start = len(pages) * page_size
+    while not pages or len(pages[-1]) == page_size:
+        page = _fetch_page(client, dataset_id, fields, filters, limit_start, page_size)
+        if not page and pages:
+            break
+        add_page(page)
+        limit_start += page_size
+
+    records = [record for page in pages for record in page]
+    elapsed = time.perf_counter() - started_at
+    ERP_FETCH_DURATION.observe(elapsed)
+    ERP_ROWS_FETCHED.inc(len(records))
+    stats = {
+        "total_rows": len(records),
+        "pages_fetched": len(pages),
+        "page_size": page_size,
+        "elapsed_seconds": round(elapsed, 3),
+    }
+    logger.info(
+        f"Fetched {stats['total_rows']} rows of {dataset_id} in {stats['pages_fetched']} pages "
+        f"({stats['elapsed_seconds']}s, concurrency {max_concurrency})"
+    )
+
+    dataset = pd.DataFrame(records)
+    dataset.attrs["erp_fetch"] = stats
+    return dataset
+
+def pull_dataset(dataset_name: str, incremental: bool = False, modified_since: Optional[str] = None,
+                 progress_callback: Optional[Callable[[int], None]] = None) -> pd.DataFrame:
+    """
+    Pull a doctype from ERP. An incremental pull also fetches the `name` and `modified`
+    fields needed to upsert records and advance the sync watermark, and with
+    `modified_since` only fetches records modified at or after that timestamp.
+    """
     erp_uri = os.getenv("ERP_URI")
     erp_username = os.getenv("ERP_USERNAME")
     erp_password = os.getenv("ERP_PASSWORD")
@@ -46,18 +139,29 @@ def pull_dataset(dataset_name: str) -> pd.DataFrame:
 
     try:
         logger.info(f"Connecting to ERP instance: {erp_uri}")
-        client = ERPNextClient(base_url=erp_uri)
-
-        client.login(username=erp_username, password=erp_password)
-        logger.info("Successfully logged in to ERP")
-
-        logger.info(f"Fetching dataset: {dataset_name}")
-        dataset = client.get_dataset(dataset_name)
-        logger.info(f"Dataset contents:\n{dataset.head()}")
-
-        logger.info("Syncing dataset with selected fields from index 0...")
-        sync_data = get_dataset_with_fields(client, dataset_name, fields = fields)
-        logger.info(f"Synced data:\n{sync_data.head()}")
+        session_pool = get_session_pool(erp_uri, erp_username, erp_password)
+
+        with session_pool.client() as client:
+            logger.info("Using pooled ERP session")
+
+            logger.info(f"Fetching dataset: {dataset_name}")
+            dataset = client.get_dataset(dataset_name)
+            logger.info(f"Dataset contents:\n{dataset.head()}")
+
+            if not incremental:
+                logger.info("Syncing dataset with selected fields...")
+                sync_data = get_dataset_with_fields(
+                    client, dataset_name, fields = fields, progress_callback = progress_callback
+                )
+            else:
+                logger.info(f"Syncing records modified since {modified_since or 'the beginning'}...")
+                sync_fields = ["name", "modified"] + [field for field in fields if field not in ("name", "modified")]
+                # ">=" re-fetches records sharing the watermark timestamp, upserting them is idempotent
+                filters = [["modified", ">=", modified_since]] if modified_since else None
+                sync_data = get_dataset_with_fields(
+                    client, dataset_name, fields = sync_fields, filters = filters, progress_callback = progress_callback
+                )
+            logger.info(f"Synced data:\n{sync_data.head()}")
 
         # logger.info("Converting the data into json")
         # sync_data = sync_data.to_json(orient = "records")
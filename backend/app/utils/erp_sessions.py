@@ -0,0 +1,124 @@
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Tuple
+
+from requests.adapters import HTTPAdapter
+
+from app.config.logging import get_logger
+from app.config.settings import get_erp_settings
+from erp_client.erp_next_client import ERPNextClient
+
+logger = get_logger("services.erp.sessions")
+
+# Frappe answers with one of these once the session cookie has expired
+SESSION_EXPIRED_STATUSES = (401, 403)
+
+
+class ERPSessionPool:
+    """
+    Pool of logged-in ERPNext clients for one ERP instance and user.
+
+    Clients are created and logged in on first use, then handed back to the pool
+    so later pipeline runs reuse both the session cookie and the keep-alive
+    connections. A request rejected because the session expired is retried once
+    after logging in again.
+    """
+
+    def __init__(self, base_url: str, username: str, password: str,
+                 size: int, connections: int, acquire_timeout: float):
+        self.base_url = base_url
+        self.username = username
+        self._password = password
+        self.connections = connections
+        self.acquire_timeout = acquire_timeout
+        self._idle: "queue.LifoQueue[ERPNextClient]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._local = threading.local()
+        self._relogin_lock = threading.Lock()
+
+    @contextmanager
+    def client(self) -> Iterator[ERPNextClient]:
+        """Borrow a logged-in client, waiting for one to free up if the pool is exhausted"""
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise TimeoutError(f"No ERP session available for {self.username}@{self.base_url}")
+        try:
+            try:
+                client = self._idle.get_nowait()
+            except queue.Empty:
+                client = self._new_client()
+            try:
+                yield client
+            finally:
+                self._idle.put(client)
+        finally:
+            self._slots.release()
+
+    def _new_client(self) -> ERPNextClient:
+        logger.info(f"Opening ERP session for {self.username}@{self.base_url}")
+        client = ERPNextClient(base_url=self.base_url)
+
+        # Keep-alive connections, enough for the concurrent page fetches of one pull
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.connections)
+        client.session.mount("http://", adapter)
+        client.session.mount("https://", adapter)
+        client.session.hooks["response"].append(
+            lambda response, *args, **kwargs: self._relogin_on_expiry(client, response, **kwargs)
+        )
+
+        self._login(client)
+        return client
+
+    def _login(self, client: ERPNextClient) -> None:
+        self._local.logging_in = True
+        try:
+            client.login(username=self.username, password=self._password)
+        finally:
+            self._local.logging_in = False
+
+    def _relogin_on_expiry(self, client: ERPNextClient, response, **kwargs):
+        if response.status_code not in SESSION_EXPIRED_STATUSES:
+            return response
+        # Don't retry the login request itself or a request that was already retried
+        if getattr(self._local, "logging_in", False) or getattr(response.request, "relogin_attempted", False):
+            return response
+
+        sent_cookie = response.request.headers.get("Cookie") or ""
+        with self._relogin_lock:
+            # Another thread may already have logged in again while this request was in flight
+            current_sid = client.session.cookies.get("sid")
+            if current_sid is None or f"sid={current_sid}" in sent_cookie:
+                logger.info(f"ERP session expired for {self.username}@{self.base_url}, logging in again")
+                self._login(client)
+
+        retry = response.request.copy()
+        retry.headers.pop("Cookie", None)
+        retry.prepare_cookies(client.session.cookies)
+        retry.relogin_attempted = True
+        return client.session.send(retry, **kwargs)
+
+
+_pools: Dict[Tuple[str, str], ERPSessionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_session_pool(base_url: str, username: str, password: str) -> ERPSessionPool:
+    """Get the process-wide session pool for an ERP instance and user"""
+    key = (base_url, username)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            settings = get_erp_settings()
+            pool = ERPSessionPool(
+                base_url=base_url,
+                username=username,
+                password=password,
+                size=settings.erp_session_pool_size,
+                connections=settings.erp_max_concurrency,
+                acquire_timeout=settings.erp_session_acquire_timeout,
+            )
+            _pools[key] = pool
+        else:
+            # Credentials may have been rotated since the pool was created
+            pool._password = password
+        return pool
@@ -0,0 +1,239 @@
+# Runners for heavy tasks
+# Heavy tasks don't run on the API's worker pools. A runner starts each one in its own
+# isolated environment and records the outcome in the task store, following the same
+# contract as the executor: status "running", then "completed" with the result or "error",
+# with the task's output in its log file so get_task_status and read_task_log work unchanged.
+#
+# LocalProcessRunner stands in for Fargate: every task gets its own OS process whose memory
+# and CPUs are limited from the task's memory_mb and cpu_units. A remote container backend
+# only has to implement TaskRunner.start and be returned by get_task_runner.
+
+import importlib
+import math
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Callable, List, Optional
+
+from app.config.logging import get_logger, setup_task_process_logging
+from app.config.settings import get_runner_settings
+from app.warehouse.task_definitions import TaskDefinition
+from services.cloud_functions.executor import current_exec_id
+from services.cloud_functions.server import introspection
+from services.cloud_functions.shared_buffers import (
+    MappedParams, get_shared_buffer_registry, handles_in, is_handle, share_result
+)
+from services.cloud_functions.task_output import log_path
+from services.cloud_functions.task_store import get_task_store
+from services.metrics import TASK_DURATION
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+logger = get_logger("warehouse.runners")
+
+# CPU units per vCPU, as in Fargate task definitions
+CPU_UNITS_PER_VCPU = 1024
+
+
+class TaskRunner:
+    """Interface for runners that execute heavy tasks outside the API process."""
+
+    def start(self, exec_id: str, task_def: TaskDefinition, param_values: List[Any],
+              param_types: List[str], on_done: Callable[[], None], **fields: Any) -> None:
+        """
+        Start a task whose state already exists in the task store. `fields` are recorded
+        on the task state, and `on_done` is called once the task has finished.
+        """
+        raise NotImplementedError
+
+    def shutdown(self) -> None:
+        pass
+
+
+class LocalProcessRunner(TaskRunner):
+    """
+    Runs every task in a fresh process with resource limits, so a task that runs out
+    of memory or crashes only takes down its own process.
+
+    Memory is capped with RLIMIT_DATA at the task's memory_mb plus a headroom for the
+    interpreter, and the process is pinned to as many CPUs as its cpu_units amount to.
+    """
+
+    def __init__(self, memory_headroom_mb: int):
+        self.memory_headroom_mb = memory_headroom_mb
+        self._context = multiprocessing.get_context("spawn")
+        self._processes = {}
+        self._lock = threading.Lock()
+        self._next_cpu = 0
+
+    def start(self, exec_id: str, task_def: TaskDefinition, param_values: List[Any],
+              param_types: List[str], on_done: Callable[[], None], **fields: Any) -> None:
+        receiver, sender = self._context.Pipe(duplex = False)
+        process = self._context.Process(
+            target = _run_isolated,
+            name = f"task-{exec_id}",
+            args = (
+                task_def.module.__name__,
+                task_def.func_name,
+                param_values,
+                param_types,
+                task_def.return_type,
+                exec_id,
+                (task_def.memory_mb + self.memory_headroom_mb) * 1024 * 1024,
+                self._allocate_cpus(task_def.cpu_units),
+                sender
+            ),
+            daemon = True
+        )
+
+        # Shared buffers passed as parameters stay alive until the task process has finished
+        handles = handles_in(param_values)
+        get_shared_buffer_registry().acquire(handles)
+        on_done = self._releasing(handles, on_done)
+
+        get_task_store().update(exec_id, status = "running", **fields)
+        started_at = time.monotonic()
+        try:
+            process.start()
+        except Exception:
+            get_shared_buffer_registry().release(handles)
+            raise
+        # The child holds its own copy of the sending end, close ours so a crash shows up as EOF
+        sender.close()
+        logger.info(f"Started heavy task {exec_id} ({task_def.name}) in process {process.pid}")
+
+        with self._lock:
+            self._processes[exec_id] = process
+        threading.Thread(
+            target = self._wait,
+            args = (exec_id, task_def, process, receiver, on_done, started_at),
+            name = f"runner-{exec_id}",
+            daemon = True
+        ).start()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            processes = list(self._processes.values())
+        for process in processes:
+            process.terminate()
+
+    def _wait(self, exec_id, task_def, process, receiver, on_done, started_at) -> None:
+        status = "error"
+        try:
+            try:
+                outcome = receiver.recv()
+            except EOFError:
+                outcome = None
+            process.join()
+
+            if outcome is None:
+                error = f"Task process exited with code {process.exitcode} before returning a result"
+                get_task_store().update(exec_id, status = "error", error = error)
+            elif outcome[0] == "ok":
+                if is_handle(outcome[1]):
+                    get_shared_buffer_registry().adopt(outcome[1])
+                get_task_store().update(exec_id, status = "completed", result = outcome[1])
+                status = "completed"
+            else:
+                get_task_store().update(exec_id, status = "error", error = outcome[1])
+            logger.info(f"Heavy task {exec_id} ({task_def.name}) finished with exit code {process.exitcode}")
+        except Exception as e:
+            logger.error(f"Failed to collect heavy task {exec_id}: {e}")
+            get_task_store().update(exec_id, status = "error", error = str(e))
+        finally:
+            TASK_DURATION.labels(task_def.name, status).observe(time.monotonic() - started_at)
+            receiver.close()
+            with self._lock:
+                self._processes.pop(exec_id, None)
+            on_done()
+
+    def _releasing(self, handles, on_done):
+        if not handles:
+            return on_done
+
+        def release():
+            get_shared_buffer_registry().release(handles)
+            on_done()
+        return release
+
+    def _allocate_cpus(self, cpu_units: int) -> Optional[List[int]]:
+        # Spread tasks over the available CPUs round robin, the scheduler already keeps
+        # the total cpu_units of running tasks within the node capacity
+        if not hasattr(os, "sched_getaffinity"):
+            return None
+        available = sorted(os.sched_getaffinity(0))
+        count = min(len(available), max(1, math.ceil(cpu_units / CPU_UNITS_PER_VCPU)))
+        with self._lock:
+            first = self._next_cpu
+            self._next_cpu = (first + count) % len(available)
+        return [available[(first + index) % len(available)] for index in range(count)]
+
+
+# Entry point of a task process
+# Runs in the spawned child: applies the limits, sends stdout and stderr (including output
+# of C extensions and subprocesses) to the task log and sends the outcome back over the pipe.
+def _run_isolated(module_name, func_name, param_values, param_types, return_type, exec_id,
+                  memory_bytes, cpus, connection):
+    log_file = log_path(exec_id)
+    log_fd = os.open(log_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    os.dup2(log_fd, 1)
+    os.dup2(log_fd, 2)
+    os.close(log_fd)
+    sys.stdout = os.fdopen(1, "w", buffering = 1)
+    sys.stderr = os.fdopen(2, "w", buffering = 1)
+
+    try:
+        # A fresh interpreter: log records go to stderr, i.e. the task log, not to the API's log files
+        setup_task_process_logging()
+        _apply_limits(memory_bytes, cpus)
+        print(f"[Process: {os.getpid()}] Started heavy task: {exec_id}")
+        current_exec_id.set(exec_id)
+        entrypoint = importlib.import_module(module_name)
+        # Shared mappings don't count towards RLIMIT_DATA, so large shared inputs fit any limit
+        mapped = MappedParams(param_values)
+        try:
+            result = introspection.introspect_run_with_args(
+                module = entrypoint,
+                func_name = func_name,
+                param_values = mapped.values,
+                param_types = param_types,
+                retrun_type = return_type
+            )
+        finally:
+            mapped.close()
+        result = share_result(result)
+        try:
+            connection.send(("ok", result))
+        except Exception:
+            # Results that can't be pickled are returned in a readable form
+            connection.send(("ok", repr(result)))
+    except BaseException as e:
+        print(f"Error during execution: {e!r}")
+        connection.send(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        connection.close()
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+
+def _apply_limits(memory_bytes: int, cpus: Optional[List[int]]) -> None:
+    if resource is not None:
+        limit = getattr(resource, "RLIMIT_DATA", resource.RLIMIT_AS)
+        resource.setrlimit(limit, (memory_bytes, memory_bytes))
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+
+
+# Runner used for heavy tasks, selected by RunnerSettings.heavy_task_runner
+@lru_cache()
+def get_task_runner() -> TaskRunner:
+    settings = get_runner_settings()
+    if settings.heavy_task_runner == "local":
+        return LocalProcessRunner(memory_headroom_mb = settings.runner_memory_headroom_mb)
+    raise ValueError(f"Unknown heavy task runner '{settings.heavy_task_runner}'.")
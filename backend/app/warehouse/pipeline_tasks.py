@@ -0,0 +1,116 @@
+# ERP pipeline tasks
+# These run on the task executor so a long pull never holds an HTTP request open.
+# Progress (current stage, rows fetched, rows written) is reported on the task state.
+
+from bson import ObjectId
+
+from app.config.logging import get_logger
+from app.utils.erp import pull_dataset
+from app.services.storage.mongodb_service import (
+    store_to_mongodb, upsert_records_to_mongodb, get_sync_watermark, set_sync_watermark, set_manifest_snapshot
+)
+from app.services.storage.parquet_service import write_parquet_snapshot
+from services.cloud_functions.executor import report_progress
+
+logger = get_logger("warehouse.pipeline_tasks")
+
+
+# Full sync: pull the whole dataset and store it as a new manifest
+# A failed snapshot doesn't undo the stored manifest, the job then reports a partial success
+def full_pipeline(dataset_id: str, snapshot: bool = False) -> dict:
+    report_progress(stage = "fetching", rows_fetched = 0, rows_written = 0)
+    dataset = pull_dataset(dataset_id, progress_callback = lambda rows: report_progress(rows_fetched = rows))
+    dataset_json = dataset.to_dict(orient="records")
+
+    report_progress(stage = "writing")
+    result = store_to_mongodb(
+        dataset_id, dataset_json, progress_callback = lambda rows: report_progress(rows_written = rows)
+    )
+
+    # Optionally keep a columnar copy of the pull in MinIO for analysts
+    snapshot_error = None
+    if snapshot:
+        report_progress(stage = "snapshot")
+        try:
+            location = write_parquet_snapshot(dataset_id, dataset, result["inserted_id"])
+            set_manifest_snapshot(result["inserted_id"], location)
+            result["snapshot"] = location
+        except Exception as e:
+            logger.exception(f"Snapshot of manifest {result['inserted_id']} ({dataset_id}) failed")
+            snapshot_error = str(e)
+
+    report_progress(stage = "done")
+    if snapshot_error is not None:
+        return {
+            "status": "partial",
+            "result": result,
+            "snapshot_error": snapshot_error,
+            "fetch": dataset.attrs.get("erp_fetch")
+        }
+    return {
+        "status": "success",
+        "result": result,
+        "fetch": dataset.attrs.get("erp_fetch")
+    }
+
+
+# Incremental sync: fetch only records changed since the last run and upsert them by ERP name
+def sync_pipeline(dataset_id: str) -> dict:
+    report_progress(stage = "fetching", rows_fetched = 0, rows_written = 0)
+    watermark = get_sync_watermark(dataset_id)
+    dataset = pull_dataset(
+        dataset_id, incremental=True, modified_since=watermark,
+        progress_callback = lambda rows: report_progress(rows_fetched = rows)
+    )
+    dataset_json = dataset.to_dict(orient="records")
+
+    report_progress(stage = "writing")
+    result = upsert_records_to_mongodb(dataset_id, dataset_json)
+    report_progress(rows_written = result["record_count"])
+
+    modified = [record["modified"] for record in dataset_json if record.get("modified")]
+    if modified:
+        watermark = max(modified)
+        set_sync_watermark(dataset_id, watermark)
+
+    result["watermark"] = watermark
+    report_progress(stage = "done")
+    return {
+        "status": "success",
+        "result": result,
+        "fetch": dataset.attrs.get("erp_fetch")
+    }
+
+
+# Entry point registered as the "erp_pipeline" task
+# Snapshots are taken of full pulls only, an incremental sync has no manifest to attach one to
+def run_pipeline_job(dataset_id: str, incremental: bool, snapshot: bool) -> dict:
+    if incremental and snapshot:
+        raise ValueError("A snapshot can only be taken of a full sync, not an incremental one.")
+    if incremental:
+        return sync_pipeline(dataset_id)
+    return full_pipeline(dataset_id, snapshot)
+
+
+# Steps of the "erp_snapshot_sync" pipeline
+# The pulled DataFrame is passed to the store and snapshot steps in-process, which run concurrently.
+# The manifest ID is chosen up front, so the snapshot is named after the manifest it belongs to.
+def pull_step(dataset_id: str):
+    return pull_dataset(dataset_id)
+
+
+def manifest_id_step() -> str:
+    return str(ObjectId())
+
+
+def store_step(dataset_id: str, dataset, manifest_id: str) -> dict:
+    return store_to_mongodb(dataset_id, dataset.to_dict(orient="records"), manifest_id = manifest_id)
+
+
+def snapshot_step(dataset_id: str, dataset, manifest_id: str) -> dict:
+    return write_parquet_snapshot(dataset_id, dataset, manifest_id)
+
+
+def link_snapshot_step(stored: dict, location: dict) -> dict:
+    set_manifest_snapshot(stored["inserted_id"], location)
+    return dict(stored, snapshot = location)
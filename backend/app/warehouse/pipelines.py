@@ -0,0 +1,260 @@
+# Pipelines of registered tasks
+# A pipeline declares nodes, each running a task from TASK_REGISTRY, and the nodes they
+# depend on. A pipeline run is a single task on the executor: inside it, nodes whose
+# dependencies have finished run concurrently on a thread pool and results are handed
+# to the dependent nodes in-process, so intermediate data never goes back to the client.
+# Per-node status and timings are reported as the task's progress.
+
+import contextvars
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+
+from app.config.logging import get_logger
+from app.warehouse.task_definitions import (
+    TaskDefinition, TaskType, ExecutionPool, register_task, get_task_definition
+)
+from services.cloud_functions.executor import report_progress
+
+logger = get_logger("warehouse.pipelines")
+
+
+# Placeholders for a node's parameters, resolved when the node runs
+class PipelineArg:
+    """A named argument given when the pipeline is run"""
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+class NodeResult:
+    """The result of another node, which becomes a dependency of this node"""
+
+    def __init__(self, node: str):
+        self.node = node
+
+
+# Define a node of a pipeline
+# params may mix plain values with PipelineArg and NodeResult placeholders, depends_on
+# lists extra nodes that must finish first without passing their results
+class PipelineNode:
+    def __init__(self, name: str, task_name: str, params: Optional[List[Any]] = None,
+                 depends_on: Optional[List[str]] = None):
+        self.name = name
+        self.task_name = task_name
+        self.params = list(params or [])
+        dependencies = list(depends_on or [])
+        for param in self.params:
+            if isinstance(param, NodeResult) and param.node not in dependencies:
+                dependencies.append(param.node)
+        self.depends_on = dependencies
+
+
+# Define a pipeline
+# cpu_units and memory_mb are what the scheduler reserves for a whole run and default
+# to the largest requirement among the nodes' tasks
+class PipelineDefinition:
+    def __init__(self, name: str, description: str, nodes: List[PipelineNode], max_parallel: int = 4,
+                 cpu_units: Optional[int] = None, memory_mb: Optional[int] = None, priority: int = 0):
+        self.name = name
+        self.description = description
+        self.nodes = {node.name: node for node in nodes}
+        self.max_parallel = max_parallel
+        self.cpu_units = cpu_units
+        self.memory_mb = memory_mb
+        self.priority = priority
+
+    # Check the nodes and return them in an order where dependencies come first
+    def validate(self) -> List[str]:
+        for node in self.nodes.values():
+            task_def = get_task_definition(node.task_name)
+            if task_def.task_type != TaskType.LIGHTWEIGHT:
+                raise ValueError(
+                    f"Pipeline '{self.name}': node '{node.name}' runs heavy task '{node.task_name}', "
+                    f"only lightweight tasks can run in-process."
+                )
+            for dependency in node.depends_on:
+                if dependency not in self.nodes:
+                    raise ValueError(f"Pipeline '{self.name}': node '{node.name}' depends on unknown node '{dependency}'.")
+
+        order = []
+        state: Dict[str, str] = {}
+
+        def visit(name: str):
+            if state.get(name) == "done":
+                return
+            if state.get(name) == "visiting":
+                raise ValueError(f"Pipeline '{self.name}' has a dependency cycle through node '{name}'.")
+            state[name] = "visiting"
+            for dependency in self.nodes[name].depends_on:
+                visit(dependency)
+            state[name] = "done"
+            order.append(name)
+
+        for name in self.nodes:
+            visit(name)
+        return order
+
+    # Nodes no other node depends on, their results are the pipeline's result
+    def outputs(self) -> List[str]:
+        dependencies = {dependency for node in self.nodes.values() for dependency in node.depends_on}
+        return [name for name in self.nodes if name not in dependencies]
+
+
+# Registry to hold all pipeline definitions
+PIPELINE_REGISTRY: Dict[str, PipelineDefinition] = {}
+
+# Function to register a pipeline
+# The pipeline is also registered as a task of the same name, so it is queued, scheduled
+# and tracked like any other task: run it with params [pipeline name, {argument: value}]
+def register_pipeline(definition: PipelineDefinition):
+    if definition.name in PIPELINE_REGISTRY:
+        raise ValueError(f"Pipeline '{definition.name}' is already registered.")
+    definition.validate()
+
+    task_defs = [get_task_definition(node.task_name) for node in definition.nodes.values()]
+    register_task(
+        TaskDefinition(
+            name = definition.name,
+            task_type = TaskType.LIGHTWEIGHT,
+            description = definition.description,
+            module = sys.modules[__name__],
+            func_name = "run_pipeline",
+            cpu_units = definition.cpu_units or max(task_def.cpu_units for task_def in task_defs),
+            memory_mb = definition.memory_mb or max(task_def.memory_mb for task_def in task_defs),
+            return_type = dict,
+            execution_pool = ExecutionPool.THREAD,
+            priority = definition.priority
+        )
+    )
+    PIPELINE_REGISTRY[definition.name] = definition
+
+# Function to get a specific pipeline definition by name
+def get_pipeline_definition(pipeline_name: str) -> PipelineDefinition:
+    """Get the pipeline definition by name"""
+    if pipeline_name not in PIPELINE_REGISTRY:
+        raise ValueError(f"Pipeline '{pipeline_name}' is not registered.")
+    return PIPELINE_REGISTRY[pipeline_name]
+
+
+# Entry point of a pipeline run on the executor
+# Returns the results of the output nodes and the timings of every node
+def run_pipeline(pipeline_name: str, args: dict) -> dict:
+    definition = get_pipeline_definition(pipeline_name)
+    missing = sorted({
+        param.name for node in definition.nodes.values() for param in node.params
+        if isinstance(param, PipelineArg) and param.name not in args
+    })
+    if missing:
+        raise ValueError(f"Pipeline '{pipeline_name}' is missing arguments: {', '.join(missing)}")
+
+    run = _PipelineRun(definition, args)
+    return run.execute()
+
+
+class _PipelineRun:
+    def __init__(self, definition: PipelineDefinition, args: Dict[str, Any]):
+        self.definition = definition
+        self.args = args
+        self.results: Dict[str, Any] = {}
+        self.nodes: Dict[str, Dict[str, Any]] = {name: {"status": "pending"} for name in definition.nodes}
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+
+    def execute(self) -> Dict[str, Any]:
+        definition = self.definition
+        remaining = {name: set(node.depends_on) for name, node in definition.nodes.items()}
+        dependents: Dict[str, List[str]] = {name: [] for name in definition.nodes}
+        for name, node in definition.nodes.items():
+            for dependency in node.depends_on:
+                dependents[dependency].append(name)
+
+        self._report()
+        failed = None
+        running = {}
+        with ThreadPoolExecutor(max_workers = definition.max_parallel,
+                                thread_name_prefix = f"pipeline-{definition.name}") as pool:
+            ready = [name for name, waiting_on in remaining.items() if not waiting_on]
+            while ready or running:
+                if failed is None:
+                    # Nodes report progress for the pipeline's task, so they run in its context
+                    for name in ready:
+                        running[pool.submit(contextvars.copy_context().run, self._run_node, name)] = name
+                ready = []
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when = FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        failed = failed or (name, error)
+                        continue
+                    for dependent in dependents[name]:
+                        remaining[dependent].discard(name)
+                        if not remaining[dependent]:
+                            ready.append(dependent)
+
+        if failed is not None:
+            for name, node in self.nodes.items():
+                if node["status"] == "pending":
+                    node["status"] = "skipped"
+            self._report()
+            name, error = failed
+            logger.error(f"Pipeline {definition.name} failed at node {name}: {error}")
+            raise RuntimeError(f"Pipeline '{definition.name}' failed at node '{name}': {error}") from error
+
+        total = round(time.perf_counter() - self._started, 3)
+        report_progress(stage = "done", nodes = self.nodes, elapsed_seconds = total)
+        return {
+            "pipeline": definition.name,
+            "results": {name: self.results[name] for name in definition.outputs()},
+            "nodes": self.nodes,
+            "elapsed_seconds": total
+        }
+
+    def _run_node(self, name: str) -> None:
+        node = self.definition.nodes[name]
+        task_def = get_task_definition(node.task_name)
+        func = getattr(task_def.module, task_def.func_name)
+        params = [self._resolve(param) for param in node.params]
+
+        started = time.perf_counter()
+        with self._lock:
+            self.nodes[name] = {"status": "running", "started_at": round(started - self._started, 3)}
+        self._report()
+        logger.info(f"Pipeline {self.definition.name}: running node {name} ({node.task_name})")
+
+        try:
+            result = func(*params)
+        except Exception as e:
+            with self._lock:
+                self.nodes[name].update(status = "error", error = str(e),
+                                        seconds = round(time.perf_counter() - started, 3))
+            self._report()
+            logger.exception(f"Pipeline {self.definition.name}: node {name} failed: {e}")
+            raise
+
+        with self._lock:
+            self.results[name] = result
+            self.nodes[name].update(status = "completed", seconds = round(time.perf_counter() - started, 3))
+        self._report()
+
+    def _resolve(self, param: Any) -> Any:
+        if isinstance(param, PipelineArg):
+            if param.name not in self.args:
+                raise ValueError(f"Missing pipeline argument '{param.name}'.")
+            return self.args[param.name]
+        if isinstance(param, NodeResult):
+            with self._lock:
+                return self.results[param.node]
+        return param
+
+    def _report(self) -> None:
+        # Reported under the lock, so a stale copy of the nodes never lands after a newer one
+        with self._lock:
+            nodes = {name: dict(node) for name, node in self.nodes.items()}
+            report_progress(stage = "running", nodes = nodes)
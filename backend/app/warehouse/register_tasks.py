@@ -1,4 +1,6 @@
-from app.warehouse.task_definitions import TaskDefinition, TaskType, register_task
+from app.warehouse.task_definitions import TaskDefinition, TaskType, ExecutionPool, register_task
+from app.warehouse.pipelines import PipelineDefinition, PipelineNode, PipelineArg, NodeResult, register_pipeline
+from app.warehouse import pipeline_tasks
 from services.cloud_functions.server import custprocess
 
 # Register the task
@@ -11,6 +13,66 @@ register_task(
         func_name = "func1",
         cpu_units = 256,
         memory_mb = 512,
-        return_type = str
+        return_type = str,
+        cacheable = True,
+        cache_ttl = 3600
+    )
+)
+
+# ERP pull and Mongo ingest behind POST /run, mostly waiting on I/O
+register_task(
+    TaskDefinition(
+        name = "erp_pipeline",
+        task_type = TaskType.LIGHTWEIGHT,
+        description = "Pulls a dataset from ERP and stores it in MongoDB",
+        module = pipeline_tasks,
+        func_name = "run_pipeline_job",
+        cpu_units = 512,
+        memory_mb = 1024,
+        return_type = dict,
+        execution_pool = ExecutionPool.THREAD
+    )
+)
+
+# Steps of the ERP sync pipeline, they pass DataFrames to each other so only run inside a pipeline
+# and can't be submitted through /submit-task or /submit-batch
+for name, func_name, description, return_type in [
+    ("erp_pull", "pull_step", "Pulls a dataset from ERP into a DataFrame", None),
+    ("erp_manifest_id", "manifest_id_step", "Chooses the ID of the manifest a pull is stored under", str),
+    ("erp_store", "store_step", "Stores a pulled dataset in MongoDB", dict),
+    ("erp_snapshot", "snapshot_step", "Writes a pulled dataset to MinIO as Parquet", dict),
+    ("erp_link_snapshot", "link_snapshot_step", "Records the Parquet snapshot on the stored manifest", dict),
+]:
+    register_task(
+        TaskDefinition(
+            name = name,
+            task_type = TaskType.LIGHTWEIGHT,
+            description = description,
+            module = pipeline_tasks,
+            func_name = func_name,
+            cpu_units = 512,
+            memory_mb = 1024,
+            return_type = return_type,
+            execution_pool = ExecutionPool.THREAD,
+            pipeline_only = True
+        )
+    )
+
+# Pull once, then store and snapshot concurrently under the same manifest ID
+register_pipeline(
+    PipelineDefinition(
+        name = "erp_snapshot_sync",
+        description = "Pulls a dataset from ERP, stores it in MongoDB and snapshots it to MinIO",
+        nodes = [
+            PipelineNode("pull", "erp_pull", [PipelineArg("dataset_id")]),
+            PipelineNode("manifest", "erp_manifest_id"),
+            PipelineNode(
+                "store", "erp_store", [PipelineArg("dataset_id"), NodeResult("pull"), NodeResult("manifest")]
+            ),
+            PipelineNode(
+                "snapshot", "erp_snapshot", [PipelineArg("dataset_id"), NodeResult("pull"), NodeResult("manifest")]
+            ),
+            PipelineNode("link", "erp_link_snapshot", [NodeResult("store"), NodeResult("snapshot")]),
+        ]
     )
 )
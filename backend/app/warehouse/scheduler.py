@@ -0,0 +1,202 @@
+# Resource-aware scheduler for registered tasks
+# Tasks are admitted against the node capacity configured in SchedulerSettings, using the
+# cpu_units and memory_mb of their TaskDefinition. Tasks that don't fit yet wait in a queue
+# ordered by priority, then by age, and are started as running tasks release their resources.
+
+import heapq
+import itertools
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.config.logging import get_logger
+from app.config.settings import get_scheduler_settings
+from app.warehouse.task_definitions import TaskDefinition
+from services.cloud_functions.backends import QueueFullError
+from services.cloud_functions.executor import queue_task, fail_task
+from services.metrics import register_gauge
+
+logger = get_logger("warehouse.scheduler")
+
+# Starts an admitted task: called with the execution ID, a release callback to call once
+# the task has finished, and extra fields (wait_seconds) to record on the task state
+StartFunction = Callable[..., None]
+
+
+class _QueuedTask:
+    __slots__ = ("exec_id", "task_def", "start", "queued_at")
+
+    def __init__(self, exec_id: str, task_def: TaskDefinition, start: StartFunction):
+        self.exec_id = exec_id
+        self.task_def = task_def
+        self.start = start
+        self.queued_at = time.monotonic()
+
+
+class TaskScheduler:
+    """
+    Admits tasks while their CPU units and memory fit in the remaining node capacity.
+
+    Waiting tasks are started strictly in priority order (higher first, oldest first
+    within a priority), so a large task at the head of the queue is not starved by
+    smaller ones that would fit around it.
+    """
+
+    def __init__(self, cpu_units: int, memory_mb: int, max_queued: int):
+        self.cpu_units = cpu_units
+        self.memory_mb = memory_mb
+        self.max_queued = max_queued
+        self._cpu_in_use = 0
+        self._memory_in_use = 0
+        self._running = 0
+        self._queue: List[Tuple[int, int, _QueuedTask]] = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        # Wait time of admitted tasks
+        self._admitted = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    def check(self, task_def: TaskDefinition) -> None:
+        """Raise ValueError for a task that could never fit on this node"""
+        if task_def.cpu_units > self.cpu_units or task_def.memory_mb > self.memory_mb:
+            raise ValueError(
+                f"Task '{task_def.name}' needs {task_def.cpu_units} CPU units and {task_def.memory_mb} MB, "
+                f"more than the node capacity of {self.cpu_units} CPU units and {self.memory_mb} MB."
+            )
+
+    def submit(self, task_def: TaskDefinition, start: StartFunction, exec_id: Optional[str] = None) -> str:
+        """
+        Queue a task and start it right away if it fits. Creates the queued task state
+        unless `exec_id` refers to one that already exists. Returns the execution ID.
+        """
+        self.check(task_def)
+        self.check_room(1)
+        if exec_id is None:
+            exec_id = queue_task(task_name = task_def.name)
+        with self._lock:
+            entry = _QueuedTask(exec_id, task_def, start)
+            heapq.heappush(self._queue, (-task_def.priority, next(self._sequence), entry))
+        self._schedule()
+        return exec_id
+
+    def check_room(self, count: int) -> None:
+        """Raise QueueFullError unless `count` more tasks fit in the queue"""
+        with self._lock:
+            if len(self._queue) + count > self.max_queued:
+                raise QueueFullError(
+                    f"Scheduler queue is full ({len(self._queue)} of {self.max_queued} waiting tasks, "
+                    f"{count} more requested)"
+                )
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, wait times and resource usage"""
+        now = time.monotonic()
+        with self._lock:
+            oldest = min((entry.queued_at for _, _, entry in self._queue), default = None)
+            return {
+                "queue_depth": len(self._queue),
+                "running": self._running,
+                "cpu_units": {"capacity": self.cpu_units, "in_use": self._cpu_in_use},
+                "memory_mb": {"capacity": self.memory_mb, "in_use": self._memory_in_use},
+                "oldest_wait_seconds": round(now - oldest, 3) if oldest is not None else 0.0,
+                "admitted": self._admitted,
+                "average_wait_seconds": round(self._total_wait / self._admitted, 3) if self._admitted else 0.0,
+                "max_wait_seconds": round(self._max_wait, 3),
+            }
+
+    def _schedule(self) -> None:
+        # A task that finishes while being started (e.g. a cached result) releases its resources
+        # from inside this loop, just ask the running loop for another pass instead of recursing
+        if getattr(self._local, "scheduling", False):
+            self._local.rerun = True
+            return
+        self._local.scheduling = True
+        try:
+            while True:
+                self._local.rerun = False
+                for entry, wait in self._admit():
+                    self._start(entry, wait)
+                if not self._local.rerun:
+                    break
+        finally:
+            self._local.scheduling = False
+
+    def _admit(self) -> List[Tuple[_QueuedTask, float]]:
+        # Pick the tasks to start under the lock, they are started outside of it
+        admitted = []
+        with self._lock:
+            while self._queue:
+                entry = self._queue[0][2]
+                if not self._fits(entry.task_def):
+                    break
+                heapq.heappop(self._queue)
+                self._reserve(entry.task_def)
+                wait = time.monotonic() - entry.queued_at
+                self._admitted += 1
+                self._total_wait += wait
+                self._max_wait = max(self._max_wait, wait)
+                admitted.append((entry, wait))
+        return admitted
+
+    def _start(self, entry: _QueuedTask, wait: float) -> None:
+        released = threading.Event()
+
+        def release():
+            # Guard against a runner reporting completion twice
+            if released.is_set():
+                return
+            released.set()
+            with self._lock:
+                self._free(entry.task_def)
+            self._schedule()
+
+        try:
+            entry.start(entry.exec_id, release, wait_seconds = round(wait, 3))
+        except Exception as e:
+            logger.error(f"Failed to start task {entry.exec_id} ({entry.task_def.name}): {e}")
+            fail_task(entry.exec_id, str(e))
+            release()
+
+    def _fits(self, task_def: TaskDefinition) -> bool:
+        return (
+            self._cpu_in_use + task_def.cpu_units <= self.cpu_units
+            and self._memory_in_use + task_def.memory_mb <= self.memory_mb
+        )
+
+    def _reserve(self, task_def: TaskDefinition) -> None:
+        self._cpu_in_use += task_def.cpu_units
+        self._memory_in_use += task_def.memory_mb
+        self._running += 1
+
+    def _free(self, task_def: TaskDefinition) -> None:
+        self._cpu_in_use -= task_def.cpu_units
+        self._memory_in_use -= task_def.memory_mb
+        self._running -= 1
+
+
+# Shared scheduler for the API process
+@lru_cache()
+def get_scheduler() -> TaskScheduler:
+    settings = get_scheduler_settings()
+    scheduler = TaskScheduler(
+        cpu_units = settings.scheduler_cpu_units,
+        memory_mb = settings.scheduler_memory_mb,
+        max_queued = settings.scheduler_max_queued,
+    )
+    register_gauge(
+        "scheduler_queue_depth", "Tasks waiting for resources in the scheduler", (),
+        lambda: [({}, scheduler.stats()["queue_depth"])]
+    )
+    register_gauge(
+        "scheduler_oldest_wait_seconds", "How long the oldest waiting task has been queued", (),
+        lambda: [({}, scheduler.stats()["oldest_wait_seconds"])]
+    )
+    register_gauge(
+        "scheduler_running_tasks", "Tasks admitted by the scheduler that are still running", (),
+        lambda: [({}, scheduler.stats()["running"])]
+    )
+    return scheduler
@@ -1,7 +1,7 @@
 # Simple task registry where developers can register tasks
 # and their metadata for introspection and execution
 
-from typing import Dict, Any, Callable
+from typing import Dict, Any, Callable, Optional
 from enum import Enum 
 
 # Define the types of tasks that can be registered
@@ -9,11 +9,28 @@ class TaskType(Enum):
     LIGHTWEIGHT = "lightweight"
     HEAVY = "heavy" 
 
+# Define the worker pools a lightweight task can run on
+# Threads suit I/O-bound tasks, processes suit CPU-bound tasks
+class ExecutionPool(Enum):
+    THREAD = "thread"
+    PROCESS = "process"
+
+# Default lifetime of cached results for cacheable tasks, in seconds
+DEFAULT_CACHE_TTL = 300
+
 # Define a structure for task definitions
 # This includes metadata like name, type, description, handler function, and resource requirements
+# The scheduler admits tasks against the node capacity using cpu_units and memory_mb,
+# starting waiting tasks with a higher priority first
+# Tasks marked cacheable must be pure: the same arguments always give the same result,
+# so repeat invocations within cache_ttl seconds are answered from the result cache
+# Tasks marked pipeline_only are steps of registered pipelines and can't be submitted on their own
 class TaskDefinition:
     def __init__(self, name: str, task_type: TaskType, description: str, 
-                 module: str, func_name: str, cpu_units: int, memory_mb: int, return_type: Any = None):
+                 module: str, func_name: str, cpu_units: int, memory_mb: int, return_type: Any = None,
+                 execution_pool: ExecutionPool = ExecutionPool.THREAD,
+                 cacheable: bool = False, cache_ttl: Optional[int] = None, priority: int = 0,
+                 pipeline_only: bool = False):
         self.name = name
         self.task_type = task_type
         self.description = description
@@ -22,6 +39,11 @@ class TaskDefinition:
         self.cpu_units = cpu_units
         self.memory_mb = memory_mb 
         self.return_type = return_type  
+        self.execution_pool = execution_pool
+        self.cacheable = cacheable
+        self.cache_ttl = (cache_ttl or DEFAULT_CACHE_TTL) if cacheable else None
+        self.priority = priority
+        self.pipeline_only = pipeline_only
 
 # Registry to hold all task definitions
 TASK_REGISTRY: Dict[str, TaskDefinition] = {} 
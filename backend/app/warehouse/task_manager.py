@@ -2,23 +2,28 @@
 # Decides how and where to execute tasks based on their definitions
 
 import asyncio
-from typing import Dict, Any
+import threading
+from functools import lru_cache
+from typing import Dict, Any, List, Tuple
 from app.warehouse.task_definitions import TASK_REGISTRY, TaskType
-from services.cloud_functions.executor import submit_task, get_task_status
+from app.warehouse.scheduler import get_scheduler
+from app.warehouse.fargate_runner import get_task_runner
+from services.cloud_functions.backends import QueueFullError
+from services.cloud_functions.executor import start_task, queue_batch, fail_task, get_task_status
+from services.cloud_functions.shared_buffers import (
+    SharedBufferHandle, get_shared_buffer_registry, handles_in, restore_handles
+)
 
 class TaskManager:
     def __init__(self):
-        self.fargate_runner = None 
+        self.fargate_runner = get_task_runner()
+        self.scheduler = get_scheduler()
 
     # Execute a task based on its type
     # This method checks the task type and routes it to the appropriate execution method
     async def execute_task(self, task_name: str, params: Dict[str, Any]) -> Any:
-        if task_name not in TASK_REGISTRY:
-            raise ValueError(f"Task '{task_name}' is not registered.")
-        
-        task_def = TASK_REGISTRY[task_name]
-        print(task_def) 
-        
+        task_def = self._submittable(task_name)
+
         if task_def.task_type == TaskType.LIGHTWEIGHT:
             return await self._execute_lightweight_task(task_def, params)
         elif task_def.task_type == TaskType.HEAVY:
@@ -26,21 +31,119 @@ class TaskManager:
         else:
             raise ValueError(f"Unknown task type for task '{task_name}'.")
         
+    # Execute many tasks in one go
+    # Every task is validated before anything is submitted, and a batch that doesn't fit in
+    # the scheduler queue or the task store is rejected as a whole. Then the task states are
+    # created together and each item is handed to the scheduler.
+    # Returns the batch ID and the execution ID of each item.
+    async def execute_batch(self, items: List[Tuple[str, List[Any]]]) -> Dict[str, Any]:
+        submissions = []
+        for task_name, params in items:
+            task_def = self._submittable(task_name)
+            if task_def.task_type not in (TaskType.LIGHTWEIGHT, TaskType.HEAVY):
+                raise ValueError(f"Unknown task type for task '{task_name}'.")
+            self.scheduler.check(task_def)
+            submissions.append((task_def, self._starter(task_def, params), params))
+
+        # Submitting writes to the task store, keep it off the event loop
+        return await asyncio.to_thread(self._schedule_batch, submissions)
+
+    # Look up a task that may be submitted on its own
+    def _submittable(self, task_name: str):
+        if task_name not in TASK_REGISTRY:
+            raise ValueError(f"Task '{task_name}' is not registered.")
+        task_def = TASK_REGISTRY[task_name]
+        if task_def.pipeline_only:
+            raise ValueError(f"Task '{task_name}' only runs as a step of a pipeline.")
+        return task_def
+
+    def _schedule_batch(self, submissions) -> Dict[str, Any]:
+        # Other submissions can still take the room in between, those items are marked as errors
+        self.scheduler.check_room(len(submissions))
+        batch = queue_batch(len(submissions))
+        for exec_id, (task_def, start, params) in zip(batch["exec_ids"], submissions):
+            try:
+                self._submit(task_def, start, params, exec_id = exec_id)
+            except (QueueFullError, ValueError) as e:
+                fail_task(exec_id, str(e))
+        return batch
+
+    # Hand a task to the scheduler
+    # Shared buffers passed to the task are pinned from now until it has finished, so a task
+    # that waits in the scheduler queue longer than the buffer TTL still finds them
+    def _submit(self, task_def, start, params, exec_id = None) -> str:
+        handles = handles_in(params)
+        if not handles:
+            return self.scheduler.submit(task_def, start, exec_id = exec_id)
+
+        registry = get_shared_buffer_registry()
+        registry.acquire(handles)
+        unpinned = threading.Event()
+
+        def unpin():
+            if not unpinned.is_set():
+                unpinned.set()
+                registry.release(handles)
+
+        def pinned_start(exec_id, release, **fields):
+            def finished():
+                unpin()
+                release()
+            try:
+                start(exec_id, finished, **fields)
+            except Exception:
+                unpin()
+                raise
+
+        try:
+            return self.scheduler.submit(task_def, pinned_start, exec_id = exec_id)
+        except Exception:
+            unpin()
+            raise
+
+    # Build the executor arguments for a lightweight task
+    def _submission(self, task_def, params) -> Dict[str, Any]:
+        # Handles sent through the API arrive as plain dicts
+        param_values = restore_handles(params)
+        return {
+            "func_name": task_def.func_name,
+            "param_values": param_values,
+            # A shared buffer handle is passed on as the table or bytes it refers to
+            "param_types": [
+                v.type_name if isinstance(v, SharedBufferHandle) else str(type(v).__name__) for v in param_values
+            ],
+            "return_type": task_def.return_type,
+            "entrypoint": task_def.module,
+            "pool": task_def.execution_pool.value,
+            "cache_ttl": task_def.cache_ttl,
+            "task_name": task_def.name
+        }
+
+    # Build the function the scheduler calls to start a task once it is admitted
+    # Lightweight tasks run on the executor's pools, heavy tasks on the runner
+    def _starter(self, task_def, params):
+        submission = self._submission(task_def, params)
+        if task_def.task_type == TaskType.HEAVY:
+            return lambda exec_id, release, **fields: self.fargate_runner.start(
+                exec_id, task_def, submission["param_values"], submission["param_types"], release, **fields
+            )
+        return lambda exec_id, release, **fields: start_task(exec_id, on_done = release, **submission, **fields)
+
     async def _execute_lightweight_task(self, task_def, params):
-        # Directly call the handler function for lightweight tasks
-        param_values = list(params)
-        exec_id = submit_task(
-            func_name = task_def.name,
-            param_values = param_values,
-            param_types = [str(type(v).__name__) for v in param_values],
-            return_type = task_def.return_type
-        )
+        # Queue the task with the scheduler, it runs on the executor once resources are free
+        # Submitting may write to the task store, keep it off the event loop
+        exec_id = await asyncio.to_thread(self._submit, task_def, self._starter(task_def, params), params)
         return exec_id 
     
     async def _execute_heavy_task(self, task_def, params):
-        # For heavy tasks, we might want to use a separate runner like Fargate
+        # Heavy tasks run on the runner in their own process with limited memory and CPUs
         if not self.fargate_runner:
             raise RuntimeError("Fargate runner is not initialized.")
-        
-        # Here we would submit the task to the Fargate runner
-        raise NotImplementedError("Heavy task execution is not implemented yet.")
\ No newline at end of file
+
+        exec_id = await asyncio.to_thread(self._submit, task_def, self._starter(task_def, params), params)
+        return exec_id
+
+# Shared Task Manager for the API process
+@lru_cache()
+def get_task_manager() -> TaskManager:
+    return TaskManager()
\ No newline at end of file
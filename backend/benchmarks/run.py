@@ -0,0 +1,127 @@
+# Runs the benchmark suite and compares the results with a stored baseline
+#
+#   python -m benchmarks.run                       # run everything, compare with baseline.json
+#   python -m benchmarks.run --quick -b introspection
+#   python -m benchmarks.run --output results.json --fail-on-regression
+#   python -m benchmarks.run --save-baseline       # after an intended performance change
+#
+# Run it from the backend directory. Results are written as JSON; a metric that is worse
+# than the baseline by more than --tolerance is reported as a regression.
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def higher_is_better(metric: str) -> bool:
+    return metric.endswith("_per_second")
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+            tolerance: float) -> List[Dict[str, Any]]:
+    """Compare every metric present in both runs, flagging changes beyond the tolerance"""
+    comparisons = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            reference = baseline.get(name, {}).get(metric)
+            if not reference:
+                continue
+            change = (value - reference) / reference
+            worse = -change if higher_is_better(metric) else change
+            comparisons.append({
+                "benchmark": name,
+                "metric": metric,
+                "baseline": reference,
+                "current": value,
+                "change": round(change, 4),
+                "regression": worse > tolerance,
+            })
+    return comparisons
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description = "Benchmarks of task dispatch and introspection")
+    parser.add_argument("-b", "--benchmark", action = "append", help = "Run only this benchmark (repeatable)")
+    parser.add_argument("--quick", action = "store_true", help = "Fewer iterations, for a fast smoke run")
+    parser.add_argument("--output", help = "Write the results as JSON to this file instead of stdout")
+    parser.add_argument("--baseline", default = BASELINE_PATH, help = "Baseline to compare with")
+    parser.add_argument("--save-baseline", action = "store_true", help = "Store these results as the new baseline")
+    parser.add_argument("--tolerance", type = float, default = 0.2, help = "Allowed relative slowdown, default 0.2")
+    parser.add_argument("--fail-on-regression", action = "store_true", help = "Exit with status 1 on a regression")
+    args = parser.parse_args(argv)
+
+    # Task logs of the stand-in tasks go to a scratch directory, the executor writes them relative to the cwd
+    args.baseline = os.path.abspath(args.baseline)
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    sys.path.insert(0, os.getcwd())
+    scratch = tempfile.mkdtemp(prefix = "benchmarks-")
+    os.chdir(scratch)
+    try:
+        return _run(parser, args)
+    finally:
+        shutil.rmtree(scratch, ignore_errors = True)
+
+
+def _run(parser: argparse.ArgumentParser, args: argparse.Namespace) -> int:
+    from benchmarks.suite import BENCHMARKS
+
+    selected = args.benchmark or list(BENCHMARKS)
+    unknown = [name for name in selected if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+    results = {}
+    for name in selected:
+        print(f"Running {name}...", file = sys.stderr)
+        results[name] = BENCHMARKS[name](args.quick)
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report["comparison"] = compare(results, baseline["results"], args.tolerance)
+        for item in report["comparison"]:
+            if item["regression"]:
+                print(
+                    f"REGRESSION {item['benchmark']}.{item['metric']}: "
+                    f"{item['baseline']} -> {item['current']} ({item['change']:+.1%})",
+                    file = sys.stderr
+                )
+
+    output = json.dumps(report, indent = 2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            f.write(output + "\n")
+        print(f"Saved baseline to {args.baseline}", file = sys.stderr)
+
+    regressions = [item for item in report.get("comparison", []) if item["regression"]]
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
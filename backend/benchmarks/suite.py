@@ -0,0 +1,167 @@
+# Benchmarks of the task dispatch hot path
+# Every case runs against local stand-ins (generated modules, the in-memory task store and
+# synthetic log files), so no MongoDB, MinIO or ERP instance is needed. Each case returns
+# a dict of metrics; names ending in "_per_second" are better when higher, everything
+# else (latencies in microseconds or milliseconds) is better when lower.
+
+import asyncio
+import statistics
+import threading
+import time
+import types
+from typing import Any, Callable, Dict, List
+
+from services.cloud_functions import executor
+from services.cloud_functions.server import introspection
+from services.cloud_functions.task_output import log_path
+
+
+def _percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _make_module(name: str, functions: int) -> types.ModuleType:
+    # A module with many functions of the shape the executor dispatches to
+    module = types.ModuleType(name)
+    source = "\n".join(
+        f"def func_{index}(a: str, b: str) -> str:\n    return a + b\n" for index in range(functions)
+    )
+    exec(source, module.__dict__)
+    return module
+
+
+# introspect_run_with_args on modules of growing size
+# The dispatch index makes a lookup independent of the number of functions in the module
+def bench_introspection(quick: bool) -> Dict[str, Any]:
+    iterations = 2_000 if quick else 20_000
+    results = {}
+    for functions in (10, 100, 1000):
+        module = _make_module(f"bench_module_{functions}", functions)
+        target = f"func_{functions - 1}"
+        introspection.introspect_run_with_args(module, target, ["str", "str"], ["a", "b"], "str")
+
+        started_at = time.perf_counter()
+        for _ in range(iterations):
+            introspection.introspect_run_with_args(module, target, ["str", "str"], ["a", "b"], "str")
+        elapsed = time.perf_counter() - started_at
+        results[f"functions_{functions}_us_per_call"] = round(elapsed / iterations * 1e6, 3)
+    return results
+
+
+# submit → completion latency and throughput on the thread pool
+# `concurrency` tasks are kept in flight at any time, completion is observed through the
+# executor's on_done hook rather than by polling get_task_status
+def bench_submit_to_completion(quick: bool) -> Dict[str, Any]:
+    module = _make_module("bench_tasks", 1)
+    tasks = 300 if quick else 3000
+    results = {}
+    for concurrency in (1, 8, 32):
+        latencies: List[float] = []
+        slots = threading.Semaphore(concurrency)
+        lock = threading.Lock()
+        finished = threading.Event()
+        remaining = [tasks]
+
+        def on_done(submitted_at: float):
+            with lock:
+                latencies.append(time.perf_counter() - submitted_at)
+                remaining[0] -= 1
+                if remaining[0] == 0:
+                    finished.set()
+            slots.release()
+
+        started_at = time.perf_counter()
+        for _ in range(tasks):
+            slots.acquire()
+            submitted_at = time.perf_counter()
+            exec_id = executor.queue_task()
+            executor.start_task(
+                exec_id, "func_0", ["a", "b"], ["str", "str"], "str",
+                entrypoint = module, on_done = lambda submitted_at = submitted_at: on_done(submitted_at)
+            )
+        finished.wait()
+        elapsed = time.perf_counter() - started_at
+
+        results[f"concurrency_{concurrency}_tasks_per_second"] = round(tasks / elapsed, 1)
+        results[f"concurrency_{concurrency}_p50_ms"] = round(_percentile(latencies, 0.5) * 1e3, 3)
+        results[f"concurrency_{concurrency}_p95_ms"] = round(_percentile(latencies, 0.95) * 1e3, 3)
+    return results
+
+
+# Overhead of TaskManager.execute_task: registry lookup, scheduling and task creation
+# execute_task returns once the task is scheduled, so only the submission path is measured;
+# the stand-in task returns immediately so the scheduled runs finish without piling up
+def bench_execute_task(quick: bool) -> Dict[str, Any]:
+    from app.warehouse.task_definitions import TASK_REGISTRY, TaskDefinition, TaskType, register_task
+    from app.warehouse.task_manager import TaskManager
+
+    module = _make_module("bench_manager_tasks", 1)
+    if "bench_func" not in TASK_REGISTRY:
+        register_task(
+            TaskDefinition(
+                name = "bench_func",
+                task_type = TaskType.LIGHTWEIGHT,
+                description = "Benchmark stand-in",
+                module = module,
+                func_name = "func_0",
+                cpu_units = 1,
+                memory_mb = 1,
+                return_type = str
+            )
+        )
+    manager = TaskManager()
+    calls = 500 if quick else 5000
+
+    async def run() -> List[float]:
+        samples = []
+        for _ in range(calls):
+            started_at = time.perf_counter()
+            await manager.execute_task("bench_func", ["a", "b"])
+            samples.append(time.perf_counter() - started_at)
+        return samples
+
+    samples = asyncio.run(run())
+    return {
+        "mean_us": round(statistics.fmean(samples) * 1e6, 3),
+        "p95_us": round(_percentile(samples, 0.95) * 1e6, 3),
+    }
+
+
+# get_task_status and log reads against large task logs
+# Status reads only the end of the log, so it must not slow down as the log grows
+def bench_task_status(quick: bool) -> Dict[str, Any]:
+    iterations = 500 if quick else 5000
+    results = {}
+    for size_mb in (1, 64):
+        exec_id = executor.queue_task()
+        executor.get_task_store().update(exec_id, status = "completed", result = "done")
+        line = b"x" * 99 + b"\n"
+        with open(log_path(exec_id), "wb") as f:
+            for _ in range(size_mb * 1024 * 1024 // len(line)):
+                f.write(line)
+
+        results[f"log_{size_mb}mb_status_us"] = _time_call(lambda: executor.get_task_status(exec_id), iterations)
+        results[f"log_{size_mb}mb_tail_100_lines_us"] = _time_call(
+            lambda: executor.read_task_log(exec_id, tail_lines = 100), iterations // 5
+        )
+        results[f"log_{size_mb}mb_range_64kb_us"] = _time_call(
+            lambda: executor.read_task_log(exec_id, offset = size_mb * 512 * 1024), iterations // 5
+        )
+    return results
+
+
+def _time_call(call: Callable[[], Any], iterations: int) -> float:
+    call()
+    started_at = time.perf_counter()
+    for _ in range(iterations):
+        call()
+    return round((time.perf_counter() - started_at) / iterations * 1e6, 3)
+
+
+BENCHMARKS: Dict[str, Callable[[bool], Dict[str, Any]]] = {
+    "introspection": bench_introspection,
+    "submit_to_completion": bench_submit_to_completion,
+    "execute_task": bench_execute_task,
+    "task_status": bench_task_status,
+}
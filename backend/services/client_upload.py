@@ -1,27 +1,229 @@
+import os
+import json
+import time
+import argparse
+import threading
 import requests
 import mimetypes
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from db.database import store_file_metadata, MONGO_URI
 
+API_URL = os.getenv("UPLOAD_API_URL", "http://localhost:8000")
+
+# Multipart uploads: parts are read and sent concurrently, so memory use is about
+# part_size * concurrency. The server raises the part size if a file would need more than 10000 parts.
+DEFAULT_PART_SIZE = int(os.getenv("UPLOAD_PART_SIZE", 16 * 1024 * 1024))
+DEFAULT_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", 4))
+PART_RETRIES = 3
+# Part URLs are signed in batches of this many as the upload progresses
+SIGN_BATCH_SIZE = 100
+
 def get_presigned_url(filename: str):
-    response = requests.get("http://localhost:8000/generatePresignedURL", params={"filename": filename})
-    return response.json()["upload_url"] 
+    response = requests.get(f"{API_URL}/generatePresignedURL", params={"filename": filename})
+    return response.json()["upload_url"]
 
 def upload_file_to_presigned_url(file_path: str):
     filename = file_path.split("/")[-1]
     upload_url = get_presigned_url(filename)
-    
+
     mime_type, _ = mimetypes.guess_type(file_path)
     mime_type = mime_type or "application/octet-stream"
-    
+
     with open(file_path, "rb") as f:
         response = requests.put(upload_url, data=f, headers={"Content-Type": mime_type})
-    
+
     if response.status_code == 200:
         print("Upload successful!")
         store_file_metadata(filename, mime_type, upload_url.split("?")[0])
-        print("File URL (MinIO):", upload_url.split("?")[0]) 
+        print("File URL (MinIO):", upload_url.split("?")[0])
     else:
         print("Upload failed with code:", response.status_code)
         print(response.text)
 
-upload_file_to_presigned_url("test.csv")
\ No newline at end of file
+# ------------------ Multipart Uploads -------------------
+# The state of an unfinished upload is kept next to the file, so running the upload again
+# after a failure only sends the parts MinIO doesn't have yet
+def _state_path(file_path: str) -> str:
+    return f"{file_path}.upload.json"
+
+def _load_state(file_path: str, size: int, part_size: int):
+    try:
+        with open(_state_path(file_path)) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # A changed file or part size can't reuse the parts uploaded so far
+    if state.get("size") != size or state.get("mtime") != os.path.getmtime(file_path) \
+            or state.get("requested_part_size") != part_size:
+        return None
+    return state
+
+def _save_state(file_path: str, state: dict):
+    with open(_state_path(file_path), "w") as f:
+        json.dump(state, f)
+
+def _uploaded_parts(state: dict) -> dict:
+    response = requests.get(
+        f"{API_URL}/uploads/multipart/{state['upload_id']}/parts",
+        params={"object_name": state["object_name"]}
+    )
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return {part["part_number"]: part for part in response.json()["parts"]}
+
+def _start_upload(file_path: str, filename: str, size: int, part_size: int, mime_type: str) -> dict:
+    response = requests.post(f"{API_URL}/uploads/multipart", json={
+        "filename": filename,
+        "size": size,
+        "part_size": part_size,
+        "content_type": mime_type
+    })
+    response.raise_for_status()
+    state = dict(response.json(), size=size, mtime=os.path.getmtime(file_path), requested_part_size=part_size)
+    _save_state(file_path, state)
+    return state
+
+class _PartUrls:
+    """Signs part URLs in batches the first time one of the batch is needed."""
+
+    def __init__(self, state: dict, part_numbers: list):
+        self.state = state
+        self.part_numbers = part_numbers
+        self.urls = {}
+        self.lock = threading.Lock()
+
+    def _sign(self, batch: list):
+        response = requests.post(
+            f"{API_URL}/uploads/multipart/{self.state['upload_id']}/parts",
+            json={"object_name": self.state["object_name"], "part_numbers": batch}
+        )
+        response.raise_for_status()
+        self.urls.update({int(number): url for number, url in response.json()["urls"].items()})
+
+    def get(self, part_number: int, refresh: bool = False) -> str:
+        with self.lock:
+            if refresh:
+                # The URLs still waiting were signed with the expired one, sign them again too
+                waiting = [number for number in self.urls if number != part_number]
+                self._sign([part_number] + waiting[:SIGN_BATCH_SIZE - 1])
+            elif part_number not in self.urls:
+                index = self.part_numbers.index(part_number)
+                self._sign(self.part_numbers[index:index + SIGN_BATCH_SIZE])
+            return self.urls.pop(part_number)
+
+# Connection errors and 5xx responses are retried with backoff. A 403 means the presigned URL
+# expired while the part waited, so the part is signed again. Other errors are raised right away.
+def _upload_part(file_path: str, state: dict, urls: _PartUrls, part_number: int) -> dict:
+    offset = (part_number - 1) * state["part_size"]
+    with open(file_path, "rb") as f:
+        f.seek(offset)
+        data = f.read(state["part_size"])
+    url = urls.get(part_number)
+    for attempt in range(1, PART_RETRIES + 1):
+        last_attempt = attempt == PART_RETRIES
+        try:
+            response = requests.put(url, data=data)
+        except (requests.ConnectionError, requests.Timeout):
+            if last_attempt:
+                raise
+            time.sleep(2 ** attempt)
+            continue
+        if response.status_code == 403 and not last_attempt:
+            url = urls.get(part_number, refresh=True)
+            continue
+        if response.status_code >= 500 and not last_attempt:
+            time.sleep(2 ** attempt)
+            continue
+        response.raise_for_status()
+        return {"part_number": part_number, "etag": response.headers["ETag"].strip('"'), "size": len(data)}
+
+# Upload a file in parts sent in parallel to presigned URLs
+# Parts already uploaded by an earlier, interrupted run are skipped. Returns the object's
+# URL and the throughput of this run.
+def upload_file_multipart(file_path: str, part_size: int = DEFAULT_PART_SIZE, concurrency: int = DEFAULT_CONCURRENCY,
+                          resume: bool = True) -> dict:
+    filename = file_path.split("/")[-1]
+    size = os.path.getsize(file_path)
+    mime_type, _ = mimetypes.guess_type(file_path)
+    mime_type = mime_type or "application/octet-stream"
+
+    state = _load_state(file_path, size, part_size) if resume else None
+    done = _uploaded_parts(state) if state else None
+    if done is None:
+        state = _start_upload(file_path, filename, size, part_size, mime_type)
+        done = {}
+    elif done:
+        print(f"Resuming upload {state['upload_id']}, {len(done)} of {state['part_count']} parts already uploaded")
+
+    pending = [number for number in range(1, state["part_count"] + 1) if number not in done]
+    urls = _PartUrls(state, pending)
+    uploaded_bytes = 0
+    started_at = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(_upload_part, file_path, state, urls, number) for number in pending]
+        for future in as_completed(futures):
+            part = future.result()
+            done[part["part_number"]] = part
+            uploaded_bytes += part["size"]
+            elapsed = time.monotonic() - started_at
+            print(
+                f"Part {part['part_number']} uploaded, {len(done)}/{state['part_count']} parts, "
+                f"{uploaded_bytes / max(elapsed, 1e-6) / 1024 / 1024:.1f} MiB/s"
+            )
+
+    response = requests.post(f"{API_URL}/uploads/multipart/{state['upload_id']}/complete", json={
+        "object_name": state["object_name"],
+        "parts": [{"part_number": number, "etag": part["etag"]} for number, part in sorted(done.items())]
+    })
+    response.raise_for_status()
+    os.remove(_state_path(file_path))
+
+    elapsed = time.monotonic() - started_at
+    result = dict(
+        response.json(),
+        parts=state["part_count"],
+        skipped_parts=state["part_count"] - len(pending),
+        uploaded_bytes=uploaded_bytes,
+        seconds=round(elapsed, 3),
+        mib_per_second=round(uploaded_bytes / max(elapsed, 1e-6) / 1024 / 1024, 2)
+    )
+    print(f"Upload successful! {uploaded_bytes} bytes in {elapsed:.1f}s ({result['mib_per_second']} MiB/s)")
+    store_file_metadata(filename, mime_type, result["url"])
+    print("File URL (MinIO):", result["url"])
+    return result
+
+# Abort an unfinished multipart upload and forget its state
+def abort_multipart_upload(file_path: str):
+    try:
+        with open(_state_path(file_path)) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return
+    requests.delete(
+        f"{API_URL}/uploads/multipart/{state['upload_id']}",
+        params={"object_name": state["object_name"]}
+    )
+    os.remove(_state_path(file_path))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upload a file to MinIO through the API's presigned URLs")
+    parser.add_argument("file_path")
+    parser.add_argument("--single", action="store_true", help="Upload in one request instead of in parts")
+    parser.add_argument("--part-size-mb", type=int, default=DEFAULT_PART_SIZE // (1024 * 1024))
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--no-resume", action="store_true", help="Start over instead of resuming an earlier upload")
+    parser.add_argument("--abort", action="store_true", help="Abort the unfinished upload of the file")
+    args = parser.parse_args()
+
+    if args.abort:
+        abort_multipart_upload(args.file_path)
+    elif args.single:
+        upload_file_to_presigned_url(args.file_path)
+    else:
+        upload_file_multipart(
+            args.file_path,
+            part_size=args.part_size_mb * 1024 * 1024,
+            concurrency=args.concurrency,
+            resume=not args.no_resume
+        )
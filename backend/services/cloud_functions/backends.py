@@ -0,0 +1,191 @@
+# Execution backends for the cloud function executor.
+# Each backend owns a bounded worker pool (threads for I/O-bound tasks, processes
+# for CPU-bound tasks) with a bounded submission queue in front of it, so a burst
+# of submissions waits in the queue instead of spawning an unbounded number of threads.
+
+import logging
+import queue
+import threading
+import time
+import multiprocessing
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Tuple
+from app.config.settings import get_executor_settings
+
+# Not app.config.logging.get_logger, which imports services.metrics and through it this module
+logger = logging.getLogger("app.services.executor")
+
+THREAD_POOL = "thread"
+PROCESS_POOL = "process"
+
+
+# Set by the process pool's initializer in each worker process. Code running there hands its
+# results and output back to the API process instead of keeping them in memory.
+_in_pool_worker = False
+
+
+def _mark_pool_worker() -> None:
+    global _in_pool_worker
+    _in_pool_worker = True
+
+
+def in_pool_worker() -> bool:
+    """True when running in a worker process of a process-pool backend"""
+    return _in_pool_worker
+
+
+class QueueFullError(RuntimeError):
+    """Raised when a backend's submission queue cannot accept more work."""
+
+
+class ExecutionBackend:
+    """
+    A bounded pool of workers fed by a bounded submission queue.
+
+    A dispatcher thread moves work from the queue into the pool only when a
+    worker slot is free, so the pool never holds more than `max_workers` tasks
+    and the queue depth is an accurate measure of waiting work.
+    """
+
+    def __init__(self, name: str, max_workers: int, queue_size: Optional[int] = None):
+        queue_size = queue_size or get_executor_settings().executor_queue_size
+        self.name = name
+        self.max_workers = max_workers
+        self._queue: "queue.Queue[Tuple[Callable, tuple, Callable]]" = queue.Queue(maxsize = queue_size)
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._pool: Executor = None
+        self._dispatcher: threading.Thread = None
+
+    def _create_pool(self) -> Executor:
+        raise NotImplementedError
+
+    def submit(self, fn: Callable, args: tuple, callback: Callable[[Future], None]) -> None:
+        """
+        Queue `fn(*args)` for execution. `callback` is called with the finished
+        future in the submitting process once the work is done.
+        """
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((fn, args, callback))
+        except queue.Full:
+            raise QueueFullError(f"The '{self.name}' execution queue is full, try again later.")
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait = wait)
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._dispatcher is not None:
+                return
+            self._pool = self._create_pool()
+            self._dispatcher = threading.Thread(
+                target = self._dispatch_loop,
+                name = f"{self.name}-dispatcher",
+                daemon = True
+            )
+            self._dispatcher.start()
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            fn, args, callback = self._queue.get()
+            # Block until a worker is free so the pool's own queue stays empty
+            self._slots.acquire()
+            with self._lock:
+                self._in_flight += 1
+                pool = self._pool
+            started_at = time.monotonic()
+            try:
+                try:
+                    future = pool.submit(fn, *args)
+                except BrokenProcessPool:
+                    pool = self._replace_pool(pool)
+                    future = pool.submit(fn, *args)
+            except Exception as e:
+                future = Future()
+                future.set_exception(e)
+            # When a worker picked the task up, for run time metrics
+            future.started_at = started_at
+            future.add_done_callback(lambda f, cb = callback, pool = pool: self._on_done(f, cb, pool))
+
+    def _replace_pool(self, broken: Executor) -> Executor:
+        # A worker process crashed or was killed, after which the pool refuses all work.
+        # Tasks still running on it fail, later ones go to a fresh pool.
+        with self._lock:
+            if self._pool is broken:
+                logger.warning(f"[{self.name}] A pool worker died, starting a new pool")
+                self._pool = self._create_pool()
+                broken.shutdown(wait = False)
+            return self._pool
+
+    def _on_done(self, future: Future, callback: Callable[[Future], None], pool: Executor) -> None:
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self._replace_pool(pool)
+        try:
+            callback(future)
+        except Exception:
+            logger.exception(f"[{self.name}] Task callback failed")
+
+
+class ThreadPoolBackend(ExecutionBackend):
+    """Thread pool backend for I/O-bound tasks."""
+
+    def _create_pool(self) -> Executor:
+        return ThreadPoolExecutor(max_workers = self.max_workers, thread_name_prefix = f"{self.name}-worker")
+
+
+class ProcessPoolBackend(ExecutionBackend):
+    """Process pool backend for CPU-bound tasks, one task per core without GIL contention."""
+
+    def _create_pool(self) -> Executor:
+        # Spawn rather than fork, the API process already runs threads
+        return ProcessPoolExecutor(
+            max_workers = self.max_workers,
+            mp_context = multiprocessing.get_context("spawn"),
+            initializer = _mark_pool_worker
+        )
+
+
+_BACKEND_FACTORIES: Dict[str, Callable[[], ExecutionBackend]] = {
+    # Pool sizes can be tuned per deployment, see ExecutorSettings
+    THREAD_POOL: lambda: ThreadPoolBackend(THREAD_POOL, get_executor_settings().executor_thread_workers),
+    PROCESS_POOL: lambda: ProcessPoolBackend(PROCESS_POOL, get_executor_settings().executor_process_workers),
+}
+_backends: Dict[str, ExecutionBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name: str = THREAD_POOL) -> ExecutionBackend:
+    """Get the shared backend for the given pool name, creating it on first use"""
+    if name not in _BACKEND_FACTORIES:
+        raise ValueError(f"Unknown execution pool '{name}'.")
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = _BACKEND_FACTORIES[name]()
+        return _backends[name]
+
+
+def get_backend_stats() -> Dict[str, Dict[str, Any]]:
+    """Queue depth and in-flight count of every started backend"""
+    with _backends_lock:
+        return {
+            name: {
+                "max_workers": backend.max_workers,
+                "queue_depth": backend.queue_depth(),
+                "in_flight": backend.in_flight(),
+            }
+            for name, backend in _backends.items()
+        }
@@ -1,102 +1,393 @@
-# This file consists of a simple task executor that runs functions in separate threads.
+# This file consists of a simple task executor that runs functions on a bounded worker pool.
 # It allows for asynchronous execution of functions with specified parameters and return types.
-# The results and logs of the execution are stored in a dictionary and log files respectively.
-
-import threading 
-import uuid 
-import os 
-import sys 
-from typing import Dict, Any 
-from contextlib import redirect_stdout, redirect_stderr
+# The results of the execution are stored in the task store, and their output is captured per
+# task by task_output (kept on the task state when it is short, in a log file otherwise).
+
+import asyncio
+import threading
+import multiprocessing
+import importlib
+import uuid
+import sys
+import time
+from concurrent.futures import Future
+from contextvars import ContextVar
+from typing import Dict, Any, AsyncIterator, Callable, Optional
 from services.cloud_functions.server import introspection, custprocess
+from services.cloud_functions.backends import THREAD_POOL, get_backend, in_pool_worker
+from services.cloud_functions.task_store import FINISHED_STATUSES, get_task_store
+from services.metrics import TASK_DURATION
+from services.cloud_functions.result_cache import MISS, get_result_cache, make_cache_key
+from services.cloud_functions.shared_buffers import (
+    MappedParams, get_shared_buffer_registry, handles_in, is_handle, share_result
+)
+from services.cloud_functions.task_output import (
+    close_output, current_output, discard_output, open_output, output_source, output_tail
+)
+
+# Upper bound on how much log a single ranged read returns
+MAX_LOG_READ_BYTES = 1024 * 1024
+DEFAULT_LOG_READ_BYTES = 64 * 1024
+
+# Bytes of the end of a task's output that get_task_status returns
+STATUS_OUTPUT_BYTES = 4096
+
+# Task store collection that keeps the execution IDs of each batch
+BATCH_STORE_COLLECTION = "task_batches"
 
-# Ensure the log directory exists
-LOG_DIRS = "logs"
-os.makedirs(LOG_DIRS, exist_ok = True)
+# Most tasks a single batch may hold
+MAX_BATCH_SIZE = 1000
 
-# Dictionary to store task information
-# Key: exec_id, Value: Dictionary with function details 
-tasks: Dict[str, Dict[str, Any]] = {} 
+# Execution ID of the task running in the current worker, used for progress reports
+current_exec_id: ContextVar[Optional[str]] = ContextVar("current_exec_id", default = None)
 
 # Function to handle task execution
-def run_task(entrypoint, func_name, param_values, param_types, return_type, exec_id):
-    """
-    Execute a function in a separate thread and log the output.
-    """
-    # Create a unique log file for this execution
-    log_file = os.path.join(LOG_DIRS, f"{exec_id}.log")
-    with open(log_file, "w") as f, redirect_stdout(f), redirect_stderr(f):
-        print(f"[Thread: {threading.current_thread().name}] Started task: {exec_id}") 
-        try: 
-            # Execute the function
-            result = introspection.introspect_run_with_args(
-                module = entrypoint,
-                func_name = func_name,
-                param_values = param_values,
-                param_types = param_types,
-                retrun_type = return_type
-            )
-
-            # Store the result in the tasks dictionary
-            tasks[exec_id]["status"] = "completed"
-            tasks[exec_id]["result"] = result
-        except Exception as e:
-            # Handle any exceptions that occur during execution
-            print(f"Error during execution: {e}")
-            tasks[exec_id]["status"] = "error"
-            tasks[exec_id]["error"] = str(e)
-
-# Function to submit a task for execution 
-# This function generates a unique execution ID and starts a new thread to run the task.
+# This runs inside a pool worker, which may be a separate process, so it only
+# receives picklable arguments and returns the result instead of touching the task store.
+def run_task(module_name, func_name, param_values, param_types, return_type, exec_id):
+    """
+    Execute a function on a pool worker and capture its output.
+    """
+    entrypoint = importlib.import_module(module_name)
+    pool_worker = in_pool_worker()
+    token = current_exec_id.set(exec_id)
+    # Output is routed to this task's buffer by context, other tasks on other threads are unaffected
+    # A process-pool worker can't keep output inline, the API process reads it from the log file
+    output_token = current_output.set(open_output(exec_id, inline = not pool_worker))
+    mapped = None
+
+    print(
+        f"[Process: {multiprocessing.current_process().name}, "
+        f"Thread: {threading.current_thread().name}] Started task: {exec_id}"
+    )
+    try:
+        # Shared buffer handles are mapped here, so large tables are not copied into the worker
+        mapped = MappedParams(param_values)
+        # Execute the function
+        result = introspection.introspect_run_with_args(
+            module = entrypoint,
+            func_name = func_name,
+            param_values = mapped.values,
+            param_types = param_types,
+            retrun_type = return_type
+        )
+        # A process-pool worker hands large tables back through shared memory instead of pickling them
+        if pool_worker:
+            result = share_result(result)
+        return result
+    except Exception as e:
+        # Log the error, the caller records it on the task
+        print(f"Error during execution: {e}")
+        raise
+    finally:
+        if mapped is not None:
+            mapped.close()
+        current_output.reset(output_token)
+        current_exec_id.reset(token)
+        # The API process can't see a worker process's buffer, its output goes to the log file
+        # before the result is returned. In the API process _complete_task finishes the output.
+        if pool_worker:
+            close_output(exec_id, persist = True)
+            discard_output(exec_id)
+
+# Function for running tasks to report their progress
+# The fields are merged into the task's `progress`, which get_task_status returns. Each field
+# is set on its own, so concurrent reports of a task (e.g. pipeline nodes) don't overwrite
+# each other. Outside of a task this does nothing. Reports from process-pool workers are only
+# visible to the API when the task store is shared (TASK_STORE_BACKEND=mongo).
+def report_progress(**fields):
+    """
+    Merge progress fields into the state of the currently running task.
+    """
+    exec_id = current_exec_id.get()
+    if exec_id is None:
+        return
+    get_task_store().merge(exec_id, "progress", fields)
+
+# Function to record the outcome of a finished task
+# Called in the API process once the pool worker has returned or raised.
+# Successful results of cacheable tasks are also stored in the result cache.
+# Short output of tasks that ran in this process is recorded with the outcome.
+def _complete_task(exec_id: str, future: Future, cache_key: Optional[str] = None, cache_ttl: Optional[int] = None,
+                   on_done: Optional[Callable[[], None]] = None, task_name: Optional[str] = None) -> None:
+    try:
+        output = close_output(exec_id)
+        error = future.exception()
+        started_at = getattr(future, "started_at", None)
+        if started_at is not None:
+            TASK_DURATION.labels(task_name, "completed" if error is None else "error").observe(time.monotonic() - started_at)
+        if error is None:
+            result = future.result()
+            shared = is_handle(result) or (isinstance(result, list) and bool(handles_in(result)))
+            if is_handle(result):
+                get_shared_buffer_registry().adopt(result)
+            # A shared buffer is released once nothing uses it, a cached handle would outlive it
+            if cache_key is not None and not shared:
+                get_result_cache().set(cache_key, result, cache_ttl)
+            get_task_store().update(exec_id, status = "completed", result = result, **output)
+        else:
+            get_task_store().update(exec_id, status = "error", error = str(error), **output)
+    finally:
+        # Only now, so the output stays readable until the task state has it
+        discard_output(exec_id)
+        if on_done is not None:
+            on_done()
+
+# Function to queue a task whose state has already been created on the selected pool
+# With a cache_ttl the task is treated as pure: a cached result for the same function and
+# arguments completes the task right away, otherwise the result is cached once it finishes.
+# on_done is called once the task has finished, whether it ran or was served from the cache.
+# Shared buffers passed in param_values are kept alive until the task has finished.
+def _dispatch(exec_id, func_name, param_values, param_types, return_type, entrypoint = custprocess,
+              pool = THREAD_POOL, cache_ttl = None, on_done = None, task_name = None):
+    handles = handles_in(param_values)
+    cache_key = None
+    # A handle says nothing about the buffer's contents, so such calls are never cached
+    if cache_ttl and not handles:
+        cache_key = make_cache_key(entrypoint.__name__, func_name, param_values)
+    if cache_key is not None:
+        result = get_result_cache().get(cache_key)
+        if result is not MISS:
+            get_task_store().update(exec_id, status = "completed", result = result, cached = True)
+            if on_done is not None:
+                on_done()
+            return
+
+    if handles:
+        registry = get_shared_buffer_registry()
+        registry.acquire(handles)
+        finished = on_done
+
+        def on_done():
+            registry.release(handles)
+            if finished is not None:
+                finished()
+
+    try:
+        get_backend(pool).submit(
+            run_task,
+            (
+                entrypoint.__name__,
+                func_name,
+                param_values,
+                param_types,
+                return_type,
+                exec_id
+            ),
+            lambda future: _complete_task(exec_id, future, cache_key, cache_ttl, on_done, task_name or func_name)
+        )
+    except Exception:
+        if handles:
+            registry.release(handles)
+        raise
+
+# Functions for callers that admit tasks themselves, such as the resource scheduler
+# queue_task creates the state of a task that is waiting to run, start_task runs it later.
+def queue_task(**fields) -> str:
+    """
+    Create a queued task and return its execution ID.
+    """
+    exec_id = str(uuid.uuid4())
+    get_task_store().create(exec_id, dict({"status": "queued", "result": None}, **fields))
+    return exec_id
+
+def start_task(exec_id, func_name, param_values, param_types, return_type, entrypoint = custprocess,
+               pool = THREAD_POOL, cache_ttl = None, on_done = None, task_name = None, **fields):
+    """
+    Mark a queued task as running and dispatch it to its pool.
+    """
+    get_task_store().update(exec_id, status = "running", **fields)
+    _dispatch(exec_id, func_name, param_values, param_types, return_type, entrypoint, pool, cache_ttl, on_done,
+              task_name)
+
+def fail_task(exec_id: str, error: str) -> None:
+    """
+    Record an error on a task that could not be started.
+    """
+    get_task_store().update(exec_id, status = "error", error = error)
+
+# Function to submit a task for execution
+# This function generates a unique execution ID and queues the task on the selected pool.
 # It returns the execution ID so that the client can check the status or result later.
-def submit_task(func_name, param_values, param_types, return_type):
+def submit_task(func_name, param_values, param_types, return_type, entrypoint = custprocess, pool = THREAD_POOL,
+                cache_ttl = None, task_name = None):
     """
     Submit a task for execution and return the execution ID.
+    Use pool = "thread" for I/O-bound tasks and pool = "process" for CPU-bound tasks.
+    Pass cache_ttl (seconds) for deterministic tasks to reuse results of identical calls.
     """
+    # Fail on an unknown pool before any state is created
+    get_backend(pool)
+    task_store = get_task_store()
+
     # Generate a unique execution ID
     exec_id = str(uuid.uuid4())
 
-    tasks[exec_id] = {
+    task_store.create(exec_id, {
         "status": "running",
         "result": None,
-    }
+    })
 
-    thread = threading.Thread(
-        target = run_task,
-        args = (
-            custprocess, 
-            func_name, 
-            param_values, 
-            param_types, 
-            return_type, 
-            exec_id
-        )
-    ) 
-    thread.start()
-    return exec_id 
+    try:
+        _dispatch(exec_id, func_name, param_values, param_types, return_type, entrypoint, pool, cache_ttl,
+                  task_name = task_name)
+    except Exception:
+        task_store.delete(exec_id)
+        raise
+    return exec_id
+
+# Function to create the task states of a batch without running anything yet
+def queue_batch(count: int, status: str = "queued") -> Dict[str, Any]:
+    """
+    Create `count` tasks belonging to a new batch and return the batch ID and execution IDs.
+    """
+    task_store = get_task_store()
+    # A batch larger than the store would evict its own tasks
+    if task_store.max_entries is not None and count > task_store.max_entries:
+        raise ValueError(f"A batch of {count} tasks doesn't fit in the task store ({task_store.max_entries} tasks).")
+    batch_id = str(uuid.uuid4())
+    exec_ids = [str(uuid.uuid4()) for _ in range(count)]
+
+    task_store.create_many({
+        exec_id: {"status": status, "result": None, "batch_id": batch_id}
+        for exec_id in exec_ids
+    })
+    get_task_store(BATCH_STORE_COLLECTION).create(batch_id, {"exec_ids": exec_ids})
+    return {"batch_id": batch_id, "exec_ids": exec_ids}
+
+# Function to get the aggregated status of a batch
+def get_batch_status(batch_id: str):
+    """
+    Get the status of every task in a batch, with counts per status.
+    """
+    batch = get_task_store(BATCH_STORE_COLLECTION).get(batch_id)
+    if not batch:
+        return {"status": "not found"}
+
+    states = get_task_store().get_many(batch["exec_ids"])
+    items = []
+    counts: Dict[str, int] = {}
+    for exec_id in batch["exec_ids"]:
+        state = states.get(exec_id, {"status": "expired"})
+        counts[state["status"]] = counts.get(state["status"], 0) + 1
+        items.append({
+            "exec_id": exec_id,
+            "status": state["status"],
+            "result": state.get("result"),
+            "error": state.get("error")
+        })
+
+    finished = all(item["status"] not in ("queued", "running") for item in items)
+    return {
+        "batch_id": batch_id,
+        "status": "completed" if finished else "running",
+        "total": len(items),
+        "counts": counts,
+        "items": items
+    }
 
 # Function to get the status of a task by its execution ID
-# This function checks if the task exists and returns its status, result, error message, and log output.
+# This function checks if the task exists and returns its status, result, error message, the
+# end of its output and the current size of its output, from which read_task_log picks up.
 # If the task does not exist, it returns a "not found" status.
 def get_task_status(exec_id):
     """
     Get the status of a task by its execution ID.
     """
     # Check if the task exists
-    task = tasks.get(exec_id)
+    task = get_task_store().get(exec_id)
     if not task:
         return {"status": "not found"}
-    
-    # Read the log file for this execution
-    log_path = os.path.join(LOG_DIRS, f"{exec_id}.log") 
-    log = "" 
-    if os.path.exists(log_path):
-        with open(log_path, "r") as f:
-            log = f.read() 
+
+    output, size = output_tail(exec_id, task, STATUS_OUTPUT_BYTES)
 
     return {
         "status": task["status"],
         "result": task.get("result"),
         "error": task.get("error"),
-        "log": log 
-    }
\ No newline at end of file
+        "progress": task.get("progress"),
+        "cached": task.get("cached", False),
+        "wait_seconds": task.get("wait_seconds"),
+        "output": output.decode("utf-8", errors = "replace"),
+        "log_offset": size
+    }
+
+# Function to get the result cache counters
+def get_result_cache_stats():
+    """
+    Get the hit, miss and eviction counters of the task result cache.
+    """
+    return get_result_cache().stats()
+
+# Function to read part of a task's log
+# Either a byte range starting at `offset`, or the last `tail_lines` lines of the log.
+# The returned `next_offset` is where the next read should start to pick up new output.
+def read_task_log(exec_id: str, offset: int = 0, length: int = DEFAULT_LOG_READ_BYTES, tail_lines: Optional[int] = None):
+    """
+    Read a byte range or the last lines of a task's log.
+    """
+    task = get_task_store().get(exec_id)
+    if task is None:
+        return None
+
+    length = min(length, MAX_LOG_READ_BYTES)
+    with output_source(exec_id, task) as source:
+        size = source.size
+        if tail_lines is not None:
+            offset = _tail_offset(source, size, tail_lines, length)
+            length = size - offset
+        offset = min(offset, size)
+        data = source.read(offset, length)
+
+    return {
+        "offset": offset,
+        "next_offset": offset + len(data),
+        "size": size,
+        "data": data.decode("utf-8", errors = "replace")
+    }
+
+def _tail_offset(source, size: int, lines: int, max_bytes: int, block_size: int = 8192) -> int:
+    # Scan backwards block by block until enough newlines are found, never
+    # reaching further back than max_bytes from the end of the output
+    limit = max(0, size - max_bytes)
+    position = size
+    newlines = 0
+    # A trailing newline terminates the last line rather than starting a new one
+    if size > 0 and source.read(size - 1, 1) == b"\n":
+        newlines = -1
+    while position > limit:
+        read_size = min(block_size, position - limit)
+        position -= read_size
+        block = source.read(position, read_size)
+        end = len(block)
+        while True:
+            index = block.rfind(b"\n", 0, end)
+            if index < 0:
+                break
+            newlines += 1
+            if newlines == lines:
+                return position + index + 1
+            end = index
+    return limit
+
+# Function to follow a task's log as it is written
+# Yields new chunks of the log until the task has finished and all output has been sent.
+async def follow_task_log(exec_id: str, offset: int = 0, poll_interval: float = 0.5) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield new log output of a task as it is written.
+    """
+    # Store lookups and file reads are blocking, run them on a worker thread
+    while True:
+        task = await asyncio.to_thread(get_task_store().get, exec_id)
+        if task is None:
+            return
+        chunk = await asyncio.to_thread(read_task_log, exec_id, offset = offset)
+        if chunk is None:
+            return
+        if chunk["data"]:
+            offset = chunk["next_offset"]
+            yield chunk
+            continue
+        if task["status"] in FINISHED_STATUSES:
+            return
+        await asyncio.sleep(poll_interval)
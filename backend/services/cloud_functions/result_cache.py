@@ -0,0 +1,206 @@
+# Result cache for deterministic tasks.
+# Tasks marked cacheable are keyed on their function and arguments; a repeat invocation
+# within the TTL is answered from the cache instead of running the function again.
+# The in-process cache is an LRU bounded by a byte budget, optionally backed by MongoDB
+# so cached results survive restarts and are shared by every API worker.
+
+import hashlib
+import json
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+from app.config.settings import get_result_cache_settings
+from services.metrics import RESULT_CACHE_EVICTIONS, RESULT_CACHE_HITS, RESULT_CACHE_MISSES
+
+# Marker for a cache miss, a cached result may itself be None
+MISS = object()
+
+# Prometheus counters that mirror each cache's own counters
+_PROMETHEUS_COUNTERS = {"hits": RESULT_CACHE_HITS, "misses": RESULT_CACHE_MISSES, "evictions": RESULT_CACHE_EVICTIONS}
+
+
+def make_cache_key(module_name: str, func_name: str, param_values: List[Any]) -> Optional[str]:
+    """Key of an invocation, or None when the arguments can't be serialized deterministically"""
+    try:
+        payload = json.dumps([module_name, func_name, param_values], sort_keys = True)
+    except (TypeError, ValueError):
+        return None
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """Interface for task result caches, with hit/miss/eviction counters."""
+
+    # Value of the "cache" label of the exported counters
+    tier = "cache"
+
+    def __init__(self):
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0}
+        self._counters_lock = threading.Lock()
+        self._metrics = {name: counter.labels(self.tier) for name, counter in _PROMETHEUS_COUNTERS.items()}
+
+    def get(self, key: str) -> Any:
+        """Get a cached result, or MISS"""
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl_seconds: int) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, Any]:
+        with self._counters_lock:
+            return dict(self._counters)
+
+    def _count(self, counter: str, amount: int = 1) -> None:
+        with self._counters_lock:
+            self._counters[counter] += amount
+        self._metrics[counter].inc(amount)
+
+
+class InMemoryResultCache(ResultCache):
+    """LRU cache bounded by the pickled size of its entries."""
+
+    tier = "memory"
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        super().__init__()
+        self.max_bytes = max_bytes or get_result_cache_settings().result_cache_max_bytes
+        self._entries: "OrderedDict[str, Tuple[Any, int, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self._count("misses")
+                return MISS
+            self._entries.move_to_end(key)
+        self._count("hits")
+        return entry[0]
+
+    def set(self, key: str, value: Any, ttl_seconds: int) -> None:
+        try:
+            size = len(pickle.dumps(value, protocol = pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            return
+        if size > self.max_bytes:
+            return
+
+        evicted = 0
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, size, time.monotonic() + ttl_seconds)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                evicted += 1
+        if evicted:
+            self._count("evictions", evicted)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        with self._lock:
+            stats.update(entries = len(self._entries), bytes = self._bytes, max_bytes = self.max_bytes)
+        return stats
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+
+class MongoResultCache(ResultCache):
+    """
+    Cache backed by a MongoDB collection with a TTL index, shared by every API worker.
+    Results BSON can't encode are simply not cached here.
+    """
+
+    tier = "mongo"
+
+    def __init__(self, collection):
+        super().__init__()
+        self.collection = collection
+        self.collection.create_index("expires_at", expireAfterSeconds = 0)
+
+    def get(self, key: str) -> Any:
+        return self.get_with_ttl(key)[0]
+
+    def get_with_ttl(self, key: str) -> Tuple[Any, Optional[float]]:
+        """Get a cached result and the seconds until it expires, or (MISS, None)"""
+        now = datetime.now(timezone.utc)
+        document = self.collection.find_one(
+            {"_id": key, "expires_at": {"$gt": now}},
+            {"value": 1, "expires_at": 1}
+        )
+        if document is None:
+            self._count("misses")
+            return MISS, None
+        self._count("hits")
+        expires_at = document["expires_at"].replace(tzinfo = timezone.utc)
+        return document["value"], (expires_at - now).total_seconds()
+
+    def set(self, key: str, value: Any, ttl_seconds: int) -> None:
+        from bson.errors import InvalidDocument
+
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds = ttl_seconds)
+        try:
+            self.collection.replace_one(
+                {"_id": key},
+                {"_id": key, "value": value, "expires_at": expires_at},
+                upsert = True
+            )
+        except InvalidDocument:
+            pass
+
+
+class TieredResultCache(ResultCache):
+    """In-process LRU in front of the shared MongoDB cache."""
+
+    tier = "tiered"
+
+    def __init__(self, local: InMemoryResultCache, shared: MongoResultCache):
+        super().__init__()
+        self.local = local
+        self.shared = shared
+
+    def get(self, key: str) -> Any:
+        value = self.local.get(key)
+        if value is MISS:
+            # Keep the shared entry's expiry for the local copy
+            value, ttl = self.shared.get_with_ttl(key)
+            if value is not MISS and ttl and ttl > 0:
+                self.local.set(key, value, ttl)
+        self._count("misses" if value is MISS else "hits")
+        return value
+
+    def set(self, key: str, value: Any, ttl_seconds: int) -> None:
+        self.local.set(key, value, ttl_seconds)
+        self.shared.set(key, value, ttl_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats.update(local = self.local.stats(), shared = self.shared.stats())
+        return stats
+
+
+@lru_cache()
+def get_result_cache() -> ResultCache:
+    """Get the result cache selected by RESULT_CACHE_BACKEND ("memory" or "mongo")"""
+    settings = get_result_cache_settings()
+    if settings.result_cache_backend == "memory":
+        return InMemoryResultCache()
+    if settings.result_cache_backend == "mongo":
+        # Reuse the application's MongoDB client instead of opening another one
+        from app.db.database import get_db
+        return TieredResultCache(
+            InMemoryResultCache(), MongoResultCache(get_db()[settings.result_cache_collection])
+        )
+    raise ValueError(f"Unknown result cache backend '{settings.result_cache_backend}'.")
@@ -1,5 +1,7 @@
 import inspect
-from typing import Any, Callable, Dict, List, Optional
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 """
 Note - Keep in mind that the callable object that we find becomes
@@ -8,6 +10,8 @@ reason why this shouldn't work but it doesn't.
 
 """
 
+logger = logging.getLogger(__name__)
+
 
 def get_param_type(param: Any) -> str:
     """Get the type of the parameter as a string
@@ -21,16 +25,129 @@ def get_param_type(param: Any) -> str:
     return type(param).__name__
 
 
-def _extract_type_string(param_type: inspect.Parameter) -> str:
-    """Extract the type from the string "<class 'type'>"
+def _extract_type_string(param_type: Any) -> str:
+    """Get the name of an annotation: "str" for builtins, "module.Name" for other classes
 
     Args:
-        string (str): The string to extract the type from
+        param_type (Any): The annotation, a class, None or a typing construct such as Optional[str]
 
     Returns:
         str: The type as a string
     """
-    return str(param_type).split()[1][1:-2]
+    if param_type is None or param_type is type(None):
+        return "None"
+    if isinstance(param_type, type):
+        if param_type.__module__ == "builtins":
+            return param_type.__qualname__
+        return f"{param_type.__module__}.{param_type.__qualname__}"
+    # typing generics and string annotations, e.g. "typing.Optional[str]"
+    return str(param_type)
+
+
+class FunctionEntry:
+    """A compiled dispatch entry for one function of a module
+
+    Args:
+        func (Callable): The function reference
+        param_types (Tuple[str, ...]): The parameter types as strings
+        return_type (str): The return type as a string
+    """
+
+    __slots__ = ("func", "param_types", "return_type")
+
+    def __init__(self, func: Callable, param_types: Tuple[str, ...], return_type: str):
+        self.func = func
+        self.param_types = param_types
+        self.return_type = return_type
+
+
+class DispatchIndex:
+    """Name to function lookup table for a module, built once per module
+
+    Args:
+        module (object): The module to index
+    """
+
+    def __init__(self, module: object):
+        self.module = module
+        self.entries: Dict[str, FunctionEntry] = {}
+        self.build()
+
+    def build(self) -> None:
+        """(Re)build the index from the functions defined in the module, not the ones it imports"""
+        entries = {}
+        for name, obj in inspect.getmembers(self.module, self._is_own_function):
+            signature = inspect.signature(obj)
+            entries[name] = FunctionEntry(
+                func=obj,
+                param_types=tuple(
+                    _extract_type_string(param_signature.annotation)
+                    for param_signature in signature.parameters.values()
+                ),
+                return_type=_extract_type_string(signature.return_annotation),
+            )
+        self.entries = entries
+        logger.debug("Indexed %d functions of %s", len(entries), getattr(self.module, "__name__", self.module))
+
+    def _is_own_function(self, obj: Any) -> bool:
+        return inspect.isfunction(obj) and obj.__module__ == self.module.__name__
+
+    def lookup(self, func_name: str) -> Optional[FunctionEntry]:
+        """Get the entry for a function, rebuilding the index if the module was reloaded
+
+        Args:
+            func_name (str): The name of the function
+
+        Returns:
+            Optional[FunctionEntry]: The entry, or None if the module has no such function
+        """
+        current = getattr(self.module, func_name, None)
+        entry = self.entries.get(func_name)
+        if entry is not None and entry.func is current:
+            return entry
+
+        # A reload rebinds the module attributes to new function objects
+        if entry is not None or self._is_own_function(current):
+            self.build()
+            return self.entries.get(func_name)
+        return None
+
+
+_DISPATCH_INDEXES: Dict[str, DispatchIndex] = {}
+_dispatch_lock = threading.Lock()
+
+
+def get_dispatch_index(module: object) -> DispatchIndex:
+    """Get the dispatch index of the module, building it on first use
+
+    Args:
+        module (object): The module to index
+
+    Returns:
+        DispatchIndex: The dispatch index of the module
+    """
+    key = module.__name__
+    index = _DISPATCH_INDEXES.get(key)
+    if index is None or index.module is not module:
+        with _dispatch_lock:
+            index = _DISPATCH_INDEXES.get(key)
+            if index is None or index.module is not module:
+                index = DispatchIndex(module)
+                _DISPATCH_INDEXES[key] = index
+    return index
+
+
+def invalidate_dispatch_index(module: Optional[object] = None) -> None:
+    """Drop the dispatch index of a module, or of every module if none is given
+
+    Args:
+        module (Optional[object]): The module whose index should be dropped
+    """
+    with _dispatch_lock:
+        if module is None:
+            _DISPATCH_INDEXES.clear()
+        else:
+            _DISPATCH_INDEXES.pop(module.__name__, None)
 
 
 def introspect_run_with_args(
@@ -40,7 +157,7 @@ def introspect_run_with_args(
     param_values: List[Any],
     retrun_type: str,
 ) -> Optional[Dict[str, Any]]:
-    """Introspect the module and run the function reference
+    """Look up the function in the module's dispatch index and run it
 
     Args:
         module (object): The module to introspect
@@ -49,37 +166,14 @@ def introspect_run_with_args(
         retrun_type (str): The return type of the function
 
     Returns:
-        Optional[object]: The function reference
+        Optional[object]: The result of the function, None if no function matches
     """
-    for name, obj in inspect.getmembers(module):
-        print(f"Name: {name}, Object: {obj}")
-        if inspect.isfunction(obj):
-            # print(inspect.isfunction(obj))
-            signature = inspect.signature(obj)
-            parameters = [
-                _extract_type_string(param_signature.annotation)
-                for _, param_signature in signature.parameters.items()
-            ]
-
-            # Converting the object <class return_type> into string
-            return_type = signature.return_annotation
-
-            # Extracting the 'return_type' from the converted string "<class 'return_type'>"
-            return_type = _extract_type_string(return_type)
-
-            print(f"Name: {name}, Parameters: {parameters}, Return Type: {retrun_type}")
-
-            # If the function name is the same as the func_name, Run the function reference
-            if name != func_name:
-                continue
-            if parameters != param_types:
-                continue
-            if retrun_type != retrun_type:
-                continue
-            result = obj(*param_values)
-
-            return result
-    return None
+    entry = get_dispatch_index(module).lookup(func_name)
+    if entry is None:
+        return None
+    if entry.param_types != tuple(param_types):
+        return None
+    return entry.func(*param_values)
 
 
 def introspect_run(module: object, func_name: str) -> None:
@@ -0,0 +1,277 @@
+# Shared-memory buffers for large task inputs and outputs.
+# Instead of pickling a large table into a pool worker, the caller writes it once into a
+# shared memory segment as an Arrow IPC stream and passes a small handle in param_values.
+# The worker maps the segment and reads the table without copying it. Large Arrow results
+# of process-pool workers come back the same way.
+#
+# The executor owns the segments: an input segment is freed once the last task using it has
+# finished, and a result segment is freed once the consumer releases it. Segments nobody
+# claims are freed after SHARED_BUFFER_TTL_SECONDS.
+
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Any, Dict, Iterator, List, Optional
+from app.config.settings import get_shared_buffer_settings
+
+ARROW_FORMAT = "arrow"
+BYTES_FORMAT = "bytes"
+
+# Parameter type names that a resolved handle matches in a function signature
+_TYPE_NAMES = {ARROW_FORMAT: "pyarrow.lib.Table", BYTES_FORMAT: "memoryview"}
+
+
+class SharedBufferHandle(dict):
+    """
+    Reference to a shared memory segment. A dict so it can be stored in the task store
+    and returned by the API as is.
+    """
+
+    def __init__(self, name: str, size: int, format: str):
+        super().__init__(shared_buffer = name, size = size, format = format)
+
+    @property
+    def name(self) -> str:
+        return self["shared_buffer"]
+
+    @property
+    def type_name(self) -> str:
+        return _TYPE_NAMES[self["format"]]
+
+
+def is_handle(value: Any) -> bool:
+    return isinstance(value, dict) and "shared_buffer" in value and "format" in value
+
+
+def _as_handle(value: Dict[str, Any]) -> SharedBufferHandle:
+    return SharedBufferHandle(value["shared_buffer"], value["size"], value["format"])
+
+
+def _arrow_table(data: Any):
+    import pyarrow as pa
+
+    if isinstance(data, pa.Table):
+        return data
+    # Anything else is expected to be a pandas DataFrame
+    return pa.Table.from_pandas(data, preserve_index = False)
+
+
+def _write_segment(data: Any, format: str) -> SharedBufferHandle:
+    # Create a segment holding the Arrow IPC stream of a table, or raw bytes
+    name = f"task-{uuid.uuid4().hex[:24]}"
+    if format == ARROW_FORMAT:
+        import pyarrow as pa
+
+        table = _arrow_table(data)
+        # Measure the stream first so it is written straight into the segment
+        sink = pa.MockOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        size = sink.size()
+        segment = shared_memory.SharedMemory(name = name, create = True, size = max(size, 1))
+        try:
+            stream = pa.FixedSizeBufferWriter(pa.py_buffer(segment.buf))
+            with pa.ipc.new_stream(stream, table.schema) as writer:
+                writer.write_table(table)
+            stream.close()
+            del stream, writer
+        except Exception:
+            segment.close()
+            segment.unlink()
+            raise
+    else:
+        data = memoryview(data).cast("B")
+        size = data.nbytes
+        segment = shared_memory.SharedMemory(name = name, create = True, size = max(size, 1))
+        segment.buf[:size] = data
+    segment.close()
+    return SharedBufferHandle(name, size, format)
+
+
+class SharedBufferRegistry:
+    """Tracks the segments owned by this process and frees them when they are no longer used."""
+
+    def __init__(self, ttl_seconds: Optional[int] = None):
+        self.ttl_seconds = ttl_seconds or get_shared_buffer_settings().shared_buffer_ttl_seconds
+        self._buffers: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def create(self, data: Any, format: str) -> SharedBufferHandle:
+        handle = _write_segment(data, format)
+        self.adopt(handle)
+        return handle
+
+    def adopt(self, handle: Dict[str, Any]) -> None:
+        """Take ownership of a segment, e.g. one a worker created for its result"""
+        self.sweep()
+        with self._lock:
+            self._buffers[handle["shared_buffer"]] = {"refs": 0, "expires_at": time.monotonic() + self.ttl_seconds}
+
+    def acquire(self, handles: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            for handle in handles:
+                entry = self._buffers.get(handle["shared_buffer"])
+                if entry is None:
+                    raise ValueError(f"Shared buffer '{handle['shared_buffer']}' does not exist or was released.")
+                entry["refs"] += 1
+                entry["expires_at"] = None
+
+    def release(self, handles: List[Dict[str, Any]]) -> None:
+        freed = []
+        with self._lock:
+            for handle in handles:
+                entry = self._buffers.get(handle["shared_buffer"])
+                if entry is None:
+                    continue
+                entry["refs"] = max(0, entry["refs"] - 1)
+                if entry["refs"] == 0:
+                    del self._buffers[handle["shared_buffer"]]
+                    freed.append(handle["shared_buffer"])
+        for name in freed:
+            _unlink(name)
+
+    def sweep(self) -> None:
+        """Free unclaimed segments whose TTL has passed"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [
+                name for name, entry in self._buffers.items()
+                if entry["refs"] == 0 and entry["expires_at"] is not None and entry["expires_at"] <= now
+            ]
+            for name in expired:
+                del self._buffers[name]
+        for name in expired:
+            _unlink(name)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"buffers": len(self._buffers)}
+
+
+def _unlink(name: str) -> None:
+    try:
+        segment = shared_memory.SharedMemory(name = name)
+    except FileNotFoundError:
+        return
+    segment.close()
+    segment.unlink()
+
+
+_registry = SharedBufferRegistry()
+
+
+def get_shared_buffer_registry() -> SharedBufferRegistry:
+    return _registry
+
+
+# Functions for callers that submit tasks with large inputs
+def share_table(data: Any) -> SharedBufferHandle:
+    """
+    Write a pyarrow Table or pandas DataFrame to shared memory and return its handle.
+    Pass the handle in param_values, the worker receives a pyarrow Table. The segment is
+    freed once the tasks it was passed to have finished.
+    """
+    return _registry.create(data, ARROW_FORMAT)
+
+
+def share_bytes(data: Any) -> SharedBufferHandle:
+    """Write bytes to shared memory, the worker receives a read-only memoryview."""
+    return _registry.create(data, BYTES_FORMAT)
+
+
+@contextmanager
+def keep_shared(handle: SharedBufferHandle) -> Iterator[SharedBufferHandle]:
+    """Keep a segment alive across several task submissions, e.g. tasks run one after another"""
+    _registry.acquire([handle])
+    try:
+        yield handle
+    finally:
+        _registry.release([handle])
+
+
+def read_table(handle: Dict[str, Any]):
+    """Read an Arrow segment as a pyarrow Table (a copy, so it stays valid after release)"""
+    import pyarrow as pa
+
+    segment = shared_memory.SharedMemory(name = handle["shared_buffer"])
+    try:
+        data = bytes(segment.buf[:handle["size"]])
+    finally:
+        _close(segment)
+    return pa.ipc.open_stream(data).read_all()
+
+
+def release_buffer(handle: Dict[str, Any]) -> None:
+    """Free a result segment once it has been read"""
+    _registry.release([handle])
+
+
+@contextmanager
+def open_buffer(handle: Dict[str, Any]) -> Iterator[Any]:
+    """Map a segment and yield its contents without copying them"""
+    segment = shared_memory.SharedMemory(name = handle["shared_buffer"])
+    value = None
+    try:
+        value = _map(segment, _as_handle(handle))
+        yield value
+    finally:
+        del value
+        _close(segment)
+
+
+def _map(segment: shared_memory.SharedMemory, handle: SharedBufferHandle) -> Any:
+    view = segment.buf[:handle["size"]]
+    if handle["format"] == ARROW_FORMAT:
+        import pyarrow as pa
+
+        return pa.ipc.open_stream(pa.py_buffer(view)).read_all()
+    return view.toreadonly()
+
+
+def _close(segment: shared_memory.SharedMemory) -> None:
+    try:
+        segment.close()
+    except BufferError:
+        # Something still references the mapping, it is closed when that goes away
+        pass
+
+
+# Functions used by the executor's workers
+def handles_in(param_values: List[Any]) -> List[SharedBufferHandle]:
+    return [_as_handle(value) for value in param_values if is_handle(value)]
+
+
+def restore_handles(param_values: List[Any]) -> List[Any]:
+    """Turn handles that arrived as plain dicts, e.g. in a JSON request, back into SharedBufferHandles"""
+    return [_as_handle(value) if is_handle(value) else value for value in param_values]
+
+
+class MappedParams:
+    """Replaces handles in param_values by the mapped contents for the duration of a task."""
+
+    def __init__(self, param_values: List[Any]):
+        self._segments: List[shared_memory.SharedMemory] = []
+        self.values = []
+        for value in param_values:
+            if is_handle(value):
+                segment = shared_memory.SharedMemory(name = value["shared_buffer"])
+                self._segments.append(segment)
+                value = _map(segment, _as_handle(value))
+            self.values.append(value)
+
+    def close(self) -> None:
+        self.values = []
+        for segment in self._segments:
+            _close(segment)
+        self._segments = []
+
+
+def share_result(result: Any) -> Any:
+    """Return large Arrow results through shared memory, anything else unchanged"""
+    import pyarrow as pa
+
+    if isinstance(result, pa.Table) and result.nbytes >= get_shared_buffer_settings().shared_buffer_min_result_bytes:
+        return _write_segment(result, ARROW_FORMAT)
+    return result
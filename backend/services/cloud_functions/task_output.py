@@ -0,0 +1,297 @@
+# Per-task output capture.
+# print() and other writes to sys.stdout and sys.stderr made by a task go to that task's own
+# buffer, chosen by the task context (a ContextVar) rather than by swapping the process-wide
+# streams, so tasks running concurrently on different threads never see each other's output.
+# Writes outside of a task go to the original streams.
+#
+# Each buffer is a ring of the last task_output_buffer_bytes of output (see TaskOutputSettings).
+# Output that grows past task_output_inline_bytes is appended to the task's log file by a
+# background flusher, and synchronously before unflushed output would be overwritten. When a
+# task finishes, output that never outgrew the inline size is stored on the task state instead
+# of in a file, so short tasks don't create log files at all. Tasks running in process-pool
+# workers always write their output to the log file, the API process can't see their buffers.
+
+import io
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional, Tuple
+from app.config.settings import get_task_output_settings
+
+LOG_DIRS = "logs"
+os.makedirs(LOG_DIRS, exist_ok = True)
+
+
+def log_path(exec_id: str) -> str:
+    return os.path.join(LOG_DIRS, f"{exec_id}.log")
+
+
+class OutputBuffer:
+    """
+    Output of one task: the last `capacity` bytes in memory, everything before that in the
+    task's log file. Offsets are byte offsets from the start of the task's output.
+    """
+
+    def __init__(self, exec_id: str, capacity: Optional[int] = None, inline_bytes: Optional[int] = None):
+        settings = get_task_output_settings()
+        if capacity is None:
+            capacity = settings.task_output_buffer_bytes
+        if inline_bytes is None:
+            inline_bytes = settings.task_output_inline_bytes
+        self.exec_id = exec_id
+        self.capacity = max(1, capacity)
+        self.inline_bytes = min(inline_bytes, self.capacity)
+        self.size = 0
+        self.flushed = 0
+        self._data = bytearray()
+        self._file = None
+        self._lock = threading.Lock()
+
+    @property
+    def spilled(self) -> bool:
+        return self._file is not None
+
+    def write(self, data: bytes) -> None:
+        with self._lock:
+            view = memoryview(data)
+            while view:
+                # Never overwrite output that hasn't reached the log file yet
+                room = self.capacity - (self.size - self.flushed)
+                if room == 0:
+                    self._flush()
+                    continue
+                self._put(view[:room])
+                view = view[room:]
+
+    def _put(self, chunk: memoryview) -> None:
+        # The ring grows up to its capacity, so short outputs only take the memory they need
+        if len(self._data) < self.capacity:
+            grow = min(len(chunk), self.capacity - len(self._data))
+            self._data += chunk[:grow]
+            self.size += grow
+            chunk = chunk[grow:]
+        while chunk:
+            position = self.size % self.capacity
+            count = min(len(chunk), self.capacity - position)
+            self._data[position:position + count] = chunk[:count]
+            self.size += count
+            chunk = chunk[count:]
+
+    def _slice(self, start: int, end: int) -> bytes:
+        # Bytes [start, end) of the output, all of which are still in the ring
+        parts = []
+        while start < end:
+            position = start % self.capacity
+            count = min(end - start, self.capacity - position)
+            parts.append(bytes(self._data[position:position + count]))
+            start += count
+        return b"".join(parts)
+
+    def _flush(self) -> None:
+        if self.flushed == self.size:
+            return
+        if self._file is None:
+            self._file = open(log_path(self.exec_id), "ab")
+        self._file.write(self._slice(self.flushed, self.size))
+        self._file.flush()
+        self.flushed = self.size
+
+    def flush(self, force: bool = False) -> None:
+        """Append unflushed output to the log file once the output has outgrown the inline size"""
+        with self._lock:
+            if force or self.spilled or self.size > self.inline_bytes:
+                self._flush()
+
+    def read(self, offset: int, length: int) -> bytes:
+        with self._lock:
+            end = min(self.size, offset + length)
+            ring_start = self.size - len(self._data)
+            if offset >= ring_start:
+                return self._slice(offset, end) if offset < end else b""
+            # Older output has been flushed, which always covers everything before the ring
+        with open(log_path(self.exec_id), "rb") as f:
+            f.seek(offset)
+            return f.read(min(end, self.flushed) - offset)
+
+    def tail(self, length: int) -> bytes:
+        """The last `length` bytes of output, or fewer if older output is only in the log file"""
+        with self._lock:
+            return self._slice(max(self.size - length, self.size - len(self._data)), self.size)
+
+    def close(self, persist: bool) -> Dict[str, Any]:
+        """
+        Finish the output. Returns the fields to record on the task state: the output itself
+        when it is small enough to keep inline, nothing when it is in the log file.
+        """
+        with self._lock:
+            if persist or self.spilled or self.size > self.inline_bytes:
+                self._flush()
+                fields = {}
+            else:
+                fields = {"output": self._slice(0, self.size).decode("utf-8", errors = "replace")}
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            return fields
+
+
+# Buffer of the task running in the current context
+current_output: ContextVar[Optional[OutputBuffer]] = ContextVar("current_output", default = None)
+
+_buffers: Dict[str, OutputBuffer] = {}
+_buffers_lock = threading.Lock()
+_flusher: Optional[threading.Thread] = None
+
+
+class _OutputRouter(io.TextIOBase):
+    """Stands in for sys.stdout or sys.stderr and writes to the current task's buffer."""
+
+    def __init__(self, stream):
+        self._stream = stream
+
+    @property
+    def encoding(self):
+        return "utf-8"
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        buffer = current_output.get()
+        if buffer is None:
+            return self._stream.write(text)
+        buffer.write(text.encode("utf-8", errors = "replace"))
+        return len(text)
+
+    def flush(self) -> None:
+        if current_output.get() is None:
+            self._stream.flush()
+
+    def isatty(self) -> bool:
+        return current_output.get() is None and self._stream.isatty()
+
+    def fileno(self) -> int:
+        # Output written to the descriptor directly, e.g. by subprocesses, bypasses the capture
+        return self._stream.fileno()
+
+
+def _install_routers() -> None:
+    # Cheap enough to check on every task, and puts the routers back if something replaced the streams
+    if not isinstance(sys.stdout, _OutputRouter):
+        sys.stdout = _OutputRouter(sys.stdout)
+    if not isinstance(sys.stderr, _OutputRouter):
+        sys.stderr = _OutputRouter(sys.stderr)
+
+
+def _flush_periodically() -> None:
+    while True:
+        time.sleep(get_task_output_settings().task_output_flush_seconds)
+        with _buffers_lock:
+            buffers = list(_buffers.values())
+        for buffer in buffers:
+            try:
+                buffer.flush(force = buffer.inline_bytes == 0)
+            except OSError:
+                # Retried on the next round, and on completion
+                pass
+
+
+def open_output(exec_id: str, inline: bool = True) -> OutputBuffer:
+    """Create the output buffer of a task starting in this process, `inline = False` always writes to the log file"""
+    global _flusher
+    _install_routers()
+    buffer = OutputBuffer(exec_id, inline_bytes = None if inline else 0)
+    with _buffers_lock:
+        _buffers[exec_id] = buffer
+        if _flusher is None:
+            _flusher = threading.Thread(target = _flush_periodically, name = "task-output-flusher", daemon = True)
+            _flusher.start()
+    return buffer
+
+
+def get_output_buffer(exec_id: str) -> Optional[OutputBuffer]:
+    with _buffers_lock:
+        return _buffers.get(exec_id)
+
+
+def close_output(exec_id: str, persist: bool = False) -> Dict[str, Any]:
+    """Finish a task's output, see OutputBuffer.close. The buffer stays readable until discard_output."""
+    buffer = get_output_buffer(exec_id)
+    if buffer is None:
+        return {}
+    return buffer.close(persist)
+
+
+def discard_output(exec_id: str) -> None:
+    with _buffers_lock:
+        _buffers.pop(exec_id, None)
+
+
+# Reading output
+# A task's output is in its live buffer while it runs in this process, on the task state when
+# it was kept inline, or in its log file.
+class _BytesSource:
+    def __init__(self, data: bytes):
+        self._data = data
+        self.size = len(data)
+
+    def read(self, offset: int, length: int) -> bytes:
+        return self._data[offset:offset + length]
+
+
+class _BufferSource:
+    def __init__(self, buffer: OutputBuffer):
+        self._buffer = buffer
+        self.size = buffer.size
+
+    def read(self, offset: int, length: int) -> bytes:
+        return self._buffer.read(offset, min(length, self.size - offset))
+
+
+class _FileSource:
+    def __init__(self, f):
+        self._file = f
+        self.size = f.seek(0, os.SEEK_END)
+
+    def read(self, offset: int, length: int) -> bytes:
+        self._file.seek(offset)
+        return self._file.read(length)
+
+
+def output_tail(exec_id: str, task: Dict[str, Any], length: int) -> Tuple[bytes, int]:
+    """The last `length` bytes of a task's output and the size of the whole output"""
+    buffer = get_output_buffer(exec_id)
+    if buffer is not None:
+        return buffer.tail(length), buffer.size
+    if task.get("output") is not None:
+        data = task["output"].encode("utf-8")
+        return data[-length:], len(data)
+    try:
+        with open(log_path(exec_id), "rb") as f:
+            size = f.seek(0, os.SEEK_END)
+            f.seek(max(0, size - length))
+            return f.read(length), size
+    except OSError:
+        return b"", 0
+
+
+@contextmanager
+def output_source(exec_id: str, task: Dict[str, Any]) -> Iterator[Any]:
+    """Yield the task's output as an object with `size` and `read(offset, length)`"""
+    buffer = get_output_buffer(exec_id)
+    if buffer is not None:
+        yield _BufferSource(buffer)
+        return
+    if task.get("output") is not None:
+        yield _BytesSource(task["output"].encode("utf-8"))
+        return
+    try:
+        f = open(log_path(exec_id), "rb")
+    except OSError:
+        yield _BytesSource(b"")
+        return
+    with f:
+        yield _FileSource(f)
@@ -0,0 +1,231 @@
+# Task state stores for the cloud function executor.
+# The executor keeps the status and result of every submitted task here instead of in a
+# module-level dictionary, so entries expire after a TTL and, with the Mongo store, are
+# shared by every API worker and survive restarts.
+
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Optional
+from app.config.settings import get_task_store_settings
+
+# Statuses after which a task no longer changes and its log no longer grows
+FINISHED_STATUSES = ("completed", "error")
+
+
+class TaskStore:
+    """Interface for storing task state keyed by execution ID."""
+
+    # Most tasks the store keeps, None when it is unbounded
+    max_entries: Optional[int] = None
+
+    def create(self, exec_id: str, state: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def get(self, exec_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    def update(self, exec_id: str, **fields: Any) -> None:
+        raise NotImplementedError
+
+    def delete(self, exec_id: str) -> None:
+        raise NotImplementedError
+
+    def merge(self, exec_id: str, field: str, values: Dict[str, Any]) -> None:
+        """Set keys of the dict `field` without replacing its other keys"""
+        raise NotImplementedError
+
+    def create_many(self, states: Dict[str, Dict[str, Any]]) -> None:
+        for exec_id, state in states.items():
+            self.create(exec_id, state)
+
+    def get_many(self, exec_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Get the state of every known task among `exec_ids`"""
+        found = {}
+        for exec_id in exec_ids:
+            state = self.get(exec_id)
+            if state is not None:
+                found[exec_id] = state
+        return found
+
+
+class InMemoryTaskStore(TaskStore):
+    """
+    Process-local store with LRU eviction of finished tasks beyond `max_entries` and a
+    TTL that is refreshed on every write. Only suitable for a single API worker.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl_seconds: Optional[int] = None):
+        settings = get_task_store_settings()
+        self.max_entries = max_entries or settings.task_store_max_entries
+        self.ttl_seconds = ttl_seconds or settings.task_store_ttl_seconds
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._expires_at: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def create(self, exec_id: str, state: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[exec_id] = dict(state)
+            self._touch(exec_id)
+            self._evict()
+
+    def create_many(self, states: Dict[str, Dict[str, Any]]) -> None:
+        # One eviction pass for the whole batch
+        with self._lock:
+            for exec_id, state in states.items():
+                self._entries[exec_id] = dict(state)
+                self._touch(exec_id)
+            self._evict()
+
+    def get(self, exec_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            state = self._entries.get(exec_id)
+            if state is None:
+                return None
+            if self._expires_at[exec_id] <= time.monotonic():
+                self._remove(exec_id)
+                return None
+            self._entries.move_to_end(exec_id)
+            return dict(state)
+
+    def update(self, exec_id: str, **fields: Any) -> None:
+        with self._lock:
+            state = self._entries.get(exec_id)
+            if state is None:
+                return
+            state.update(fields)
+            self._touch(exec_id)
+
+    def merge(self, exec_id: str, field: str, values: Dict[str, Any]) -> None:
+        with self._lock:
+            state = self._entries.get(exec_id)
+            if state is None:
+                return
+            state[field] = dict(state.get(field) or {}, **values)
+            self._touch(exec_id)
+
+    def delete(self, exec_id: str) -> None:
+        with self._lock:
+            self._remove(exec_id)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _touch(self, exec_id: str) -> None:
+        self._entries.move_to_end(exec_id)
+        self._expires_at[exec_id] = time.monotonic() + self.ttl_seconds
+
+    def _remove(self, exec_id: str) -> None:
+        self._entries.pop(exec_id, None)
+        self._expires_at.pop(exec_id, None)
+
+    def _evict(self) -> None:
+        # Expired entries first, then the least recently used ones
+        now = time.monotonic()
+        for exec_id in [key for key, expires_at in self._expires_at.items() if expires_at <= now]:
+            self._remove(exec_id)
+        # Queued and running tasks are never evicted, their executors still write to them
+        excess = len(self._entries) - self.max_entries
+        if excess <= 0:
+            return
+        evicted = []
+        for exec_id, state in self._entries.items():
+            if _evictable(state):
+                evicted.append(exec_id)
+                if len(evicted) == excess:
+                    break
+        for exec_id in evicted:
+            self._remove(exec_id)
+
+
+# Batch records have no status and can go like finished tasks
+def _evictable(state: Dict[str, Any]) -> bool:
+    return "status" not in state or state["status"] in FINISHED_STATUSES
+
+
+class MongoTaskStore(TaskStore):
+    """
+    Store backed by a MongoDB collection with a TTL index on `expires_at`, so every
+    API worker sees the same tasks and MongoDB removes stale ones on its own.
+    """
+
+    def __init__(self, collection, ttl_seconds: Optional[int] = None):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds or get_task_store_settings().task_store_ttl_seconds
+        self.collection.create_index("expires_at", expireAfterSeconds = 0)
+
+    def create(self, exec_id: str, state: Dict[str, Any]) -> None:
+        document = dict(state, _id = exec_id, expires_at = self._expiry())
+        self.collection.replace_one({"_id": exec_id}, document, upsert = True)
+
+    def get(self, exec_id: str) -> Optional[Dict[str, Any]]:
+        # The TTL monitor only runs once a minute, so filter out expired documents too
+        document = self.collection.find_one(
+            {"_id": exec_id, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+            {"_id": 0, "expires_at": 0}
+        )
+        return document
+
+    def update(self, exec_id: str, **fields: Any) -> None:
+        from bson.errors import InvalidDocument
+
+        update = dict(fields, expires_at = self._expiry())
+        try:
+            self.collection.update_one({"_id": exec_id}, {"$set": update})
+        except InvalidDocument:
+            # Task results are arbitrary Python objects, keep a readable form of the ones BSON can't encode
+            if "result" not in update:
+                raise
+            update["result"] = repr(update["result"])
+            self.collection.update_one({"_id": exec_id}, {"$set": update})
+
+    def delete(self, exec_id: str) -> None:
+        self.collection.delete_one({"_id": exec_id})
+
+    def merge(self, exec_id: str, field: str, values: Dict[str, Any]) -> None:
+        # One $set per key, so concurrent writers of different keys don't overwrite each other
+        update = {f"{field}.{key}": value for key, value in values.items()}
+        update["expires_at"] = self._expiry()
+        self.collection.update_one({"_id": exec_id}, {"$set": update})
+
+    def create_many(self, states: Dict[str, Dict[str, Any]]) -> None:
+        if not states:
+            return
+        expires_at = self._expiry()
+        self.collection.insert_many(
+            [dict(state, _id = exec_id, expires_at = expires_at) for exec_id, state in states.items()],
+            ordered = False
+        )
+
+    def get_many(self, exec_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        cursor = self.collection.find(
+            {"_id": {"$in": list(exec_ids)}, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+            {"expires_at": 0}
+        )
+        return {document.pop("_id"): document for document in cursor}
+
+    def _expiry(self) -> datetime:
+        return datetime.now(timezone.utc) + timedelta(seconds = self.ttl_seconds)
+
+
+def get_task_store(collection: Optional[str] = None) -> TaskStore:
+    """
+    Get the task store selected by TASK_STORE_BACKEND ("memory" or "mongo").
+    Each `collection` name is a separate store, e.g. one for tasks and one for batches.
+    """
+    # Always call the cached factory positionally so every caller shares one store per name
+    return _create_task_store(collection or get_task_store_settings().task_store_collection)
+
+
+@lru_cache()
+def _create_task_store(collection: str) -> TaskStore:
+    backend = get_task_store_settings().task_store_backend
+    if backend == "memory":
+        return InMemoryTaskStore()
+    if backend == "mongo":
+        # Reuse the application's MongoDB client instead of opening another one
+        from app.db.database import get_db
+        return MongoTaskStore(get_db()[collection])
+    raise ValueError(f"Unknown task store backend '{backend}'.")
@@ -0,0 +1,134 @@
+# Prometheus metrics for the API, the task executor and data ingestion.
+# Metrics are plain counters and histograms updated in place, and gauges such as queue
+# depths are only computed when /metrics is scraped, so keeping them on costs next to nothing.
+#
+# Each process keeps its own counters and histograms. When the API runs several worker
+# processes (uvicorn --workers), set PROMETHEUS_MULTIPROC_DIR to an empty directory before
+# starting it: every process, including process-pool workers and heavy task processes, then
+# writes its metrics there and /metrics adds them up. The directory must be emptied on every
+# deployment. Without it, /metrics only shows the worker that answered the scrape.
+
+import os
+import threading
+from typing import Callable, Dict, Iterable, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+)
+from prometheus_client.core import GaugeMetricFamily
+
+# Read by prometheus_client itself when it is imported, child processes inherit it
+MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+if MULTIPROC_DIR:
+    os.makedirs(MULTIPROC_DIR, exist_ok = True)
+
+# Buckets for request and task durations, from a few milliseconds to several minutes
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _histogram(name, documentation, labels, buckets = LATENCY_BUCKETS):
+    return Histogram(name, documentation, labels, buckets = buckets)
+
+
+# API
+HTTP_REQUEST_DURATION = _histogram(
+    "http_request_duration_seconds", "Time spent handling HTTP requests", ["method", "route", "status"]
+)
+
+# Executor and runners
+TASK_DURATION = _histogram(
+    "task_duration_seconds", "Run time of tasks from the moment a worker picks them up", ["task", "status"]
+)
+
+# ERP ingestion, rows per second is rate(erp_rows_fetched_total)
+# Not labelled by dataset: the id comes from the client, so its values are unbounded
+ERP_FETCH_DURATION = _histogram("erp_fetch_duration_seconds", "Time to pull a whole dataset from ERP", [])
+ERP_PAGE_DURATION = _histogram(
+    "erp_page_fetch_duration_seconds", "Time to fetch one page of records from ERP", [],
+    buckets = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+ERP_ROWS_FETCHED = Counter("erp_rows_fetched_total", "Rows fetched from ERP", [])
+
+# MongoDB writes, throughput is rate(mongo_documents_written_total)
+MONGO_WRITE_DURATION = _histogram(
+    "mongo_write_duration_seconds", "Time of one MongoDB write batch", ["collection"],
+    buckets = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+MONGO_DOCUMENTS_WRITTEN = Counter("mongo_documents_written_total", "Documents written to MongoDB", ["collection"])
+
+# Task result cache, labelled by tier: "memory", "mongo" or "tiered" for the two combined
+# Hit ratio is rate(task_result_cache_hits_total) over hits plus misses
+RESULT_CACHE_HITS = Counter("task_result_cache_hits_total", "Lookups answered from the task result cache", ["cache"])
+RESULT_CACHE_MISSES = Counter("task_result_cache_misses_total", "Lookups not found in the task result cache", ["cache"])
+RESULT_CACHE_EVICTIONS = Counter(
+    "task_result_cache_evictions_total", "Results evicted to keep the task result cache within its byte budget", ["cache"]
+)
+
+
+# Gauges computed at scrape time
+# Each source returns (labels, value) pairs for one gauge. They describe the process that
+# answers the scrape, also in multiprocess mode.
+GaugeSource = Callable[[], Iterable[Tuple[Dict[str, str], float]]]
+
+
+class _ScrapeTimeGauges:
+    def __init__(self):
+        self._gauges: Dict[str, Tuple[str, Tuple[str, ...], GaugeSource]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, documentation: str, labels: Tuple[str, ...], source: GaugeSource) -> None:
+        with self._lock:
+            self._gauges[name] = (documentation, labels, source)
+
+    def describe(self):
+        return []
+
+    def collect(self):
+        with self._lock:
+            gauges = list(self._gauges.items())
+        for name, (documentation, labels, source) in gauges:
+            family = GaugeMetricFamily(name, documentation, labels = list(labels))
+            try:
+                samples = list(source())
+            except Exception:
+                # A failing source must not break the whole scrape
+                continue
+            for sample_labels, value in samples:
+                family.add_metric([str(sample_labels.get(label, "")) for label in labels], value)
+            yield family
+
+
+_gauges = _ScrapeTimeGauges()
+REGISTRY.register(_gauges)
+
+
+def register_gauge(name: str, documentation: str, labels: Tuple[str, ...], source: GaugeSource) -> None:
+    """Register a gauge whose values are read from `source` on every scrape"""
+    _gauges.add(name, documentation, labels, source)
+
+
+def _executor_gauges() -> None:
+    from services.cloud_functions.backends import get_backend_stats
+
+    register_gauge(
+        "executor_queue_depth", "Tasks waiting in the executor's submission queue", ("pool",),
+        lambda: [({"pool": pool}, stats["queue_depth"]) for pool, stats in get_backend_stats().items()]
+    )
+    register_gauge(
+        "executor_in_flight", "Tasks currently running on the executor's workers", ("pool",),
+        lambda: [({"pool": pool}, stats["in_flight"]) for pool, stats in get_backend_stats().items()]
+    )
+
+
+_executor_gauges()
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Body and content type of the /metrics response"""
+    if MULTIPROC_DIR:
+        # The multiprocess collector reads the files of every process, it needs a registry of its own
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(_gauges)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -1,4 +1,6 @@
 import os
+import json
+from functools import lru_cache
 from minio import Minio 
 from datetime import timedelta
 
@@ -9,40 +11,42 @@ MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "localhost:9000")
 MINIO_USERNAME = os.getenv("MINIO_USERNAME", "admin")
 MINIO_PASSWORD = os.getenv("MINIO_PASSWORD", "password")
 MINIO_BUCKET_NAME = os.getenv("MINIO_BUCKET_NAME", "uploads") 
+MINIO_PRESIGNED_URL_EXPIRY = int(os.getenv("MINIO_PRESIGNED_URL_EXPIRY", 3600))
 
-# Initialize MinIO client
-minio_client = Minio(
-    MINIO_ENDPOINT,
-    access_key = MINIO_USERNAME,
-    secret_key = MINIO_PASSWORD,
-    secure = False 
-)
+# Public read access to the uploaded objects
+BUCKET_POLICY = json.dumps({
+    "Version": "2012-10-17",
+    "Statement": [
+        {
+            "Effect": "Allow",
+            "Principal": "*",
+            "Action": "s3:GetObject",
+            "Resource": f"arn:aws:s3:::{MINIO_BUCKET_NAME}/*"
+        }
+    ]
+})
 
-if not minio_client.bucket_exists(MINIO_BUCKET_NAME):
-    minio_client.make_bucket(MINIO_BUCKET_NAME)
+# MinIO client, created on first use so importing this module doesn't touch MinIO
+@lru_cache()
+def get_minio_client() -> Minio:
+    return Minio(
+        MINIO_ENDPOINT,
+        access_key = MINIO_USERNAME,
+        secret_key = MINIO_PASSWORD,
+        secure = False 
+    )
 
-# add s3 policy to allow public access
-minio_client.set_bucket_policy(
-    MINIO_BUCKET_NAME,
-    """
-    {
-        "Version": "2012-10-17",
-        "Statement": [
-            {
-                "Effect": "Allow",
-                "Principal": "*",
-                "Action": "s3:GetObject",
-                "Resource": "arn:aws:s3:::uploads/*"
-            }
-        ]
-    }
-    """
-)
+# Create the bucket and apply its policy, called once from the application's startup hook
+def bootstrap_bucket():
+    minio_client = get_minio_client()
+    if not minio_client.bucket_exists(MINIO_BUCKET_NAME):
+        minio_client.make_bucket(MINIO_BUCKET_NAME)
+    minio_client.set_bucket_policy(MINIO_BUCKET_NAME, BUCKET_POLICY)
 
 # ------------------ MinIO Service Functions -------------------
 # Generate a presigned URL for uploading files to MinIO
-def generate_presigned_url(filename: str, expiry_seconds: int = 3600):
-    url = minio_client.presigned_put_object(
+def generate_presigned_url(filename: str, expiry_seconds: int = MINIO_PRESIGNED_URL_EXPIRY):
+    url = get_minio_client().presigned_put_object(
         MINIO_BUCKET_NAME, 
         filename, 
         expires = timedelta(seconds = expiry_seconds)
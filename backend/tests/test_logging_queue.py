@@ -0,0 +1,102 @@
+# Logging queue: records dropped when the queue is full, the warnings that report them,
+# including the final report when the queue stops, and DEBUG sampling.
+
+import io
+import logging
+import time
+
+import app.config.logging as logging_config
+from app.config.logging import _DebugSampler, _LogPipeline, stop_logging_queue
+
+
+def _record(message: str, level: int = logging.INFO, name: str = "tests.logging_queue") -> logging.LogRecord:
+    return logging.LogRecord(name, level, __file__, 0, message, None, None)
+
+
+def _logger(name: str, stream: io.StringIO) -> logging.Logger:
+    logger = logging.getLogger(name)
+    logger.handlers = [logging.StreamHandler(stream)]
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    return logger
+
+
+def test_full_queue_drops_records_and_reports_them_once():
+    pipeline = _LogPipeline(size = 2, policy = "drop", block_seconds = 0, sampler = None)
+    for index in range(5):
+        pipeline.put(_record(f"record {index}"))
+
+    assert pipeline.stats()["queue_depth"] == 2
+    assert pipeline.stats()["dropped"] == 3
+    assert pipeline.take_drop_report() == 3
+    assert pipeline.take_drop_report() == 0
+
+    # Further drops wait for the next interval, unless it is the final report
+    pipeline.put(_record("dropped"))
+    assert pipeline.take_drop_report() == 0
+    assert pipeline.take_drop_report(final = True) == 1
+    assert pipeline.stats()["dropped"] == 4
+
+
+def test_block_policy_waits_before_dropping():
+    pipeline = _LogPipeline(size = 1, policy = "block", block_seconds = 0.05, sampler = None)
+    pipeline.put(_record("kept"))
+
+    started = time.monotonic()
+    pipeline.put(_record("dropped"))
+
+    assert time.monotonic() - started >= 0.05
+    assert pipeline.stats()["dropped"] == 1
+
+
+def test_listener_reports_drops_before_the_next_record():
+    stream = io.StringIO()
+    logger = _logger("tests.logging_queue.listener", stream)
+    pipeline = _LogPipeline(size = 2, policy = "drop", block_seconds = 0, sampler = None)
+    route = pipeline.route(list(logger.handlers))
+    logger.handlers = [route]
+
+    for index in range(5):
+        logger.info(f"record {index}")
+    pipeline.listener.start()
+    pipeline.listener.stop()
+
+    assert stream.getvalue().splitlines() == [
+        "Dropped 3 log records, the logging queue was full", "record 0", "record 1"
+    ]
+
+
+def test_drops_since_the_last_report_are_reported_when_the_queue_stops(monkeypatch, caplog):
+    stream = io.StringIO()
+    logger = _logger("tests.logging_queue.final", stream)
+    handler = logger.handlers[0]
+    monkeypatch.setattr(logging_config, "_pipeline", None)
+    logging_config._install_pipeline([logger.name])
+    pipeline = logging_config._pipeline
+    # Hold the listener so the queue fills up
+    pipeline.listener.stop()
+    pipeline.queue.maxsize = 2
+
+    for index in range(5):
+        logger.info(f"record {index}")
+    # The last periodic report was just now, so the listener doesn't report the drops
+    pipeline._reported_at = time.monotonic()
+    pipeline.listener.start()
+    with caplog.at_level(logging.WARNING, logger = "app.config.logging"):
+        stop_logging_queue()
+
+    assert stream.getvalue().splitlines() == ["record 0", "record 1"]
+    assert "Dropped 3 log records, the logging queue was full" in caplog.messages
+    # Records are handled synchronously again
+    assert logger.handlers == [handler]
+    assert logging_config.get_logging_stats() == {"queued": False}
+
+
+def test_debug_sampling_only_applies_to_the_sampled_loggers():
+    sampler = _DebugSampler(["tests.sampled"], rate = 0)
+
+    assert not sampler.filter(_record("debug", logging.DEBUG, "tests.sampled"))
+    assert not sampler.filter(_record("debug", logging.DEBUG, "tests.sampled.child"))
+    assert sampler.filter(_record("info", logging.INFO, "tests.sampled"))
+    assert sampler.filter(_record("debug", logging.DEBUG, "tests.sampledother"))
+    assert sampler.sampled_out == 2
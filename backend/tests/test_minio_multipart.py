@@ -0,0 +1,156 @@
+# The multipart upload endpoints use private methods of the MinIO client (_create_multipart_upload,
+# _list_parts, _complete_multipart_upload, _abort_multipart_upload), which the pinned minio range
+# keeps stable. These tests run MinioStorageService against a local stand-in for the S3 API so a
+# minio upgrade that changes those methods fails here instead of in production.
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from app.config.settings import MinIOSettings
+from app.services.storage.minio_service import MinioStorageService
+
+S3_NS = "http://s3.amazonaws.com/doc/2006-03-01/"
+
+
+class _FakeS3(BaseHTTPRequestHandler):
+    """Answers the multipart calls for one bucket with canned S3 responses and records them."""
+
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status: int, body: str = "") -> None:
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/xml")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _record(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query, keep_blank_values = True)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode("utf-8") if length else ""
+        self.requests.append((self.command, url.path, query, body, dict(self.headers)))
+        return url.path, query
+
+    def do_GET(self):
+        path, query = self._record()
+        if "location" in query:
+            self._reply(200, f'<LocationConstraint xmlns="{S3_NS}"></LocationConstraint>')
+            return
+        marker = query.get("part-number-marker", ["0"])[0]
+        # Two pages of parts, to cover the pagination of list_uploaded_parts
+        if marker == "0":
+            parts, truncated, next_marker = [(1, "etag-1")], "true", 1
+        else:
+            parts, truncated, next_marker = [(2, "etag-2")], "false", 2
+        self._reply(200, (
+            f'<ListPartsResult xmlns="{S3_NS}"><Bucket>datasets</Bucket><Key>{path.split("/", 2)[2]}</Key>'
+            f"<UploadId>upload-1</UploadId><PartNumberMarker>{marker}</PartNumberMarker>"
+            f"<NextPartNumberMarker>{next_marker}</NextPartNumberMarker><MaxParts>1000</MaxParts>"
+            f"<IsTruncated>{truncated}</IsTruncated>"
+            + "".join(
+                f"<Part><PartNumber>{number}</PartNumber><ETag>&quot;{etag}&quot;</ETag>"
+                f"<Size>5242880</Size><LastModified>2026-01-01T00:00:00.000Z</LastModified></Part>"
+                for number, etag in parts
+            )
+            + "</ListPartsResult>"
+        ))
+
+    def do_POST(self):
+        path, query = self._record()
+        key = path.split("/", 2)[2]
+        if "uploads" in query:
+            self._reply(200, (
+                f'<InitiateMultipartUploadResult xmlns="{S3_NS}"><Bucket>datasets</Bucket>'
+                f"<Key>{key}</Key><UploadId>upload-1</UploadId></InitiateMultipartUploadResult>"
+            ))
+        else:
+            self._reply(200, (
+                f'<CompleteMultipartUploadResult xmlns="{S3_NS}"><Location>http://localhost/datasets/{key}</Location>'
+                f"<Bucket>datasets</Bucket><Key>{key}</Key><ETag>&quot;final-etag&quot;</ETag>"
+                "</CompleteMultipartUploadResult>"
+            ))
+
+    def do_DELETE(self):
+        self._record()
+        self._reply(204)
+
+
+@pytest.fixture
+def storage():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeS3)
+    threading.Thread(target = server.serve_forever, kwargs = {"poll_interval": 0.05}, daemon = True).start()
+    _FakeS3.requests = []
+    settings = MinIOSettings(
+        MINIO_ENDPOINT = f"127.0.0.1:{server.server_port}",
+        MINIO_ACCESS_KEY = "access",
+        MINIO_SECRET_KEY = "secret",
+        MINIO_BUCKET_NAME = "datasets",
+    )
+    yield MinioStorageService(settings)
+    server.shutdown()
+    server.server_close()
+
+
+def _calls(command: str):
+    return [request for request in _FakeS3.requests if request[0] == command]
+
+
+def test_create_multipart_upload(storage):
+    upload = storage.create_multipart_upload("data.csv", 100 * 1024 * 1024, 16 * 1024 * 1024, "text/csv")
+
+    assert upload["upload_id"] == "upload-1"
+    assert upload["part_size"] == 16 * 1024 * 1024
+    assert upload["part_count"] == 7
+    _, path, query, _, headers = _calls("POST")[0]
+    assert path == f"/datasets/{upload['object_name']}"
+    assert "uploads" in query
+    assert headers["Content-Type"] == "text/csv"
+
+
+def test_presigned_part_urls(storage):
+    urls = storage.presigned_part_urls("data.csv", "upload-1", [1, 2])
+
+    for part_number, url in urls.items():
+        query = parse_qs(urlsplit(url).query)
+        assert query["partNumber"] == [str(part_number)]
+        assert query["uploadId"] == ["upload-1"]
+        assert "X-Amz-Signature" in query
+
+
+def test_list_uploaded_parts_follows_pages(storage):
+    parts = storage.list_uploaded_parts("data.csv", "upload-1")
+
+    assert parts == [
+        {"part_number": 1, "etag": "etag-1", "size": 5242880},
+        {"part_number": 2, "etag": "etag-2", "size": 5242880},
+    ]
+    pages = [query for _, _, query, _, _ in _calls("GET") if "location" not in query]
+    assert [page["uploadId"] for page in pages] == [["upload-1"], ["upload-1"]]
+
+
+def test_complete_multipart_upload_sends_parts_in_order(storage):
+    result = storage.complete_multipart_upload(
+        "data.csv", "upload-1", [{"part_number": 2, "etag": '"etag-2"'}, {"part_number": 1, "etag": "etag-1"}]
+    )
+
+    assert result["etag"] == "final-etag"
+    _, _, query, body, _ = _calls("POST")[0]
+    assert query["uploadId"] == ["upload-1"]
+    assert body.index("<PartNumber>1</PartNumber>") < body.index("<PartNumber>2</PartNumber>")
+    assert '<ETag>"etag-1"</ETag>' in body
+
+
+def test_abort_multipart_upload(storage):
+    storage.abort_multipart_upload("data.csv", "upload-1")
+
+    _, path, query, _, _ = _calls("DELETE")[0]
+    assert path == "/datasets/data.csv"
+    assert query["uploadId"] == ["upload-1"]
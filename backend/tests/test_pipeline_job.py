@@ -0,0 +1,152 @@
+# POST /run queues the "erp_pipeline" task. These tests run that job through the task manager
+# and the executor's thread pool, with the ERP pull and the MongoDB writes replaced.
+
+import asyncio
+import sys
+import time
+import types
+
+import pandas as pd
+import pytest
+
+# The ERP client package is only needed by the pull, which is replaced below
+try:
+    import erp_client.erp_next_client  # noqa: F401
+except ImportError:
+    erp_client = types.ModuleType("erp_client")
+    erp_client.erp_next_client = types.ModuleType("erp_client.erp_next_client")
+    erp_client.erp_next_client.ERPNextClient = object
+    sys.modules["erp_client"] = erp_client
+    sys.modules["erp_client.erp_next_client"] = erp_client.erp_next_client
+
+import app.warehouse.register_tasks  # noqa: F401,E402
+from app.warehouse import pipeline_tasks  # noqa: E402
+from app.warehouse.task_manager import get_task_manager  # noqa: E402
+from services.cloud_functions.executor import FINISHED_STATUSES, get_task_status  # noqa: E402
+
+RECORDS = [
+    {"name": "ITEM-1", "modified": "2026-01-01 10:00:00"},
+    {"name": "ITEM-2", "modified": "2026-01-02 10:00:00"},
+]
+
+
+def _pull_dataset(dataset_id, incremental = False, modified_since = None, progress_callback = None):
+    dataset = pd.DataFrame(RECORDS)
+    dataset.attrs["erp_fetch"] = {"pages": 1}
+    if progress_callback is not None:
+        progress_callback(len(dataset))
+    return dataset
+
+
+def _run_job(params, timeout: float = 10.0, task_name: str = "erp_pipeline") -> dict:
+    exec_id = asyncio.run(get_task_manager().execute_task(task_name = task_name, params = params))
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = get_task_status(exec_id)
+        if status["status"] in FINISHED_STATUSES:
+            return status
+        time.sleep(0.01)
+    pytest.fail(f"{task_name} job {exec_id} did not finish within {timeout}s")
+
+
+def test_full_sync_job_completes(monkeypatch):
+    stored = {}
+
+    def store_to_mongodb(dataset_id, records, progress_callback = None):
+        stored[dataset_id] = records
+        progress_callback(len(records))
+        return {"inserted_id": "manifest-1", "record_count": len(records)}
+
+    monkeypatch.setattr(pipeline_tasks, "pull_dataset", _pull_dataset)
+    monkeypatch.setattr(pipeline_tasks, "store_to_mongodb", store_to_mongodb)
+
+    status = _run_job(["items", False, False])
+
+    assert status["error"] is None
+    assert status["status"] == "completed"
+    assert status["result"] == {
+        "status": "success",
+        "result": {"inserted_id": "manifest-1", "record_count": 2},
+        "fetch": {"pages": 1},
+    }
+    assert status["progress"] == {"stage": "done", "rows_fetched": 2, "rows_written": 2}
+    assert stored == {"items": RECORDS}
+
+
+def test_full_sync_job_reports_failed_snapshot_as_partial(monkeypatch):
+    def store_to_mongodb(dataset_id, records, progress_callback = None):
+        return {"inserted_id": "manifest-1", "record_count": len(records)}
+
+    def write_parquet_snapshot(dataset_id, dataset, snapshot_id):
+        raise ConnectionError("MinIO is unreachable")
+
+    monkeypatch.setattr(pipeline_tasks, "pull_dataset", _pull_dataset)
+    monkeypatch.setattr(pipeline_tasks, "store_to_mongodb", store_to_mongodb)
+    monkeypatch.setattr(pipeline_tasks, "write_parquet_snapshot", write_parquet_snapshot)
+
+    status = _run_job(["items", False, True])
+
+    assert status["status"] == "completed"
+    assert status["result"]["status"] == "partial"
+    assert status["result"]["result"]["inserted_id"] == "manifest-1"
+    assert status["result"]["snapshot_error"] == "MinIO is unreachable"
+    assert status["progress"]["stage"] == "done"
+
+
+def test_incremental_sync_job_advances_watermark(monkeypatch):
+    watermarks = {"items": "2025-12-31 00:00:00"}
+
+    def upsert_records_to_mongodb(dataset_id, records):
+        return {"record_count": len(records)}
+
+    monkeypatch.setattr(pipeline_tasks, "pull_dataset", _pull_dataset)
+    monkeypatch.setattr(pipeline_tasks, "upsert_records_to_mongodb", upsert_records_to_mongodb)
+    monkeypatch.setattr(pipeline_tasks, "get_sync_watermark", watermarks.get)
+    monkeypatch.setattr(pipeline_tasks, "set_sync_watermark", watermarks.__setitem__)
+
+    status = _run_job(["items", True, False])
+
+    assert status["error"] is None
+    assert status["status"] == "completed"
+    assert status["result"]["result"] == {"record_count": 2, "watermark": "2026-01-02 10:00:00"}
+    assert watermarks == {"items": "2026-01-02 10:00:00"}
+
+
+def test_incremental_sync_job_rejects_snapshot(monkeypatch):
+    monkeypatch.setattr(pipeline_tasks, "pull_dataset", _pull_dataset)
+
+    status = _run_job(["items", True, True])
+
+    assert status["status"] == "error"
+    assert "full sync" in status["error"]
+
+
+def test_pipeline_steps_cannot_be_submitted_on_their_own():
+    with pytest.raises(ValueError, match = "only runs as a step of a pipeline"):
+        asyncio.run(get_task_manager().execute_task(task_name = "erp_store", params = ["items", None]))
+    with pytest.raises(ValueError, match = "only runs as a step of a pipeline"):
+        asyncio.run(get_task_manager().execute_batch([("erp_pull", ["items"])]))
+
+
+def test_snapshot_sync_pipeline_names_the_snapshot_after_the_manifest(monkeypatch):
+    calls = {}
+
+    def store_to_mongodb(dataset_id, records, manifest_id = None):
+        calls["store"] = manifest_id
+        return {"inserted_id": manifest_id, "record_count": len(records)}
+
+    def write_parquet_snapshot(dataset_id, dataset, snapshot_id):
+        calls["snapshot"] = snapshot_id
+        return {"object_name": f"snapshots/{dataset_id}/{snapshot_id}.parquet"}
+
+    monkeypatch.setattr(pipeline_tasks, "pull_dataset", _pull_dataset)
+    monkeypatch.setattr(pipeline_tasks, "store_to_mongodb", store_to_mongodb)
+    monkeypatch.setattr(pipeline_tasks, "write_parquet_snapshot", write_parquet_snapshot)
+    monkeypatch.setattr(pipeline_tasks, "set_manifest_snapshot", lambda manifest_id, location: None)
+
+    status = _run_job(["erp_snapshot_sync", {"dataset_id": "items"}], task_name = "erp_snapshot_sync")
+
+    assert status["error"] is None
+    assert calls["store"] == calls["snapshot"]
+    linked = status["result"]["results"]["link"]
+    assert linked["snapshot"]["object_name"] == f"snapshots/items/{linked['inserted_id']}.parquet"
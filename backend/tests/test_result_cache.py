@@ -0,0 +1,119 @@
+# Task result cache: byte budget and TTL of the in-process LRU, cached None values, the
+# tiered cache in front of MongoDB and the counters exported to Prometheus.
+
+import time
+from datetime import datetime, timezone
+
+from prometheus_client import REGISTRY
+
+from services.cloud_functions.result_cache import (
+    MISS, InMemoryResultCache, MongoResultCache, TieredResultCache, make_cache_key
+)
+
+
+class _Collection:
+    """Just enough of a pymongo collection for MongoResultCache"""
+
+    def __init__(self):
+        self.documents = {}
+
+    def create_index(self, *args, **kwargs):
+        pass
+
+    def find_one(self, query, projection = None):
+        document = self.documents.get(query["_id"])
+        if document is None or document["expires_at"] <= query["expires_at"]["$gt"]:
+            return None
+        # BSON dates come back without a timezone
+        return dict(document, expires_at = document["expires_at"].replace(tzinfo = None))
+
+    def replace_one(self, query, document, upsert = False):
+        self.documents[query["_id"]] = document
+
+
+def _sample(name: str, tier: str) -> float:
+    return REGISTRY.get_sample_value(name, {"cache": tier}) or 0.0
+
+
+def test_cache_key_depends_on_function_and_arguments():
+    key = make_cache_key("module", "func", [1, {"b": 2, "a": 1}])
+
+    assert key == make_cache_key("module", "func", [1, {"a": 1, "b": 2}])
+    assert key != make_cache_key("module", "other", [1, {"a": 1, "b": 2}])
+    assert make_cache_key("module", "func", [object()]) is None
+
+
+def test_least_recently_used_entries_go_beyond_the_byte_budget():
+    cache = InMemoryResultCache(max_bytes = 300)
+    for key in ("a", "b", "c"):
+        cache.set(key, "x" * 80, 60)
+    # Reading "a" makes "b" the least recently used
+    assert cache.get("a") == "x" * 80
+
+    cache.set("d", "x" * 80, 60)
+
+    assert cache.get("b") is MISS
+    assert cache.get("a") != MISS
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] <= 300
+
+    # Values larger than the whole budget are not cached at all
+    cache.set("huge", "x" * 1000, 60)
+    assert cache.get("huge") is MISS
+
+
+def test_entries_expire_after_their_ttl():
+    cache = InMemoryResultCache(max_bytes = 1024)
+    cache.set("key", "value", 60)
+    value, size, _ = cache._entries["key"]
+    cache._entries["key"] = (value, size, time.monotonic() - 1)
+
+    assert cache.get("key") is MISS
+    assert cache.stats()["entries"] == 0
+
+
+def test_cached_none_is_a_hit():
+    cache = InMemoryResultCache(max_bytes = 1024)
+    cache.set("none", None, 60)
+
+    assert cache.get("none") is None
+    assert cache.get("missing") is MISS
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_tiered_cache_copies_shared_entries_with_their_remaining_ttl():
+    shared = MongoResultCache(_Collection())
+    cache = TieredResultCache(InMemoryResultCache(max_bytes = 1024), shared)
+    shared.set("key", "value", 60)
+
+    assert cache.get("key") == "value"
+    # Now answered by the local tier, which expires with the shared entry
+    assert cache.local.get("key") == "value"
+    expires_in = cache.local._entries["key"][2] - time.monotonic()
+    assert 50 < expires_in <= 60
+
+    assert cache.get("missing") is MISS
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    assert shared.get_with_ttl("missing") == (MISS, None)
+
+    # Expired shared entries are misses
+    shared.collection.documents["key"]["expires_at"] = datetime.now(timezone.utc)
+    assert shared.get("key") is MISS
+
+
+def test_counters_are_exported_to_prometheus():
+    before = {
+        name: _sample(name, "memory")
+        for name in ("task_result_cache_hits_total", "task_result_cache_misses_total", "task_result_cache_evictions_total")
+    }
+    cache = InMemoryResultCache(max_bytes = 100)
+    cache.set("a", "x" * 60, 60)
+    cache.set("b", "x" * 60, 60)
+    cache.get("b")
+    cache.get("a")
+
+    assert _sample("task_result_cache_hits_total", "memory") - before["task_result_cache_hits_total"] == 1
+    assert _sample("task_result_cache_misses_total", "memory") - before["task_result_cache_misses_total"] == 1
+    assert _sample("task_result_cache_evictions_total", "memory") - before["task_result_cache_evictions_total"] == 1
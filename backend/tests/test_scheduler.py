@@ -0,0 +1,106 @@
+# Task scheduler: admission against the node capacity, priority and age ordering of
+# waiting tasks, the queue limit and start failures.
+
+import sys
+
+import pytest
+
+from app.warehouse.scheduler import TaskScheduler
+from app.warehouse.task_definitions import TaskDefinition, TaskType
+from services.cloud_functions.backends import QueueFullError
+from services.cloud_functions.executor import get_task_status
+
+
+def _task(name: str, cpu_units: int = 1, memory_mb: int = 1, priority: int = 0) -> TaskDefinition:
+    return TaskDefinition(
+        name = name,
+        task_type = TaskType.LIGHTWEIGHT,
+        description = "Test task",
+        module = sys.modules[__name__],
+        func_name = name,
+        cpu_units = cpu_units,
+        memory_mb = memory_mb,
+        priority = priority
+    )
+
+
+class _Starts:
+    """Start function that records the order tasks start in and keeps their release callbacks"""
+
+    def __init__(self):
+        self.order = []
+        self.releases = {}
+        self.fields = {}
+
+    def __call__(self, name):
+        def start(exec_id, release, **fields):
+            self.order.append(name)
+            self.releases[name] = release
+            self.fields[name] = fields
+        return start
+
+
+def test_waiting_tasks_start_by_priority_then_age():
+    scheduler = TaskScheduler(cpu_units = 1, memory_mb = 10, max_queued = 10)
+    starts = _Starts()
+    scheduler.submit(_task("running"), starts("running"))
+    scheduler.submit(_task("older"), starts("older"))
+    scheduler.submit(_task("newer"), starts("newer"))
+    scheduler.submit(_task("urgent", priority = 5), starts("urgent"))
+    assert starts.order == ["running"]
+    assert scheduler.stats()["queue_depth"] == 3
+
+    for name in ("running", "urgent", "older"):
+        starts.releases[name]()
+
+    assert starts.order == ["running", "urgent", "older", "newer"]
+    assert "wait_seconds" in starts.fields["urgent"]
+    assert scheduler.stats()["admitted"] == 4
+
+
+def test_large_task_at_the_head_is_not_starved():
+    scheduler = TaskScheduler(cpu_units = 2, memory_mb = 10, max_queued = 10)
+    starts = _Starts()
+    scheduler.submit(_task("small", cpu_units = 1), starts("small"))
+    scheduler.submit(_task("large", cpu_units = 2), starts("large"))
+    # Would fit next to "small", but waits behind "large"
+    scheduler.submit(_task("later", cpu_units = 1), starts("later"))
+    assert starts.order == ["small"]
+
+    starts.releases["small"]()
+    assert starts.order == ["small", "large"]
+    starts.releases["large"]()
+    starts.releases["large"]()
+    assert starts.order == ["small", "large", "later"]
+    assert scheduler.stats()["cpu_units"]["in_use"] == 1
+
+
+def test_queue_limit_and_node_capacity():
+    scheduler = TaskScheduler(cpu_units = 1, memory_mb = 10, max_queued = 2)
+    starts = _Starts()
+    scheduler.submit(_task("running"), starts("running"))
+    scheduler.check_room(2)
+    with pytest.raises(QueueFullError):
+        scheduler.check_room(3)
+
+    scheduler.submit(_task("a"), starts("a"))
+    scheduler.submit(_task("b"), starts("b"))
+    with pytest.raises(QueueFullError):
+        scheduler.submit(_task("c"), starts("c"))
+    with pytest.raises(ValueError):
+        scheduler.check(_task("too-big", memory_mb = 11))
+
+
+def test_task_that_fails_to_start_releases_its_resources():
+    scheduler = TaskScheduler(cpu_units = 1, memory_mb = 10, max_queued = 10)
+    starts = _Starts()
+
+    def broken(exec_id, release, **fields):
+        raise RuntimeError("no worker")
+
+    exec_id = scheduler.submit(_task("broken"), broken)
+    scheduler.submit(_task("next"), starts("next"))
+
+    assert get_task_status(exec_id)["status"] == "error"
+    assert get_task_status(exec_id)["error"] == "no worker"
+    assert starts.order == ["next"]
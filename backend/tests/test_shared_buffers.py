@@ -0,0 +1,140 @@
+# Shared memory buffers: reference counting and TTL of the registry, and handles passed to
+# tasks that wait in the scheduler queue or arrive through the API as plain dicts.
+
+import asyncio
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+
+import pyarrow as pa
+import pytest
+
+from app.warehouse.scheduler import TaskScheduler
+from app.warehouse.task_definitions import TASK_REGISTRY, ExecutionPool, TaskDefinition, TaskType, register_task
+from app.warehouse.task_manager import TaskManager
+from services.cloud_functions.executor import FINISHED_STATUSES, get_task_status
+from services.cloud_functions.shared_buffers import (
+    SharedBufferHandle, SharedBufferRegistry, get_shared_buffer_registry, open_buffer, read_table,
+    restore_handles, share_table
+)
+
+# Set to let the blocking task finish
+_unblock = threading.Event()
+
+
+def count_rows(table: pa.Table) -> int:
+    return table.num_rows
+
+
+def wait_for_unblock() -> bool:
+    return _unblock.wait(10)
+
+
+def _exists(handle) -> bool:
+    try:
+        segment = shared_memory.SharedMemory(name = handle["shared_buffer"])
+    except FileNotFoundError:
+        return False
+    segment.close()
+    return True
+
+
+def _register(name: str, func_name: str, return_type) -> None:
+    if name not in TASK_REGISTRY:
+        register_task(TaskDefinition(
+            name = name,
+            task_type = TaskType.LIGHTWEIGHT,
+            description = "Test task",
+            module = sys.modules[__name__],
+            func_name = func_name,
+            cpu_units = 1,
+            memory_mb = 1,
+            return_type = return_type,
+            execution_pool = ExecutionPool.THREAD
+        ))
+
+
+def _wait(exec_id: str, timeout: float = 10.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        status = get_task_status(exec_id)
+        if status["status"] in FINISHED_STATUSES:
+            return status
+        time.sleep(0.01)
+    pytest.fail(f"Task {exec_id} did not finish within {timeout}s")
+
+
+def test_segment_is_freed_after_the_last_release():
+    registry = SharedBufferRegistry(ttl_seconds = 60)
+    handle = registry.create(b"payload", "bytes")
+
+    registry.acquire([handle])
+    registry.acquire([handle])
+    registry.release([handle])
+    assert _exists(handle)
+    with open_buffer(handle) as view:
+        assert bytes(view) == b"payload"
+
+    registry.release([handle])
+    assert not _exists(handle)
+    with pytest.raises(ValueError):
+        registry.acquire([handle])
+
+
+def test_unclaimed_segment_is_swept_after_its_ttl():
+    registry = SharedBufferRegistry(ttl_seconds = 60)
+    kept = registry.create(b"kept", "bytes")
+    registry.acquire([kept])
+    expired = registry.create(b"expired", "bytes")
+
+    registry._buffers[expired.name]["expires_at"] = time.monotonic() - 1
+    registry.sweep()
+
+    assert not _exists(expired)
+    assert _exists(kept)
+    assert registry.stats() == {"buffers": 1}
+    registry.release([kept])
+
+
+def test_restore_handles_rebuilds_json_handles():
+    table = pa.table({"a": [1, 2, 3]})
+    handle = share_table(table)
+    try:
+        # What a handle looks like after a round trip through JSON
+        values = restore_handles([dict(handle), "other"])
+
+        assert isinstance(values[0], SharedBufferHandle)
+        assert values[0].type_name == "pyarrow.lib.Table"
+        assert values[1] == "other"
+        assert read_table(values[0]).equals(table)
+    finally:
+        get_shared_buffer_registry().release([handle])
+
+
+def test_handle_stays_alive_while_the_task_is_queued(monkeypatch):
+    _register("test_wait_for_unblock", "wait_for_unblock", bool)
+    _register("test_count_rows", "count_rows", int)
+    manager = TaskManager()
+    manager.scheduler = TaskScheduler(cpu_units = 1, memory_mb = 1, max_queued = 10)
+    registry = get_shared_buffer_registry()
+    monkeypatch.setattr(registry, "ttl_seconds", 0)
+    _unblock.clear()
+
+    handle = share_table(pa.table({"a": list(range(5))}))
+    blocker = asyncio.run(manager.execute_task("test_wait_for_unblock", []))
+    # Sent as a plain dict, as it would come in through /submit-task
+    queued = asyncio.run(manager.execute_task("test_count_rows", [dict(handle)]))
+    assert get_task_status(queued)["status"] == "queued"
+
+    # The TTL has passed while the task waits, but the submission pinned the segment
+    registry.sweep()
+    assert _exists(handle)
+
+    _unblock.set()
+    assert _wait(blocker)["result"] is True
+    status = _wait(queued)
+    assert status["error"] is None
+    assert status["result"] == 5
+    # Released once the task finished
+    assert not _exists(handle)
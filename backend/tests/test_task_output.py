@@ -0,0 +1,115 @@
+# Task output capture: the ring buffer and its log file, output kept inline on the task
+# state, per-task routing of print() and the tail returned by get_task_status.
+
+import os
+import threading
+import uuid
+
+import pytest
+
+from services.cloud_functions import task_output
+from services.cloud_functions.task_output import (
+    OutputBuffer, close_output, current_output, discard_output, open_output, output_tail
+)
+
+
+@pytest.fixture(autouse = True)
+def log_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(task_output, "LOG_DIRS", str(tmp_path))
+    return tmp_path
+
+
+def _log(exec_id: str) -> bytes:
+    with open(task_output.log_path(exec_id), "rb") as f:
+        return f.read()
+
+
+def test_ring_wraps_around_after_flushing_older_output():
+    buffer = OutputBuffer("wrap", capacity = 8, inline_bytes = 4)
+    buffer.write(b"abcdef")
+    # The ring is full of unflushed output, so it is flushed before being overwritten
+    buffer.write(b"ghij")
+
+    assert buffer.size == 10
+    assert buffer.flushed == 8
+    assert buffer.tail(4) == b"ghij"
+    assert buffer.tail(100) == b"cdefghij"
+    assert buffer.read(0, 4) == b"abcd"
+    assert buffer.read(6, 4) == b"ghij"
+    assert buffer.read(10, 4) == b""
+
+    assert buffer.close(persist = False) == {}
+    assert _log("wrap") == b"abcdefghij"
+
+
+def test_writes_larger_than_the_ring_lose_nothing():
+    buffer = OutputBuffer("large", capacity = 4, inline_bytes = 0)
+    data = bytes(range(256)) * 4
+
+    buffer.write(data)
+    buffer.close(persist = False)
+
+    assert _log("large") == data
+
+
+def test_short_output_stays_inline(log_dir):
+    buffer = OutputBuffer("short", capacity = 64, inline_bytes = 16)
+    buffer.write(b"short")
+    buffer.flush()
+
+    assert buffer.close(persist = False) == {"output": "short"}
+    assert not os.listdir(log_dir)
+
+
+def test_output_is_flushed_once_it_outgrows_the_inline_size():
+    buffer = OutputBuffer("grows", capacity = 64, inline_bytes = 16)
+    buffer.write(b"x" * 17)
+    buffer.flush()
+    assert buffer.spilled
+    assert _log("grows") == b"x" * 17
+
+    buffer.write(b"y")
+    assert buffer.close(persist = False) == {}
+    assert _log("grows") == b"x" * 17 + b"y"
+
+
+def test_persist_writes_inline_sized_output_to_the_log():
+    buffer = OutputBuffer("persisted", capacity = 64, inline_bytes = 16)
+    buffer.write(b"short")
+
+    assert buffer.close(persist = True) == {}
+    assert _log("persisted") == b"short"
+
+
+def test_print_goes_to_the_buffer_of_the_current_task():
+    exec_ids = [str(uuid.uuid4()) for _ in range(2)]
+    buffers = [open_output(exec_id) for exec_id in exec_ids]
+
+    def run(buffer, name):
+        current_output.set(buffer)
+        for index in range(100):
+            print(f"{name} {index}")
+
+    threads = [threading.Thread(target = run, args = (buffer, f"task-{index}")) for index, buffer in enumerate(buffers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    try:
+        for index, exec_id in enumerate(exec_ids):
+            fields = close_output(exec_id)
+            assert fields["output"] == "".join(f"task-{index} {line}\n" for line in range(100))
+    finally:
+        for exec_id in exec_ids:
+            discard_output(exec_id)
+
+
+def test_output_tail_reads_the_end_of_the_log_file():
+    data = b"".join(b"line %05d\n" % index for index in range(1000))
+    with open(task_output.log_path("finished"), "wb") as f:
+        f.write(data)
+
+    assert output_tail("finished", {"status": "completed"}, 4096) == (data[-4096:], len(data))
+    assert output_tail("inline", {"output": "hello"}, 3) == (b"llo", 5)
+    assert output_tail("missing", {"status": "completed"}, 4096) == (b"", 0)
@@ -0,0 +1,79 @@
+# In-memory task store: LRU eviction of finished tasks, TTL expiry and field merges.
+
+import time
+
+from services.cloud_functions.task_store import InMemoryTaskStore
+
+
+def test_least_recently_used_finished_task_is_evicted():
+    store = InMemoryTaskStore(max_entries = 2, ttl_seconds = 60)
+    store.create("a", {"status": "completed"})
+    store.create("b", {"status": "completed"})
+    # Reading "a" makes "b" the least recently used
+    assert store.get("a") is not None
+
+    store.create("c", {"status": "completed"})
+
+    assert store.get("b") is None
+    assert store.get("a") is not None
+    assert store.get("c") is not None
+
+
+def test_queued_and_running_tasks_are_not_evicted():
+    store = InMemoryTaskStore(max_entries = 2, ttl_seconds = 60)
+    store.create("queued", {"status": "queued"})
+    store.create("running", {"status": "running"})
+    store.create("done", {"status": "error"})
+
+    # Only the finished task could go, even though it is the most recent
+    assert store.get("done") is None
+    assert store.get("queued")["status"] == "queued"
+    assert store.get("running")["status"] == "running"
+
+    # Over capacity while the tasks are active, trimmed again once one has finished
+    store.create("next", {"status": "queued"})
+    assert len(store) == 3
+    store.update("queued", status = "completed")
+    store.create("batch", {"exec_ids": ["queued", "running", "next"]})
+    assert len(store) == 2
+    assert store.get("queued") is None
+    assert store.get("batch") is None
+    assert store.get("running") is not None
+    assert store.get("next") is not None
+
+
+def test_create_many_keeps_the_whole_batch():
+    store = InMemoryTaskStore(max_entries = 3, ttl_seconds = 60)
+    store.create("old", {"status": "completed"})
+
+    store.create_many({f"task-{index}": {"status": "queued"} for index in range(3)})
+
+    assert store.get("old") is None
+    assert sorted(store.get_many(["task-0", "task-1", "task-2", "old"])) == ["task-0", "task-1", "task-2"]
+
+
+def test_entries_expire_after_their_ttl():
+    store = InMemoryTaskStore(max_entries = 10, ttl_seconds = 60)
+    store.create("stale", {"status": "completed"})
+    store.create("fresh", {"status": "running"})
+    store._expires_at["stale"] = time.monotonic() - 1
+
+    assert store.get("stale") is None
+    assert store.get("fresh") is not None
+
+    # Writes refresh the TTL
+    store._expires_at["fresh"] = time.monotonic() + 1
+    store.update("fresh", status = "completed")
+    assert store._expires_at["fresh"] > time.monotonic() + 30
+
+
+def test_merge_keeps_the_other_keys():
+    store = InMemoryTaskStore(max_entries = 10, ttl_seconds = 60)
+    store.create("task", {"status": "running", "progress": {"stage": "fetch"}})
+
+    store.merge("task", "progress", {"rows": 10})
+    store.merge("task", "progress", {"stage": "store"})
+    store.merge("missing", "progress", {"rows": 1})
+
+    assert store.get("task")["progress"] == {"stage": "store", "rows": 10}
+    assert store.get("missing") is None